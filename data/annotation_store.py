@@ -0,0 +1,203 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import json
+import torch
+import pickle
+import numpy as np
+from typing import Dict, List
+
+from utils.args import FRAME_ANNOTATION_OPTIONS
+
+class AnnotationStore():
+    """
+    Columnar store of frame annotations. Quality issues are saved as boolean matrices of shape (num_frames, num_issue_types), one for issues
+    that are present and one for issues that are absent (an issue can also be unannotated), and bounding boxes as an int16 matrix of shape
+    (num_frames, 4), where -1 marks frames without a box. Frames are looked up by name through a sorted array of frame names.
+    """
+    cache_version = 1
+
+    def __init__(self, annotation_root: str, frame_size: int, original_frame_size: int, cache_path: str=None):
+        """
+        Creates instance of AnnotationStore.
+        :param annotation_root: (str) Path to folder of per-video annotation JSONs.
+        :param frame_size: (int) Size in pixels of loaded frames. Bounding boxes are rescaled to this size.
+        :param original_frame_size: (int) Size in pixels of the frames the bounding boxes were annotated on.
+        :param cache_path: (str or None) Path to binary cache of the parsed annotation JSONs. If None, annotations are always parsed from the JSONs.
+        :return: Nothing.
+        """
+        self.annotation_root = annotation_root
+        self.frame_size = frame_size
+        self.original_frame_size = original_frame_size
+        self.issue_types = FRAME_ANNOTATION_OPTIONS
+        self.issue2col = { issue: col for col, issue in enumerate(self.issue_types) }
+        self.annotation_dims = {'object_bounding_box': 4 }
+
+        self.cache_path = cache_path
+        self.cache = self.load_cache() if self.cache_path else {}   # Dictionary of video name (str): (annotation JSON modification time (float), parsed annotations (dict))
+        self.cache_updated = False
+
+        self.videos = {}                                        # Dictionary of video name (str): parsed annotations (dict), in the order they were added
+        self.sorted_frame_names = np.array([], dtype=str)       # Frame names (str), sorted
+        self.sorted_frame_rows = np.zeros(0, dtype=np.int64)    # Row in columns of each sorted frame name (int)
+        self.issues_present = np.zeros((0, len(self.issue_types)), dtype=bool)
+        self.issues_absent = np.zeros((0, len(self.issue_types)), dtype=bool)
+        self.boxes = np.zeros((0, 4), dtype=np.int16)
+
+    def load_video(self, video_name: str) -> Dict[str, np.ndarray]:
+        """
+        Function to load a video's annotations, from the cache if its JSON has not been modified since it was cached.
+        :param video_name: (str) Name of video.
+        :return: (dict::np.ndarray) Video's sorted frame names, present and absent issues (bool), and bounding boxes in original frame coordinates (int32, -1 if no box).
+        """
+        annotation_path = os.path.join(self.annotation_root, f"{video_name}.json")
+        mtime = os.path.getmtime(annotation_path)
+        cached = self.cache.get(video_name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(annotation_path, 'r') as annotation_file:
+            json_annotations = json.load(annotation_file)
+        frame_names = sorted(json_annotations.keys())
+        video_annotations = {
+            'frames': np.array(frame_names),
+            'issues_present': np.zeros((len(frame_names), len(self.issue_types)), dtype=bool),
+            'issues_absent': np.zeros((len(frame_names), len(self.issue_types)), dtype=bool),
+            'boxes': np.full((len(frame_names), 4), -1, dtype=np.int32)
+        }
+        for row, frame_name in enumerate(frame_names):
+            for annotation, value in json_annotations[frame_name].items():
+                if annotation in self.issue2col:
+                    video_annotations['issues_present'][row, self.issue2col[annotation]] = value == True
+                    video_annotations['issues_absent'][row, self.issue2col[annotation]] = value == False
+                elif annotation == 'object_bounding_box' and value is not None:
+                    video_annotations['boxes'][row] = [value['x'], value['y'], value['w'], value['h']]
+
+        if self.cache_path:
+            self.cache[video_name] = (mtime, video_annotations)
+            self.cache_updated = True
+        return video_annotations
+
+    def filter_mask(self, video_annotations: Dict[str, np.ndarray], filter_criteria: List[str]) -> np.ndarray:
+        """
+        Function to test which of a video's frames satisfy any of the filter criteria.
+        :param video_annotations: (dict::np.ndarray) Video's annotations, as returned by self.load_video().
+        :param filter_criteria: (list::str) Issues that must be present (e.g. 'blur_issue') or absent (e.g. 'no_blur_issue') in a frame.
+        :return: (np.ndarray) Boolean mask over the video's sorted frames.
+        """
+        present_cols = [self.issue2col[c] for c in filter_criteria if c in self.issue2col]
+        absent_cols = [self.issue2col[c[3:]] for c in filter_criteria if c.startswith('no_') and c[3:] in self.issue2col]
+        mask = video_annotations['issues_present'][:, present_cols].any(axis=1)
+        mask |= video_annotations['issues_absent'][:, absent_cols].any(axis=1)
+        return mask
+
+    def get_video_rows(self, video_annotations: Dict[str, np.ndarray], frame_names: List[str]) -> np.ndarray:
+        """
+        Function to look up the position of frames within a video's annotations.
+        :param video_annotations: (dict::np.ndarray) Video's annotations, as returned by self.load_video().
+        :param frame_names: (list::str) Frame names.
+        :return: (np.ndarray) Row of each frame in the video's annotations.
+        """
+        rows = np.searchsorted(video_annotations['frames'], frame_names)
+        missing = [f for f, row in zip(frame_names, rows) if row == len(video_annotations['frames']) or video_annotations['frames'][row] != f]
+        if missing:
+            raise KeyError(f"Frames {missing[:3]} are not annotated in {self.annotation_root}.")
+        return rows
+
+    def add_video(self, video_name: str, video_annotations: Dict[str, np.ndarray]) -> None:
+        """
+        Function to add a video's annotations to the store. The columns are only updated by self.build().
+        :param video_name: (str) Name of video.
+        :param video_annotations: (dict::np.ndarray) Video's annotations, as returned by self.load_video().
+        :return: Nothing.
+        """
+        self.videos[video_name] = video_annotations
+
+    def build(self) -> None:
+        """
+        Function to concatenate the annotations of all added videos into columns, and rescale the bounding boxes to self.frame_size.
+        :return: Nothing.
+        """
+        frame_names = np.concatenate([v['frames'] for v in self.videos.values()] + [np.array([], dtype=str)])
+        self.sorted_frame_rows = np.argsort(frame_names, kind='stable')
+        self.sorted_frame_names = frame_names[self.sorted_frame_rows]
+        num_issue_types = len(self.issue_types)
+        self.issues_present = np.concatenate([v['issues_present'] for v in self.videos.values()] + [np.zeros((0, num_issue_types), dtype=bool)])
+        self.issues_absent = np.concatenate([v['issues_absent'] for v in self.videos.values()] + [np.zeros((0, num_issue_types), dtype=bool)])
+        boxes = np.concatenate([v['boxes'] for v in self.videos.values()] + [np.zeros((0, 4), dtype=np.int32)])
+        self.videos = {}
+
+        # resize boxes to fit current frame size (in float32, as with torch), then clamp them to fit within frame
+        has_box = boxes[:, 0] >= 0
+        boxes = (boxes.astype(np.float32) / np.float32(self.original_frame_size) * np.float32(self.frame_size)).astype(np.int32)
+        boxes[:, 0:2] = np.clip(boxes[:, 0:2], 0, self.frame_size - 1)
+        boxes[:, 2:4] = np.clip(boxes[:, 2:4], 1, self.frame_size)
+        boxes[~has_box] = -1
+        self.boxes = boxes.astype(np.int16)
+
+    def get_rows(self, frame_names: List[str]) -> np.ndarray:
+        """
+        Function to look up the rows of frames in the columns.
+        :param frame_names: (list::str) Frame names.
+        :return: (np.ndarray) Row of each frame.
+        """
+        frame_names = np.asarray(frame_names, dtype=str)
+        idxs = np.searchsorted(self.sorted_frame_names, frame_names, side='right') - 1 # last row if a frame name is duplicated
+        found = idxs >= 0
+        found[found] = self.sorted_frame_names[idxs[found]] == frame_names[found]
+        if not found.all():
+            raise KeyError(frame_names[~found][0])
+        return self.sorted_frame_rows[idxs]
+
+    def gather(self, annotation: str, rows: np.ndarray) -> torch.Tensor:
+        """
+        Function to gather an annotation for a set of frames.
+        :param annotation: (str) Annotation type, either a quality issue or 'object_bounding_box'.
+        :param rows: (np.ndarray) Rows of frames in the columns.
+        :return: (torch.Tensor) Annotation of shape (num_frames, annotation dimension), with nan where a frame does not have the annotation.
+        """
+        if annotation == 'object_bounding_box':
+            boxes = self.boxes[rows].astype(np.float32)
+            boxes[boxes[:, 0] < 0] = np.nan
+            return torch.from_numpy(boxes)
+
+        col = self.issue2col[annotation]
+        values = np.full(len(rows), np.nan, dtype=np.float32)
+        values[self.issues_present[rows, col]] = 1.0
+        values[self.issues_absent[rows, col]] = 0.0
+        return torch.from_numpy(values).unsqueeze(1)
+
+    def load_cache(self) -> Dict:
+        """
+        Function to load the binary cache of parsed annotation JSONs from self.cache_path.
+        :return: (dict) Dictionary of video name (str): (annotation JSON modification time (float), parsed annotations (dict)).
+        """
+        if not os.path.isfile(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                cache = pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return {}
+        if not isinstance(cache, dict) or cache.get('version') != self.cache_version:
+            return {}
+        return cache['videos']
+
+    def save_cache(self) -> None:
+        """
+        Function to save the binary cache of parsed annotation JSONs to self.cache_path, if any JSONs were parsed since it was loaded, and then release it from memory.
+        :return: Nothing.
+        """
+        cache, cache_updated = self.cache, self.cache_updated
+        self.cache, self.cache_updated = {}, False
+        if self.cache_path and cache_updated:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path + '.tmp', 'wb') as cache_file:
+                pickle.dump({'version': self.cache_version, 'videos': cache}, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(self.cache_path + '.tmp', self.cache_path)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = {} # only needed while loading the dataset, so not copied to workers
+        return state
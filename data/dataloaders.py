@@ -3,6 +3,7 @@
 
 import os
 import torch
+from multiprocessing.pool import ThreadPool
 from data.queues import UserEpisodicDatasetQueue, ObjectEpisodicDatasetQueue
 
 class DataLoader():
@@ -14,7 +15,9 @@ class DataLoader():
         mode = dataset_info['mode']
         if 'train' in mode:
             train_config_queue_fn = self.config_user_centric_queue if dataset_info['train_task_type'] == 'user_centric' else self.config_object_centric_queue
-            self.train_queue = train_config_queue_fn(
+            # build the train and validation queues at the same time
+            pool = ThreadPool(2)
+            train_queue = pool.apply_async(train_config_queue_fn, (
                                         os.path.join(dataset_info['data_path'], 'train'),
                                         dataset_info['train_way_method'],
                                         dataset_info['train_object_cap'],
@@ -28,12 +31,23 @@ class DataLoader():
                                         dataset_info['frame_norm_method'],
                                         dataset_info['annotations_to_load'],
                                         dataset_info['train_filter_by_annotations'],
-                                        dataset_info['num_train_tasks'],
+                                        dataset_info['num_train_tasks']), dict(
                                         with_cluster_labels=dataset_info['with_cluster_labels'],
                                         with_caps=dataset_info['with_train_shot_caps'],
                                         shuffle=True,
-                                        logfile=dataset_info['logfile'])
-            self.validation_queue = self.config_user_centric_queue(
+                                        logfile=dataset_info['logfile'],
+                                        frame_store=dataset_info['frame_store'],
+                                        with_manifest=dataset_info['with_manifest'],
+                                        num_index_threads=dataset_info['num_index_threads'],
+                                        with_uint8_frames=dataset_info['with_uint8_frames'],
+                                        frame_cache=dataset_info['frame_cache'],
+                                        num_decode_threads=dataset_info['num_decode_threads'],
+                                        with_lazy_targets=dataset_info['with_lazy_targets'],
+                                        shared_frame_cache_mb=dataset_info['shared_frame_cache_mb'],
+                                        with_persistent_workers=dataset_info['with_persistent_workers'],
+                                        prefetch_factor=dataset_info['prefetch_factor'],
+                                        task_buffer_mb=dataset_info['task_buffer_mb']))
+            validation_queue = pool.apply_async(self.config_user_centric_queue, (
                                         os.path.join(dataset_info['data_path'], 'validation'),
                                         dataset_info['test_way_method'],
                                         dataset_info['test_object_cap'],
@@ -47,9 +61,29 @@ class DataLoader():
                                         dataset_info['frame_norm_method'],
                                         dataset_info['annotations_to_load'],
                                         dataset_info['test_filter_by_annotations'],
-                                        dataset_info['num_val_tasks'],
+                                        dataset_info['num_val_tasks']), dict(
                                         test_mode=True,
-                                        logfile=dataset_info['logfile'])
+                                        logfile=dataset_info['logfile'],
+                                        frame_store=dataset_info['frame_store'],
+                                        with_manifest=dataset_info['with_manifest'],
+                                        num_index_threads=dataset_info['num_index_threads'],
+                                        with_uint8_frames=dataset_info['with_uint8_frames'],
+                                        frame_cache=dataset_info['frame_cache'],
+                                        num_decode_threads=dataset_info['num_decode_threads'],
+                                        with_lazy_targets=dataset_info['with_lazy_targets'],
+                                        shared_frame_cache_mb=dataset_info['shared_frame_cache_mb'],
+                                        with_persistent_workers=dataset_info['with_persistent_workers'],
+                                        prefetch_factor=dataset_info['prefetch_factor'],
+                                        task_buffer_mb=dataset_info['task_buffer_mb'],
+                                        with_user_frame_cache=dataset_info['with_user_frame_cache'],
+                                        task_plan_dir=dataset_info['task_plan_dir'],
+                                        task_plan_seed=dataset_info['task_plan_seed'],
+                                        task_plan_shard=dataset_info['task_plan_shard'],
+                                        with_task_frame_cache=dataset_info['with_task_frame_cache']))
+            pool.close()
+            pool.join()
+            self.train_queue = train_queue.get()
+            self.validation_queue = validation_queue.get()
         if 'test' in mode:
             self.test_queue = self.config_user_centric_queue(
                                         os.path.join(dataset_info['data_path'], dataset_info['test_set']),
@@ -67,7 +101,23 @@ class DataLoader():
                                         dataset_info['test_filter_by_annotations'],
                                         dataset_info['num_test_tasks'],
                                         test_mode=True,
-                                        logfile=dataset_info['logfile'])
+                                        logfile=dataset_info['logfile'],
+                                        frame_store=dataset_info['frame_store'],
+                                        with_manifest=dataset_info['with_manifest'],
+                                        num_index_threads=dataset_info['num_index_threads'],
+                                        with_uint8_frames=dataset_info['with_uint8_frames'],
+                                        frame_cache=dataset_info['frame_cache'],
+                                        num_decode_threads=dataset_info['num_decode_threads'],
+                                        with_lazy_targets=dataset_info['with_lazy_targets'],
+                                        shared_frame_cache_mb=dataset_info['shared_frame_cache_mb'],
+                                        with_persistent_workers=dataset_info['with_persistent_workers'],
+                                        prefetch_factor=dataset_info['prefetch_factor'],
+                                        task_buffer_mb=dataset_info['task_buffer_mb'],
+                                        with_user_frame_cache=dataset_info['with_user_frame_cache'],
+                                        task_plan_dir=dataset_info['task_plan_dir'],
+                                        task_plan_seed=dataset_info['task_plan_seed'],
+                                        task_plan_shard=dataset_info['task_plan_shard'],
+                                        with_task_frame_cache=dataset_info['with_task_frame_cache'])
 
     def get_train_queue(self):
         return self.train_queue
@@ -80,14 +130,14 @@ class DataLoader():
     
     def config_user_centric_queue(self, root, way_method, object_cap, shot_method, shots, video_types, \
                             subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, \
-                            num_tasks, test_mode=False, with_cluster_labels=False, with_caps=False, shuffle=False, logfile=None):
+                            num_tasks, test_mode=False, with_cluster_labels=False, with_caps=False, shuffle=False, logfile=None, frame_store='directory', with_manifest=False, num_index_threads=8, with_uint8_frames=False, frame_cache=None, num_decode_threads=None, with_lazy_targets=False, shared_frame_cache_mb=0, with_user_frame_cache=False, with_persistent_workers=False, prefetch_factor=2, task_buffer_mb=0, task_plan_dir=None, task_plan_seed=0, task_plan_shard=(0, 1), with_task_frame_cache=False):
         return UserEpisodicDatasetQueue(root, way_method, object_cap, shot_method, shots, video_types, \
                                 subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, \
-                                num_tasks, test_mode, with_cluster_labels, with_caps, shuffle, logfile=logfile)
+                                num_tasks, test_mode, with_cluster_labels, with_caps, shuffle, logfile=logfile, frame_store=frame_store, with_manifest=with_manifest, num_index_threads=num_index_threads, with_uint8_frames=with_uint8_frames, frame_cache=frame_cache, num_decode_threads=num_decode_threads, with_lazy_targets=with_lazy_targets, shared_frame_cache_mb=shared_frame_cache_mb, with_user_frame_cache=with_user_frame_cache, with_persistent_workers=with_persistent_workers, prefetch_factor=prefetch_factor, task_buffer_mb=task_buffer_mb, task_plan_dir=task_plan_dir, task_plan_seed=task_plan_seed, task_plan_shard=task_plan_shard, with_task_frame_cache=with_task_frame_cache)
     
     def config_object_centric_queue(self, root, way_method, object_cap, shot_method, shots, video_types, \
                             subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, \
-                            num_tasks, test_mode=False, with_cluster_labels=False, with_caps=False, shuffle=False, logfile=None):
+                            num_tasks, test_mode=False, with_cluster_labels=False, with_caps=False, shuffle=False, logfile=None, frame_store='directory', with_manifest=False, num_index_threads=8, with_uint8_frames=False, frame_cache=None, num_decode_threads=None, with_lazy_targets=False, shared_frame_cache_mb=0, with_user_frame_cache=False, with_persistent_workers=False, prefetch_factor=2, task_buffer_mb=0, task_plan_dir=None, task_plan_seed=0, task_plan_shard=(0, 1), with_task_frame_cache=False):
         return ObjectEpisodicDatasetQueue(root, way_method, object_cap, shot_method, shots, video_types, \
                                 subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, \
-                                num_tasks, test_mode, with_cluster_labels, with_caps, shuffle, logfile=logfile) 
+                                num_tasks, test_mode, with_cluster_labels, with_caps, shuffle, logfile=logfile, frame_store=frame_store, with_manifest=with_manifest, num_index_threads=num_index_threads, with_uint8_frames=with_uint8_frames, frame_cache=frame_cache, num_decode_threads=num_decode_threads, with_lazy_targets=with_lazy_targets, shared_frame_cache_mb=shared_frame_cache_mb, with_user_frame_cache=with_user_frame_cache, with_persistent_workers=with_persistent_workers, prefetch_factor=prefetch_factor, task_buffer_mb=task_buffer_mb, task_plan_dir=task_plan_dir, task_plan_seed=task_plan_seed, task_plan_shard=task_plan_shard, with_task_frame_cache=with_task_frame_cache) 
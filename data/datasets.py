@@ -2,24 +2,34 @@
 # Licensed under the MIT license.
 
 import os
-import glob
 import json
 import torch
+import pickle
 import random
+import itertools
 import numpy as np
-from PIL import Image
 from tqdm import tqdm
-from typing import Dict, List, Union
+from abc import ABC, abstractmethod
+from multiprocessing.pool import ThreadPool
+from typing import Dict, List, Tuple
 from torch.utils.data import Dataset
 import torchvision.transforms.functional as tv_F
 
+from data.frame_stores import create_frame_store
+from data.annotation_store import AnnotationStore
+from data.shared_frame_cache import SharedFrameCache
+from data.task_buffers import TaskBufferRing
+from data.task_plans import TaskPlan
+from data.task_frame_cache import TaskFrameCache
 from utils.logging import print_and_log
 
-class ORBITDataset(Dataset):
+class ORBITDataset(Dataset, ABC):
     """
     Base class for ORBIT dataset.
     """
-    def __init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile=None):
+    manifest_version = 1
+
+    def __init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile=None, frame_store='directory', with_manifest=False, num_index_threads=8, with_uint8_frames=False, frame_cache=None, num_decode_threads=1, with_lazy_targets=False, shared_frame_cache_mb=0, with_user_frame_cache=False, task_buffer_mb=0, num_task_buffers=1):
         """
         Creates instance of ORBITDataset.
         :param root: (str) Path to train/validation/test folder in ORBIT dataset root folder.
@@ -39,6 +49,17 @@ class ORBITDataset(Dataset):
         :param with_cluster_labels: (bool) If True, use object cluster labels, otherwise use raw object labels.
         :param with_caps: (bool) If True, impose caps on the number of videos per object, otherwise leave uncapped.
         :param logfile: (file object) File for printing out loaded data summaries.
+        :param frame_store: (str) Backend to load frames from. If 'directory', load per-frame JPEGs, if 'shards', load from memory-mapped uint8 shards per video, if 'packs', decode from JPEG pack files per video, if 'zip', decode from the train/validation/test ZIP.
+        :param with_manifest: (bool) If True, load users, objects, videos and (filtered) frames from a dataset manifest saved next to the dataset root, only rescanning users whose folders have changed since it was saved.
+        :param num_index_threads: (int) Number of threads to scan users with when loading the dataset.
+        :param with_uint8_frames: (bool) If True, return clips as uint8 (with the stats to normalise them in the task), otherwise return them as normalised float32.
+        :param frame_cache: (str or None) Path to folder (ideally on local disk) to cache frames in once they have been resized to frame_size, e.g. when loading from the original 1080x1080 frames. If None, frames are not cached.
+        :param num_decode_threads: (int) Number of threads to decode a task's frames with, per process (i.e. per DataLoader worker).
+        :param with_lazy_targets: (bool) If True and in test mode, return per-video frame IDs in place of target frames, to be loaded on demand with self.stream_target_videos().
+        :param shared_frame_cache_mb: (int) Size in MB of the cache of decoded frames in shared memory, shared by all DataLoader workers and across epochs. If 0, frames are not cached in memory.
+        :param with_user_frame_cache: (bool) If True, keep the frames loaded for a user's (or object's) tasks in memory until a task for a different user (or object) is sampled. Useful when tasks are not shuffled.
+        :param task_buffer_mb: (int) Size in MB of each buffer in the ring of shared memory buffers that tasks' clips are loaded into. If 0, each task's clips are loaded into a new tensor.
+        :param num_task_buffers: (int) Number of buffers in the ring. Should be larger than the number of tasks loaded in advance by all DataLoader workers.
         :return: Nothing.
         """
         self.root = root
@@ -52,7 +73,9 @@ class ORBITDataset(Dataset):
         self.clip_length = clip_length
         self.frame_size = frame_size
         self.frame_norm_method = frame_norm_method
+        self.with_uint8_frames = with_uint8_frames
         self.test_mode = test_mode
+        self.with_lazy_targets = with_lazy_targets
         self.with_cluster_labels = with_cluster_labels
         self.with_caps = with_caps
         self.logfile = logfile
@@ -68,7 +91,6 @@ class ORBITDataset(Dataset):
             print_and_log(self.logfile, f"Filtering target frames {self.filter_target}.") 
 
         if self.with_annotations or self.with_frame_filtering:
-            self.annotation_dims = {'object_bounding_box': 4 }
             self.annotation_root = os.path.join(os.path.dirname(self.root),  "annotations", f"{self.mode}")       # e.g. /data/orbit_benchmark/annotations/{train,validation,test}
             if not os.path.isdir(self.annotation_root):
                 raise IOError(f"Annotation directory {self.annotation_root} does not exist.")
@@ -85,17 +107,33 @@ class ORBITDataset(Dataset):
             self.normalize_stats = {'mean' : [0.5, 0.5, 0.5], 'std' : [0.5, 0.5, 0.5]} # imagenet inception pixel stats
         elif self.frame_norm_method == 'openai_clip':
             self.normalize_stats = {'mean' : [0.48145466, 0.4578275, 0.40821073], 'std': [0.26862954, 0.26130258, 0.27577711]} # clip pixel stats
+        self.frame_store = create_frame_store(frame_store, self.root, self.frame_size, frame_cache, num_decode_threads)
+        self.shared_frame_cache = SharedFrameCache(self.frame_size, shared_frame_cache_mb * 1024**2) if shared_frame_cache_mb > 0 else None
+        self.with_user_frame_cache = with_user_frame_cache
+        self.user_frame_cache, self.user_frame_cache_id = {}, None  # Dictionary of frame ID (int): frame (torch.Tensor) for the tasks of the current user/object, and its ID
+        self.task_buffers = TaskBufferRing(num_task_buffers, task_buffer_mb * 1024**2) if task_buffer_mb > 0 else None
+        self.task_plan = None   # TaskPlan to load tasks from, if set with self.set_task_plan(), otherwise tasks are sampled on the fly
+        self.task_frame_cache = None    # TaskFrameCache of self.task_plan's frames, if set with self.cache_task_frames()
+        self.with_manifest = with_manifest
+        self.num_index_threads = num_index_threads
+        self.manifest_path = os.path.join(os.path.dirname(self.root), "manifests", f"{self.mode}_{frame_store}.pkl")    # e.g. /data/orbit_benchmark/manifests/{train,validation,test}_directory.pkl
+        self.annotation_store = None    # Columnar frame annotations, looked up by frame name
+        if self.with_annotations or self.with_frame_filtering:
+            annotation_cache_path = os.path.join(os.path.dirname(self.root), "manifests", f"{self.mode}_annotations.pkl") if self.with_manifest else None
+            self.annotation_store = AnnotationStore(self.annotation_root, self.frame_size, self.original_frame_size, annotation_cache_path)
 
         # Setup empty collections.
         self.users = []         # List of users (str)
         self.user2objs = {}     # Dictionary of user (str): list of object ids (int)
         self.obj2user = {}      # Dictionary of object id (int) to user ids (str)
         self.obj2name = {}      # Dictionary of object id (int) to object label (str)
-        self.obj2vids = {}      # Dictionary of dictionaries: {"clean": list of video paths (str), "clutter": list of video paths (str)}
-        self.video2id = {}      # Dictionary of video path (str): video id (int)
-        self.frame2anns = {}    # Dictionary of frame id (str): annotation information (dict of str to tensor)
+        self.obj2vids = {}      # Dictionary of dictionaries: {"context": range of video ids (int), "target": range of video ids (int)}
         self.frame2crops = {}    # Dictionary of frame id (str): valid crops (list)
-        self.vid2frames = {}    # Dictionary of video id (str) to list of valid frame paths
+        # Compact index of videos and their valid frames, in numpy arrays so that forked workers do not copy it by touching reference counts
+        self.video_paths = np.array([], dtype=str)                  # Path of each video (str), indexed by video id
+        self.video_frame_ranges = np.zeros((0, 2), dtype=np.int64)  # [start, end) range of each video's frames in the frame name buffer, indexed by video id
+        self.frame_name_buffer = np.zeros(0, dtype=np.uint8)        # UTF-8 encoded frame names of all videos, concatenated
+        self.frame_name_offsets = np.zeros(1, dtype=np.int64)       # Offset of each frame name in the frame name buffer, followed by the buffer's length
         if self.with_cluster_labels:
             self.obj2cluster = []   # List of object id (int) to cluster id (int)
 
@@ -133,49 +171,51 @@ class ORBITDataset(Dataset):
                             }
                         }
 
+        manifest = self.__load_manifest() if self.with_manifest else None
+        manifest_updated, num_rescanned = False, 0
+        scanned_users = {}
+
         obj_id, vid_id = 0, 0
+        video_paths, video_frame_names = [], []
         context_video_counter, target_video_counter = 0, 0
-        video_types = {'context': self.context_type, 'target': self.target_type}
-        for user in tqdm(sorted(os.listdir(self.root)), desc=f"Loading {self.mode} users from {self.root}"): # loop over users
+        users = sorted(self.frame_store.listdir(self.root))
+        cached_entries = [manifest['users'].get(user) if manifest else None for user in users]
+        # scan users in parallel, but merge them in sorted order so object and video IDs do not depend on the number of threads
+        scan_user = lambda user_and_entry: self.__scan_user(*user_and_entry)
+        pool = ThreadPool(self.num_index_threads) if self.num_index_threads > 1 else None
+        scanned = pool.imap(scan_user, zip(users, cached_entries)) if pool else map(scan_user, zip(users, cached_entries))
+        for user, cached_entry, (user_entry, user_annotations, user_updated) in tqdm(zip(users, cached_entries, scanned), total=len(users), desc=f"Loading {self.mode} users from {self.root}"): # loop over users
+            scanned_users[user] = user_entry
+            manifest_updated = manifest_updated or user_updated
+            num_rescanned += 1 if user_entry is not cached_entry else 0
+            for video_name, video_annotations in user_annotations.items():
+                self.annotation_store.add_video(video_name, video_annotations)
+
             user_path = os.path.join(self.root, user)
             obj_ids = []
 
             # loop over objects per user
-            for obj_name in sorted(os.listdir(user_path)):
+            for obj_name in sorted(user_entry['objects'].keys()):
                 obj_path = os.path.join(user_path, obj_name)
-                all_videos_by_set = {'context': [], 'target': []}
+                obj_entry = user_entry['objects'][obj_name]
                 filtered_videos_by_set = {'context': [], 'target': []}
-                filtered_vid2frames = {}
-                
-                # get correct video types for context and target sets
-                clean_videos_dir  = os.path.join(obj_path, 'clean')
-                if self.context_type == 'clean' and self.target_type == 'clean':
-                    clean_video_paths = sorted(list(os.listdir(clean_videos_dir)))
-                    split = min(5, len(clean_video_paths)-1) # aim for 5 context videos, leaving at least 1 target video
-                    all_videos_by_set['context'] = clean_video_paths[:split]
-                    all_videos_by_set['target'] = clean_video_paths[split:]
-                elif self.context_type == 'clean' and self.target_type == 'clutter':
-                    clutter_videos_dir = os.path.join(obj_path, 'clutter')
-                    all_videos_by_set['context'] = sorted(list(os.listdir(clean_videos_dir)))
-                    all_videos_by_set['target'] = sorted(list(os.listdir(clutter_videos_dir)))
+                filtered_video_frames = {}
                 
                 # loop over each set [context, target]
-                for set_type, video_names in all_videos_by_set.items():
+                for set_type, videos in self.__split_object_videos(obj_entry).items():
+                    criteria_key = ','.join(self.filter_params[set_type]['criteria'])
                     # loop over videos in set
-                    for video_name in video_names:
-                        video_path = os.path.join(obj_path, video_types[set_type], video_name)
-                        frames = glob.glob(os.path.join(video_path, "*.jpg"))
-
-                        if self.with_annotations or self.filter_params[set_type]['criteria']:
-                            video_annotations = self.__load_video_annotations(video_name)
-                            self.frame2anns.update(video_annotations)
-                            if self.filter_params[set_type]['criteria']:
-                                frames = self.__filter_video_frames(frames, video_annotations, self.filter_params[set_type]['criteria'])
+                    for video_type, video_name in videos:
+                        video_path = os.path.join(obj_path, video_type, video_name)
+                        video_entry = obj_entry[video_type][video_name]
+                        frame_names = video_entry['frames'].split('\n') if video_entry['frames'] else []
+                        if criteria_key:
+                            frame_names = [frame_names[i] for i in video_entry['filtered'][criteria_key]]
                         
                         # only add if a minimum number of frames exist for the video
-                        if len(frames) >= self.filter_params[set_type]['min_video_frames']:
+                        if len(frame_names) >= self.filter_params[set_type]['min_video_frames']:
                             filtered_videos_by_set[set_type].append(video_path)
-                            filtered_vid2frames[video_path] = sorted(frames)
+                            filtered_video_frames[video_path] = frame_names
                
                 context_set_valid = len(filtered_videos_by_set['context']) > 0
                 target_set_valid = len(filtered_videos_by_set['target']) > 0
@@ -183,11 +223,15 @@ class ORBITDataset(Dataset):
                     obj_ids.append(obj_id)
                     self.obj2user[obj_id] = user
                     self.obj2name[obj_id] = obj_name
-                    self.obj2vids[obj_id] = filtered_videos_by_set
+                    num_context_videos, num_target_videos = len(filtered_videos_by_set['context']), len(filtered_videos_by_set['target'])
+                    self.obj2vids[obj_id] = {
+                        'context': range(vid_id, vid_id + num_context_videos),
+                        'target': range(vid_id + num_context_videos, vid_id + num_context_videos + num_target_videos)
+                    }
                     obj_id += 1
                     for video_path in filtered_videos_by_set['context'] + filtered_videos_by_set['target']:
-                        self.video2id[video_path] = vid_id
-                        self.vid2frames[video_path] = filtered_vid2frames[video_path]
+                        video_paths.append(video_path)
+                        video_frame_names.append(filtered_video_frames[video_path])
                         vid_id += 1
                     if self.with_cluster_labels:
                         self.obj2cluster[obj_id] = cluster_id_map[vid2cluster[video_name]]
@@ -198,12 +242,231 @@ class ORBITDataset(Dataset):
             if user_valid:
                 self.users.append(user)
                 self.user2objs[user] = obj_ids 
+
+        if pool:
+            pool.close()
+            pool.join()
+        self.__build_video_index(video_paths, video_frame_names)
+
+        if self.annotation_store is not None:
+            self.annotation_store.build()
+            try:
+                self.annotation_store.save_cache()
+            except OSError as e:
+                print_and_log(self.logfile, f"warning: could not save annotation cache {self.annotation_store.cache_path} ({e}).")
+
+        if manifest is not None:
+            manifest_updated = manifest_updated or set(manifest['users'].keys()) != set(scanned_users.keys())
+            manifest['users'] = scanned_users
+            print_and_log(self.logfile, f"Dataset manifest {self.manifest_path}: {num_rescanned}/{len(scanned_users)} users scanned, {len(scanned_users)-num_rescanned} reused.")
+            if manifest_updated:
+                self.__save_manifest(manifest)
         
         self.num_users = len(self.users)
         self.num_objects = len(self.obj2name)
         self.print_frame_count_bounds()
-        print_and_log(self.logfile, f"Loaded data summary: {self.num_users} users, {self.num_objects} objects, {len(self.video2id)} videos (#context: {context_video_counter}, #target: {target_video_counter})")
+        print_and_log(self.logfile, f"Loaded {self.mode} data summary: {self.num_users} users, {self.num_objects} objects, {len(self.video_paths)} videos (#context: {context_video_counter}, #target: {target_video_counter})")
     
+    def __build_video_index(self, video_paths: List[str], video_frame_names: List[List[str]]) -> None:
+        """
+        Function to build the compact index of videos and their frames.
+        :param video_paths: (list::str) Path of each video, in order of video id.
+        :param video_frame_names: (list::list::str) Names of each video's valid frames.
+        :return: Nothing.
+        """
+        num_video_frames = np.array([len(frame_names) for frame_names in video_frame_names], dtype=np.int64)
+        video_frame_ends = np.cumsum(num_video_frames)
+        encoded_frame_names = [frame_name.encode() for frame_names in video_frame_names for frame_name in frame_names]
+        self.video_paths = np.array(video_paths, dtype=str)
+        self.video_frame_ranges = np.stack((video_frame_ends - num_video_frames, video_frame_ends), axis=1).reshape(-1, 2)
+        self.frame_name_buffer = np.frombuffer(b''.join(encoded_frame_names), dtype=np.uint8).copy()
+        self.frame_name_offsets = np.concatenate(([0], np.cumsum([len(frame_name) for frame_name in encoded_frame_names], dtype=np.int64)))
+
+    def get_num_video_frames(self, video_id: int) -> int:
+        """
+        Function to get the number of valid frames in a video.
+        :param video_id: (int) Video ID.
+        :return: (int) Number of valid frames.
+        """
+        start, end = self.video_frame_ranges[video_id]
+        return int(end - start)
+
+    def get_frame_ids(self, video_id: int, frame_idxs: np.ndarray) -> np.ndarray:
+        """
+        Function to get the dataset-wide IDs of (a subset of) a video's frames.
+        :param video_id: (int) Video ID.
+        :param frame_idxs: (np.ndarray) Indices of frames within the video's valid frames.
+        :return: (np.ndarray) Frame IDs, dtype int32.
+        """
+        return (self.video_frame_ranges[video_id, 0] + np.asarray(frame_idxs, dtype=np.int64)).astype(np.int32)
+
+    def locate_frames(self, frame_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Function to look up the video and the index within the video's valid frames of each frame ID.
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :return: (np.ndarray, np.ndarray) Video ID and frame index of each frame, dtype int64.
+        """
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        video_ids = np.searchsorted(self.video_frame_ranges[:, 1], frame_ids, side='right')
+        return video_ids, frame_ids - self.video_frame_ranges[video_ids, 0]
+
+    def get_frame_names(self, frame_ids: np.ndarray) -> List[str]:
+        """
+        Function to rebuild the file names of frames from the compact index.
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :return: (list::str) Frame names, flattened.
+        """
+        rows = np.asarray(frame_ids, dtype=np.int64).reshape(-1)
+        starts, ends = self.frame_name_offsets[rows], self.frame_name_offsets[rows + 1]
+        return [self.frame_name_buffer[start:end].tobytes().decode() for start, end in zip(starts.tolist(), ends.tolist())]
+
+    def get_frame_paths(self, frame_ids: np.ndarray) -> np.ndarray:
+        """
+        Function to rebuild the paths of frames from the compact index.
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :return: (np.ndarray::str) Frame paths, of the same shape as frame_ids.
+        """
+        video_ids, _ = self.locate_frames(np.reshape(frame_ids, -1))
+        frame_names = self.get_frame_names(frame_ids)
+        return np.array([os.path.join(video_path, frame_name) for video_path, frame_name in zip(self.video_paths[video_ids], frame_names)], dtype=str).reshape(np.shape(frame_ids))
+
+    def __split_object_videos(self, obj_entry: Dict) -> Dict[str, List[tuple]]:
+        """
+        Function to split an object's videos into context and target sets according to self.context_type and self.target_type.
+        :param obj_entry: (dict) Object's entry in the dataset manifest, with its videos by video type.
+        :return: (dict::list::tuple) Dictionary of context and target sets: list of (video type, video name).
+        """
+        all_videos_by_set = {'context': [], 'target': []}
+        if self.context_type == 'clean' and self.target_type == 'clean':
+            clean_video_names = sorted(obj_entry['clean'].keys())
+            split = min(5, len(clean_video_names)-1) # aim for 5 context videos, leaving at least 1 target video
+            all_videos_by_set['context'] = [('clean', video_name) for video_name in clean_video_names[:split]]
+            all_videos_by_set['target'] = [('clean', video_name) for video_name in clean_video_names[split:]]
+        elif self.context_type == 'clean' and self.target_type == 'clutter':
+            all_videos_by_set['context'] = [('clean', video_name) for video_name in sorted(obj_entry['clean'].keys())]
+            all_videos_by_set['target'] = [('clutter', video_name) for video_name in sorted(obj_entry['clutter'].keys())]
+
+        return all_videos_by_set
+
+    def __scan_user(self, user: str, cached_entry: Dict=None):
+        """
+        Function to scan a user's objects, videos and frames, and filter their frames by annotations. A cached manifest entry is reused if none of the user's folders have been modified since it was made.
+        :param user: (str) User ID.
+        :param cached_entry: (dict or None) User's entry in the dataset manifest, if one exists.
+        :return: (dict, dict, bool) User's manifest entry, annotations of the user's videos if self.with_annotations, and whether the entry was created or updated.
+        """
+        user_path = os.path.join(self.root, user)
+        video_types = sorted(set([self.context_type, self.target_type]))
+        if cached_entry is not None and set(video_types) <= set(cached_entry['video_types']) and self.__is_entry_valid(user_path, cached_entry):
+            user_entry, updated = cached_entry, False
+        else:
+            user_entry, updated = self.__crawl_user(user_path, video_types), True
+
+        user_annotations = {}
+        for obj_name, obj_entry in user_entry['objects'].items():
+            for set_type, videos in self.__split_object_videos(obj_entry).items():
+                criteria = self.filter_params[set_type]['criteria']
+                criteria_key = ','.join(criteria)
+                for video_type, video_name in videos:
+                    video_entry = obj_entry[video_type][video_name]
+                    needs_filtering = criteria and criteria_key not in video_entry['filtered']
+                    if not self.with_annotations and not needs_filtering:
+                        continue
+
+                    video_annotations = self.annotation_store.load_video(video_name)
+                    if self.with_annotations:
+                        user_annotations[video_name] = video_annotations
+                    if needs_filtering:
+                        frame_names = video_entry['frames'].split('\n') if video_entry['frames'] else []
+                        mask = self.annotation_store.filter_mask(video_annotations, criteria)
+                        rows = self.annotation_store.get_video_rows(video_annotations, frame_names)
+                        video_entry['filtered'][criteria_key] = np.flatnonzero(mask[rows]).astype(np.int32)
+                        updated = True
+
+        return user_entry, user_annotations, updated
+
+    def __crawl_user(self, user_path: str, video_types: List[str]) -> Dict:
+        """
+        Function to list a user's objects, videos and frames from the frame store.
+        :param user_path: (str) Path to user's folder.
+        :param video_types: (list::str) Video types to list per object.
+        :return: (dict) User's manifest entry, with the modification time of each folder, and the sorted frame names of each video (joined by newlines).
+        """
+        user_entry = {'video_types': video_types, 'mtimes': {'': self.frame_store.getmtime(user_path)}, 'objects': {}}
+        for obj_name in self.frame_store.listdir(user_path):
+            obj_path = os.path.join(user_path, obj_name)
+            user_entry['mtimes'][obj_name] = self.frame_store.getmtime(obj_path)
+            obj_entry = user_entry['objects'].setdefault(obj_name, {})
+            for video_type in video_types:
+                videos_dir = os.path.join(obj_path, video_type)
+                user_entry['mtimes'][f"{obj_name}/{video_type}"] = self.frame_store.getmtime(videos_dir)
+                obj_entry[video_type] = {}
+                for video_name in self.frame_store.listdir(videos_dir):
+                    video_path = os.path.join(videos_dir, video_name)
+                    user_entry['mtimes'][f"{obj_name}/{video_type}/{video_name}"] = self.frame_store.getmtime(video_path)
+                    frame_names = sorted(os.path.basename(frame_path) for frame_path in self.frame_store.list_frames(video_path))
+                    obj_entry[video_type][video_name] = {'frames': '\n'.join(frame_names), 'filtered': {}} # filtered: dictionary of filter criteria (str): indices of frames that satisfy them (np.ndarray)
+
+        return user_entry
+
+    def __is_entry_valid(self, user_path: str, user_entry: Dict) -> bool:
+        """
+        Function to check whether a user's manifest entry is still valid, i.e. none of their folders have been modified, added or removed.
+        :param user_path: (str) Path to user's folder.
+        :param user_entry: (dict) User's manifest entry.
+        :return: (bool) True if the entry is valid.
+        """
+        try:
+            for relpath, mtime in user_entry['mtimes'].items():
+                if self.frame_store.getmtime(os.path.join(user_path, relpath)) != mtime:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def __load_manifest(self) -> Dict:
+        """
+        Function to load the dataset manifest from self.manifest_path. Returns an empty manifest if it does not exist or is out of date.
+        :return: (dict) Dataset manifest.
+        """
+        annotation_mtime = os.path.getmtime(self.annotation_root) if self.with_annotations or self.with_frame_filtering else None
+        empty_manifest = {'version': self.manifest_version, 'annotation_mtime': annotation_mtime, 'users': {}}
+        if not os.path.isfile(self.manifest_path):
+            return empty_manifest
+
+        try:
+            with open(self.manifest_path, 'rb') as manifest_file:
+                manifest = pickle.load(manifest_file)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            print_and_log(self.logfile, f"warning: could not load dataset manifest {self.manifest_path} ({e}); rebuilding it.")
+            return empty_manifest
+        if not isinstance(manifest, dict) or manifest.get('version') != self.manifest_version:
+            return empty_manifest
+
+        if annotation_mtime is not None and manifest['annotation_mtime'] != annotation_mtime: # annotations have changed, so refilter all frames
+            for user_entry in manifest['users'].values():
+                for obj_entry in user_entry['objects'].values():
+                    for videos in obj_entry.values():
+                        for video_entry in videos.values():
+                            video_entry['filtered'] = {}
+            manifest['annotation_mtime'] = annotation_mtime
+
+        return manifest
+
+    def __save_manifest(self, manifest: Dict) -> None:
+        """
+        Function to save the dataset manifest to self.manifest_path.
+        :param manifest: (dict) Dataset manifest.
+        :return: Nothing.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            with open(self.manifest_path + '.tmp', 'wb') as manifest_file:
+                pickle.dump(manifest, manifest_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        except OSError as e:
+            print_and_log(self.logfile, f"warning: could not save dataset manifest {self.manifest_path} ({e}).")
+
     def print_frame_count_bounds(self):
         
         current_bound = {
@@ -214,7 +477,7 @@ class ORBITDataset(Dataset):
         for user, objs in self.user2objs.items(): # users
             for obj in objs: # objects
                 for video_type, videos in self.obj2vids[obj].items(): # context/target
-                    frame_count = sum([len(self.vid2frames[video]) for video in videos]) # all frames (of current video_type) for current object
+                    frame_count = sum([self.get_num_video_frames(video) for video in videos]) # all frames (of current video_type) for current object
                     for bound_type in ['min', 'max']:
                         if bound_type == 'min':
                             update_bound = current_bound[bound_type][video_type]['frame_count'] is None or frame_count < current_bound[bound_type][video_type]['frame_count']
@@ -240,85 +503,50 @@ class ORBITDataset(Dataset):
         print_and_log(self.logfile, f"Max context frames/obj: {current_bound['max']['context']['frame_count']} ({max_context_summary})")
         print_and_log(self.logfile, f"Max target frames/obj: {current_bound['max']['target']['frame_count']} ({max_target_summary})")
 
-    def __filter_video_frames(self, frames: List[str], video_annotations, filter_criteria: List[str]=[]) -> List[str]:
-        filtered_frames = filter(lambda seq: self.is_criteria_satisfied(seq, video_annotations, filter_criteria), frames)
-        return list(filtered_frames)
-
-    def is_criteria_satisfied(self, frame_path: str, video_annotations: Dict[str, Dict[str, Union[bool, torch.Tensor]]], filter_criteria: List[str]=[]) -> List[str]:
-        frame_name = os.path.basename(frame_path)
-
-        # get all annotations for current frame
-        frame_annotations = [ann for ann, value in video_annotations[frame_name].items() if value == True ]
-        frame_annotations += [f'no_{ann}' for ann, value in video_annotations[frame_name].items() if value == False ]
-
-        # filter frame_annotations by those that match the annotations in filter_criteria 
-        criteria_present = set(frame_annotations) & set(filter_criteria)
-        return True if criteria_present else False 
-    
-    def __load_video_annotations(self, video_name: str) -> Dict[str, Dict[str, Union[bool, torch.Tensor]]]:
-        annotation_path = os.path.join(self.annotation_root, f"{video_name}.json")
-        with open(annotation_path, 'r') as annotation_file:
-            video_annotations = json.load(annotation_file)
-
-        if 'object_bounding_box' in self.annotations_to_load or 'object_bounding_box' in self.filter_context + self.filter_target:
-            video_annotations = self.__preprocess_bounding_boxes(video_annotations)
-        
-        return video_annotations
-    
-    def __preprocess_bounding_boxes(self, video_annotations: Dict[str, Dict[str, Union[bool, torch.Tensor]]]) -> Dict[str, Dict[str, Union[bool, torch.Tensor]]]:
-
-        for frame_id, annotation_dict in video_annotations.items():
-            if "object_bounding_box" in annotation_dict and annotation_dict["object_bounding_box"] is not None:
-                bbox = annotation_dict["object_bounding_box"]
-                bbox = torch.tensor([bbox["x"], bbox["y"], bbox["w"], bbox["h"]])
-                # Resize to fit current frame size.
-                bbox = ((bbox / self.original_frame_size) * self.frame_size).int()
-                # Clamp box to fit within frame.
-                bbox[0:2] = torch.clamp(bbox[0:2], 0, self.frame_size - 1)
-                bbox[2:4] = torch.clamp(bbox[2:4], 1, self.frame_size)
-                video_annotations[frame_id]["object_bounding_box"] = bbox
-
-        return video_annotations
-
     def __len__(self):
         return self.num_users
 
     def get_user_objects(self, user):
         return self.user2objs[ self.users[user] ]
 
-    def compute_way(self, num_objects):
+    def compute_way(self, num_objects, rng=None):
         """
         Function to compute the number of objects to sample for a user.
         :param num_objects: (int) Total number of objects for current user.
+        :param rng: (np.random.Generator or None) Random generator to sample with. If None, sample with Python's global random module.
         :return: (int) Total number if self.object_cap == 'max' otherwise returns a random number between 2 and total number.
         """
         # all user's objects if object_cap == 'max' else capped by self.object_cap
         max_objects = min(num_objects, self.object_cap)
         min_objects = 2
         if self.way_method == 'random':
-            return random.choice(range(min_objects, max_objects + 1))
+            return random.choice(range(min_objects, max_objects + 1)) if rng is None else int(rng.integers(min_objects, max_objects + 1))
         elif self.way_method == 'max':
             return max_objects
 
-    def sample_videos(self, object_videos):
+    def sample_videos(self, object_videos, rng=None):
         """
         Function to sample context and target video paths for a given object.
         :param object_videos: (dict::list::str) Dictionary of context and target video paths for an object.
+        :param rng: (np.random.Generator or None) Random generator to sample with. If None, sample with Python's global random module.
         :return: (list::str, list::str) Sampled context and target video paths for given object according to self.context_type (clean) and self.target_type (clean/clutter).
         """
-        context = self.choose_videos(object_videos['context'], self.shot_context, self.shot_method_context, self.context_shot_cap)
-        target = self.choose_videos(object_videos['target'], self.shot_target, self.shot_method_target, self.target_shot_cap)
+        context = self.choose_videos(object_videos['context'], self.shot_context, self.shot_method_context, self.context_shot_cap, rng)
+        target = self.choose_videos(object_videos['target'], self.shot_target, self.shot_method_target, self.target_shot_cap, rng)
         return context, target
     
-    def choose_videos(self, videos, required_shots, shot_method, shot_cap):
+    def choose_videos(self, videos, required_shots, shot_method, shot_cap, rng=None):
         """
         Function to choose video paths from a list of video paths according to required shots, shot method, and shot cap.
         :param videos: (list::str) List of video paths.
         :param required_shots: (int) Number of videos to select.
         :param shot_method: (str) Method to select videos with options for specific/fixed/random/max - see comments below.
         :param shot_cap: (int) Cap on number of videos to select.
+        :param rng: (np.random.Generator or None) Random generator to sample with. If None, sample with Python's global random module.
         :return: (list::str) List of selected video paths.
         """
+        if rng is not None:
+            return self.choose_videos_with_rng(videos, required_shots, shot_method, shot_cap, rng)
         required_shots = min(required_shots, shot_cap) # first cap for memory purposes
         num_videos = len(videos)
         available_shots = min(required_shots, num_videos) # next cap for video availability purposes
@@ -335,109 +563,186 @@ class ORBITDataset(Dataset):
             max_shots = min(num_videos, shot_cap) # capped for memory reasons
             return random.sample(videos, max_shots)
 
-    def sample_clips_from_videos(self, video_paths: List[str], sample_method: str):
+    def choose_videos_with_rng(self, videos, required_shots, shot_method, shot_cap, rng):
         """
-        Function to sample clips from a list of videos.
-        :param video_paths: (list::str) List of video paths.
-        :param sample_method: (str) Method to sample clips from each video.
-        :return: (list::torch.Tensor, list::np.ndarray, list::torch.Tensor, list::int) Frame data, paths, and annotations organised in clips of self.clip_length contiguous frames, and video ID for each sampled clip.
-        """
-        clips, paths, video_ids = [], [], []
-        annotations = { ann: [] for ann in self.annotations_to_load }
-        for video_path in video_paths:
-            frame_paths = np.array(self.vid2frames[video_path])
-            sampled_idxs = self.sample_clips_from_a_video(frame_paths, sample_method)
-            sampled_paths = frame_paths[sampled_idxs].reshape(-1, self.clip_length)
-            paths.extend(sampled_paths)
-
-            sampled_clips = self.load_clips(sampled_paths)
-            clips += sampled_clips
-            
-            if self.with_annotations:
-                sampled_annotations = self.load_annotations(sampled_paths)
-                annotations = self.extend_ann_dict(annotations, sampled_annotations)
-
-            video_ids.extend([self.video2id[video_path]] * len(sampled_paths))
+        Function to choose videos as self.choose_videos(), but sampling with a numpy random generator.
+        :param videos: (list::int) List of video IDs.
+        :param required_shots: (int) Number of videos to select.
+        :param shot_method: (str) Method to select videos with options for specific/fixed/random/max.
+        :param shot_cap: (int) Cap on number of videos to select.
+        :param rng: (np.random.Generator) Random generator to sample with.
+        :return: (list::int) List of selected video IDs.
+        """
+        videos = np.asarray(videos)
+        num_videos = len(videos)
+        available_shots = min(required_shots, shot_cap, num_videos)
+        max_shots = min(num_videos, shot_cap)
+        if shot_method == 'specific':
+            return videos[:available_shots].tolist()
+        elif shot_method == 'fixed':
+            num_shots = available_shots
+        elif shot_method == 'random':
+            num_shots = int(rng.integers(1, max_shots + 1))
+        elif shot_method == 'max':
+            num_shots = max_shots
+        return rng.choice(videos, num_shots, replace=False).tolist()
 
-        return clips, paths, video_ids, annotations
-    
-    def extend_ann_dict(self, dest_dict, src_dict):
+    def sample_clips_from_videos(self, video_ids: List[int], sample_method: str, rng=None) -> np.ndarray:
         """
-        Function to extend all lists within annotation dictionary.
-        :param dest_dict: (dict::list) Dictionary of lists to extend.
-        :param src_dict: (dict::list) Dictionary of lists to add.
-        :return: (dict::list) Dictionary of extended lists.
+        Function to sample clips from a list of videos. The clips' frames are loaded later, once the size of the whole task is known.
+        :param video_ids: (list::int) List of video IDs.
+        :param sample_method: (str) Method to sample clips from each video.
+        :param rng: (np.random.Generator or None) Random generator to sample with. If None, sample with Python's global random module.
+        :return: (np.ndarray) Frame IDs organised in clips of self.clip_length contiguous frames, of shape (num_clips, self.clip_length), dtype int32.
         """
-        for ann in dest_dict.keys():
-            dest_dict[ann].extend(src_dict[ann])
-
-        return dest_dict
+        frame_ids = [np.zeros((0, self.clip_length), dtype=np.int32)]
+        for video_id in video_ids:
+            sampled_idxs = self.sample_clips_from_a_video(self.get_num_video_frames(video_id), sample_method, rng)
+            frame_ids.append(self.get_frame_ids(video_id, sampled_idxs).reshape(-1, self.clip_length))
 
-    def load_clips(self, paths: np.ndarray) -> torch.Tensor:
+        return np.concatenate(frame_ids)
+    
+    def load_clips(self, frame_ids: np.ndarray, out: torch.Tensor=None) -> torch.Tensor:
         """
         Function to load clips from disk into tensors.
-        :param paths: (np.ndarray::str) Frame paths organised in clips of self.clip_length contiguous frames.
+        :param frame_ids: (np.ndarray) Frame IDs organised in clips of self.clip_length contiguous frames.
+        :param out: (torch.Tensor or None) Contiguous tensor of shape (num_clips, self.clip_length, 3, self.frame_size, self.frame_size) to load clips into. If None, a new tensor is allocated.
         :return: (torch.Tensor) Clip data.
         """
-        num_clips, clip_length = paths.shape
+        num_clips, clip_length = frame_ids.shape
         assert clip_length == self.clip_length
-        loaded_clips = torch.zeros(num_clips, clip_length, 3, self.frame_size, self.frame_size)
-
-        for clip_idx in range(num_clips):
-            for frame_idx in range(clip_length):
-                frame_path = paths[clip_idx, frame_idx]
-                loaded_clips[clip_idx, frame_idx] = self.load_and_transform_frame(frame_path)
+        frames_out = out.view(-1, 3, self.frame_size, self.frame_size) if out is not None and self.with_uint8_frames else None # decode straight into out
+        loaded_frames = self.load_user_frames(frame_ids.reshape(-1), frames_out) if self.with_user_frame_cache else self.load_frames(frame_ids.reshape(-1), frames_out)
+        loaded_clips = self.transform_frames(loaded_frames, None if out is None else out.view(-1, 3, self.frame_size, self.frame_size))
 
-        return loaded_clips
+        return loaded_clips.view(num_clips, clip_length, 3, self.frame_size, self.frame_size)
     
-    def load_annotations(self, paths: np.ndarray, without_clip_history=True) -> torch.Tensor:
+    def load_annotations(self, frame_ids: np.ndarray, without_clip_history=True) -> torch.Tensor:
         """
         Function to load frame annotations, arrange in clips.
-        :param paths: (np.ndarray::str) Frame paths organised in clips of self.clip_length contiguous frames.
+        :param frame_ids: (np.ndarray) Frame IDs organised in clips of self.clip_length contiguous frames.
         :param without_clip_history: (bool) If True, only load annotations for last frame in every clip.
         :return: (torch.Tensor) Frame annotations arranged in clips.
         """
-        num_clips, clip_length = paths.shape
+        num_clips, clip_length = frame_ids.shape
         frames_per_clip = 1 if without_clip_history else clip_length
         assert clip_length == self.clip_length
 
+        frame_ids = frame_ids[:, -1:] if without_clip_history else frame_ids
+        rows = self.annotation_store.get_rows(self.get_frame_names(frame_ids))
         loaded_annotations = {
-            annotation : torch.empty(num_clips, frames_per_clip, self.annotation_dims.get(annotation, 1))     # The dimension defaults to 1 unless specified.
+            annotation : self.annotation_store.gather(annotation, rows).view(num_clips, frames_per_clip, -1)
             for annotation in self.annotations_to_load }
 
-        for clip_idx in range(num_clips):
-            frames_to_load = [clip_length-1] if without_clip_history else range(clip_length)
-            for frame_idx in frames_to_load:
-                frame_path = paths[clip_idx, frame_idx]
-                frame_name = os.path.basename(frame_path)
-                for annotation in self.annotations_to_load:
-                    if self.frame2anns[frame_name][annotation] is not None:
-                        frame_anns = self.frame2anns[frame_name]
-                        loaded_annotations[annotation][clip_idx, frame_idx] = frame_anns[annotation]
-                    else:
-                        loaded_annotations[annotation][clip_idx, frame_idx] = float('nan')
-
         return loaded_annotations
     
-    def load_and_transform_frame(self, frame_path):
+    def load_frames(self, frame_ids: np.ndarray, out: torch.Tensor=None) -> torch.Tensor:
+        """
+        Function to load frames from self.task_frame_cache or self.shared_frame_cache if they are cached, otherwise from self.frame_store (and then cache them in self.shared_frame_cache).
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :param out: (torch.Tensor or None) Tensor of shape (num_frames, 3, self.frame_size, self.frame_size), dtype uint8, to load frames into. If None, a new tensor is allocated.
+        :return: (torch.Tensor) Frames of shape (num_frames, 3, self.frame_size, self.frame_size), dtype uint8.
+        """
+        if self.task_frame_cache is not None:
+            frames, missed = self.task_frame_cache.get(frame_ids, out)
+            if len(missed) > 0: # only if frames are loaded outside of self.task_plan
+                frames[missed] = self.frame_store.load_frames(self.get_frame_paths(frame_ids[missed]))
+            return frames
+        if self.shared_frame_cache is None:
+            return self.frame_store.load_frames(self.get_frame_paths(frame_ids), out)
+        keys = self.shared_frame_cache.get_keys(frame_ids)
+        frames, missed = self.shared_frame_cache.get(keys, out)
+        if len(missed) > 0:
+            frames[missed] = self.frame_store.load_frames(self.get_frame_paths(frame_ids[missed]))
+            self.shared_frame_cache.put(keys[missed], frames[missed])
+        return frames
+
+    def load_user_frames(self, frame_ids: np.ndarray, out: torch.Tensor=None) -> torch.Tensor:
+        """
+        Function to load frames from self.user_frame_cache if they have already been loaded for the current user/object, otherwise with self.load_frames() (and then cache them).
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :param out: (torch.Tensor or None) Tensor of shape (num_frames, 3, self.frame_size, self.frame_size), dtype uint8, to load frames into. If None, a new tensor is allocated.
+        :return: (torch.Tensor) Frames of shape (num_frames, 3, self.frame_size, self.frame_size), dtype uint8.
+        """
+        frame_ids = frame_ids.tolist()
+        missed = [frame_id for frame_id in frame_ids if frame_id not in self.user_frame_cache]
+        if len(missed) > 0:
+            missed_frames = self.load_frames(np.array(missed, dtype=np.int32))
+            for frame_id, frame in zip(missed, missed_frames):
+                self.user_frame_cache[frame_id] = frame
+        return torch.stack([self.user_frame_cache[frame_id] for frame_id in frame_ids], out=out)
+
+    def load_video_frames(self, video_frame_ids: np.ndarray, start: int=0, end: int=None) -> torch.Tensor:
+        """
+        Function to load and transform (a chunk of) a target video's frames from their frame IDs.
+        :param video_frame_ids: (np.ndarray) IDs of the video's sampled frames, as returned in a task's target clips if self.with_lazy_targets.
+        :param start: (int) Index of first sampled frame to load.
+        :param end: (int or None) Index after last sampled frame to load. If None, load up to the last sampled frame.
+        :return: (torch.Tensor) Loaded and transformed frames.
+        """
+        frames = self.load_frames(video_frame_ids[start:end])
+        return self.transform_frames(frames)
+
+    def stream_target_videos(self, target_videos: List, target_frame_ids: List[np.ndarray], target_labels: List[torch.Tensor], chunk_size: int=None):
+        """
+        Generator over a test/validation task's target videos. If self.with_lazy_targets, the videos' frames are loaded from their frame IDs in chunks,
+        with the next chunk loaded on a background thread while the current one is used. Each video's chunks should be used before moving to the next video.
+        :param target_videos: (list::torch.Tensor or list::np.ndarray) Task's target frames or frame IDs, grouped by video.
+        :param target_frame_ids: (list::np.ndarray) Task's target frame IDs, grouped by video.
+        :param target_labels: (list::torch.Tensor) Task's target labels, one per video.
+        :param chunk_size: (int or None) Number of frames per chunk. If None, each video is loaded as a single chunk.
+        :return: (generator) Iterator over the video's frame chunks (torch.Tensor), its frame IDs (np.ndarray) and its label (torch.Tensor), for each video.
+        """
+        if not self.with_lazy_targets:
+            for video_frames, video_frame_ids, video_label in zip(target_videos, target_frame_ids, target_labels):
+                yield iter(video_frames.split(chunk_size) if chunk_size else [video_frames]), video_frame_ids, video_label
+            return
+
+        chunks, num_chunks = [], []
+        for video_handle in target_videos:
+            num_frames = len(video_handle)
+            starts = range(0, num_frames, chunk_size if chunk_size else num_frames)
+            chunks.extend((video_handle, start, start + chunk_size if chunk_size else None) for start in starts)
+            num_chunks.append(len(starts))
+
+        pool = ThreadPool(1)
+        def prefetch_chunks():
+            next_chunk = pool.apply_async(self.load_video_frames, chunks[0]) if chunks else None
+            for i in range(len(chunks)):
+                chunk = next_chunk.get()
+                next_chunk = pool.apply_async(self.load_video_frames, chunks[i+1]) if i+1 < len(chunks) else None
+                yield chunk
+        try:
+            prefetched_chunks = prefetch_chunks()
+            for video_num_chunks, video_frame_ids, video_label in zip(num_chunks, target_frame_ids, target_labels):
+                video_chunks = itertools.islice(prefetched_chunks, video_num_chunks)
+                yield video_chunks, video_frame_ids, video_label
+                for _ in video_chunks: # skip any of the video's chunks that were not used
+                    pass
+        finally:
+            pool.close()
+
+    def transform_frames(self, frames: torch.Tensor, out: torch.Tensor=None) -> torch.Tensor:
         """
-        Function to load and transform frame.
-        :param frame_path: (str) Path to frame.
-        :return: (torch.Tensor) Loaded and transformed frame.
+        Function to convert uint8 frames to float and normalise them. If self.with_uint8_frames, frames are left as uint8 to be normalised on the model's device.
+        :param frames: (torch.Tensor) Frames of shape (..., 3, height, width), dtype uint8.
+        :param out: (torch.Tensor or None) Tensor of the same shape as frames, dtype float32 (uint8 if self.with_uint8_frames), to write transformed frames into. If None, a new tensor is allocated.
+        :return: (torch.Tensor) Transformed frames, dtype float32 (uint8 if self.with_uint8_frames).
         """
-        frame = Image.open(frame_path)
-        frame = tv_F.to_tensor(frame)
-        frame = tv_F.normalize(frame, mean=self.normalize_stats['mean'], std=self.normalize_stats['std'])
-        return frame
+        if self.with_uint8_frames:
+            return frames if out is None or out.data_ptr() == frames.data_ptr() else out.copy_(frames)
+        frames = frames.float().div(255) if out is None else torch.div(frames, 255, out=out)
+        return tv_F.normalize(frames, mean=self.normalize_stats['mean'], std=self.normalize_stats['std'], inplace=out is not None)
 
-    def sample_clips_from_a_video(self, frame_paths: np.ndarray, sample_method: str) -> np.ndarray:
+    def sample_clips_from_a_video(self, num_frames: int, sample_method: str, rng=None) -> np.ndarray:
         """
-        Function to sample frame IDs from a list of frame paths.
-        :param frame_paths: (np.ndarray::str) List of frame paths.
+        Function to sample frame IDs from a video.
+        :param num_frames: (int) Number of valid frames in the video.
         :param sample_method: (str) Method to sample clips from each video.
+        :param rng: (np.random.Generator or None) Random generator to sample with. If None, sample with Python's global random module.
         :return: (np.ndarray) Frame IDs organised in clips of self.clip_length contiguous frames.
         """
-        frame_idxs = np.arange(len(frame_paths)) # get frame IDs
+        frame_idxs = np.arange(num_frames) # get frame IDs
         frame_idxs = frame_idxs[:self.frame_cap] # cap number of frames to self.frame_cap
         
 	# if not divisible by self.clip_length, pad with last frame until it is
@@ -454,11 +759,14 @@ class ORBITDataset(Dataset):
             sampled_idxs = clip_idxs[:max_num_clips]
         elif sample_method == 'random': # select random number of non-overlapping clips up to cap
             capped_num_clips = min(max_num_clips, self.clip_cap)
-            num_sampled_clips = random.choice(range(1, capped_num_clips+1))
-            sampled_idxs = random.sample(range(max_num_clips), num_sampled_clips)
+            if rng is None:
+                num_sampled_clips = random.choice(range(1, capped_num_clips+1))
+                sampled_idxs = random.sample(range(max_num_clips), num_sampled_clips)
+            else:
+                sampled_idxs = rng.choice(max_num_clips, int(rng.integers(1, capped_num_clips+1)), replace=False)
         elif sample_method == 'random_200': # select random 200 clips if there are enough
             capped_num_clips = min(max_num_clips, 200)
-            sampled_idxs = random.sample(range(max_num_clips), capped_num_clips)
+            sampled_idxs = random.sample(range(max_num_clips), capped_num_clips) if rng is None else rng.choice(max_num_clips, capped_num_clips, replace=False)
         elif sample_method == 'uniform': # select clips uniformly up based on self.subsample_factor up to a cap
             capped_num_clips = min(max_num_clips, self.clip_cap)
             subsample_factor = min(self.subsample_factor, max_num_clips) # in case subsample_factor > max_num_clips
@@ -468,58 +776,86 @@ class ORBITDataset(Dataset):
 
         return np.array(sampled_idxs, dtype=np.int64).reshape(-1)
    
-    def prepare_set(self, clips, paths, labels, annotations, video_ids, test_mode=False):
+    def prepare_set(self, frame_ids, labels, annotations, video_ids, clips=None, test_mode=False, rng=None):
         """
-        Function to prepare context/target set for a task.
-        :param clips: (list::torch.Tensor) List of frame data organised in clips of self.clip_length contiguous frames.
-        :param paths: (list::np.ndarray::str) List of frame paths organised in clips of self.clip_length contiguous frames.
+        Function to prepare context/target set for a task, loading its clips (in their final order) straight into a preallocated tensor.
+        :param frame_ids: (list::np.ndarray) List of frame IDs organised in clips of self.clip_length contiguous frames.
         :param labels: (list::int) List of object labels for each clip.
-        :param annotations: (dict::list::torch.Tensor) Dictionary of annotations for each clip.
-        :param video_ids: (list::int) List of videos IDs corresponding to paths.
+        :param annotations: (dict::torch.Tensor) Dictionary of annotations for each clip.
+        :param video_ids: (list::int) List of videos IDs corresponding to frame_ids.
+        :param clips: (torch.Tensor or None) Contiguous tensor of shape (num_clips, self.clip_length, 3, self.frame_size, self.frame_size) to load clips into. If None (only if test_mode), clips are not loaded and each video's frame IDs are returned in place of its frames.
         :param test_mode: (bool) If False, do not shuffle task, otherwise shuffle.
-        :return: (torch.Tensor or list::torch.Tensor, np.ndarray::str or list::np.ndarray, torch.Tensor or list::torch.Tensor, dict::torch.Tensor or list::dict::torch.Tensor) Frame data, paths, video-level labels and annotations organised in clips (if train) or grouped and flattened by video (if test/validation).
+        :param rng: (np.random.Generator or None) Random generator to shuffle with. If None, shuffle with Python's global random module.
+        :return: (torch.Tensor or list::torch.Tensor, np.ndarray or list::np.ndarray, torch.Tensor or list::torch.Tensor, dict::torch.Tensor or list::dict::torch.Tensor) Frame data, frame IDs, video-level labels and annotations organised in clips (if train) or grouped and flattened by video (if test/validation).
         """
-        clips = torch.stack(clips)
-        paths = np.array(paths)
+        frame_ids = np.array(frame_ids, dtype=np.int32).reshape(-1, self.clip_length)
         labels = torch.tensor(labels)
-        annotations = { ann: torch.stack(annotations[ann]) for ann in self.annotations_to_load }
 
         if test_mode: # group by video
-            frames_by_video, paths_by_video, labels_by_video, annotations_by_video = [], [], [], []
-            unique_video_ids = np.unique(video_ids)
-            for video_id in unique_video_ids:
-                # get all clips belonging to current video
-                idxs = video_ids == video_id
-                # flatten frames and paths from current video (assumed to be sorted)
-                video_frames = clips[idxs].flatten(end_dim=1)
-                video_paths = paths[idxs].reshape(-1)
+            order = np.argsort(video_ids, kind='stable') # keep each video's clips in sampled order
+            frame_ids, labels = frame_ids[order], labels[order]
+            annotations = { ann : annotations[ann][order] for ann in self.annotations_to_load }
+            if clips is not None:
+                self.load_clips(frame_ids, out=clips)
+
+            frames_by_video, frame_ids_by_video, labels_by_video, annotations_by_video = [], [], [], []
+            _, video_starts, video_num_clips = np.unique(np.array(video_ids)[order], return_index=True, return_counts=True)
+            for start, end in zip(video_starts.tolist(), (video_starts + video_num_clips).tolist()):
+                # flatten frames and frame IDs from current video (views, as its clips are contiguous)
+                video_frame_ids = frame_ids[start:end].reshape(-1)
+                video_frames = video_frame_ids if clips is None else clips[start:end].flatten(end_dim=1)
                 frames_by_video.append(video_frames)
-                paths_by_video.append(video_paths)
+                frame_ids_by_video.append(video_frame_ids)
                 # all clips from the same video have the same label, so just return 1
-                video_label = labels[idxs][0]
+                video_label = labels[start]
                 labels_by_video.append(video_label)
                 # get all frame annotations for current video
-                video_anns = { ann : annotations[ann][idxs].flatten(end_dim=1) for ann in self.annotations_to_load } if self.with_annotations else None
+                video_anns = { ann : annotations[ann][start:end].flatten(end_dim=1) for ann in self.annotations_to_load } if self.with_annotations else None
                 annotations_by_video.append(video_anns)
-            return frames_by_video, paths_by_video, labels_by_video, annotations_by_video
+            return frames_by_video, frame_ids_by_video, labels_by_video, annotations_by_video
         else:
-            return self.shuffle_set(clips, paths, labels, annotations)
+            frame_ids, labels, annotations = self.shuffle_set(frame_ids, labels, annotations, rng)
+            return self.load_clips(frame_ids, out=clips), frame_ids, labels, annotations
 
-    def shuffle_set(self, clips, paths, labels, annotations):
+    def shuffle_set(self, frame_ids, labels, annotations, rng=None):
         """
         Function to shuffle clips and their object labels.
-        :param clips: (torch.Tensor) Frame data organised in clips of self.clip_length contiguous frames.
-        :param paths: (np.ndarray::str) Frame paths organised in clips of self.clip_length contiguous frames.
+        :param frame_ids: (np.ndarray) Frame IDs organised in clips of self.clip_length contiguous frames.
         :param labels: (torch.Tensor) Object labels for each clip.
         :param annotations: (dict::torch.Tensor) Frame annotations organised in clips of self.clip_length contiguous frames.
-        :return: (torch.Tensor, np.ndarray::str, torch.Tensor, dict::torch.Tensor) Shuffled clips and their corresponding paths, object labels and annotations.
+        :param rng: (np.random.Generator or None) Random generator to shuffle with. If None, shuffle with Python's global random module.
+        :return: (np.ndarray, torch.Tensor, dict::torch.Tensor) Shuffled frame IDs and their corresponding object labels and annotations.
         """
-        idxs = np.arange(len(paths))
-        random.shuffle(idxs)
+        idxs = np.arange(len(frame_ids))
+        if rng is None:
+            random.shuffle(idxs)
+        else:
+            rng.shuffle(idxs)
         if self.with_annotations:
-            return clips[idxs], paths[idxs], labels[idxs], { ann : annotations[ann][idxs] for ann in self.annotations_to_load }
+            return frame_ids[idxs], labels[idxs], { ann : annotations[ann][idxs] for ann in self.annotations_to_load }
         else:
-            return clips[idxs], paths[idxs], labels[idxs], annotations
+            return frame_ids[idxs], labels[idxs], annotations
+
+    def allocate_clips(self, num_clips: int):
+        """
+        Function to get a contiguous tensor to load a task's clips into, from self.task_buffers if it is used.
+        :param num_clips: (int) Number of clips.
+        :return: (torch.Tensor, int) Uninitialised tensor of shape (num_clips, self.clip_length, 3, self.frame_size, self.frame_size), and the ID of its buffer in self.task_buffers (-1 if none).
+        """
+        shape = (num_clips, self.clip_length, 3, self.frame_size, self.frame_size)
+        dtype = torch.uint8 if self.with_uint8_frames else torch.float32
+        if self.task_buffers is None:
+            return torch.empty(shape, dtype=dtype), -1
+        return self.task_buffers.acquire(shape, dtype)
+
+    def release_task_buffer(self, buffer_id: int) -> None:
+        """
+        Function to return a task's buffer to self.task_buffers, once the task is no longer used.
+        :param buffer_id: (int) ID of the task's buffer, as returned in the task. Ignored if -1.
+        :return: Nothing.
+        """
+        if self.task_buffers is not None:
+            self.task_buffers.release(buffer_id)
 
     def get_label_map(self, objects, with_cluster_labels=False):
         """
@@ -537,13 +873,37 @@ class ORBITDataset(Dataset):
                 map_dict[old_label] = new_labels[i]
             return map_dict
 
-    def sample_task(self, task_objects: List[int], task_id: str) -> Dict:
+    @abstractmethod
+    def get_item(self, index: int) -> Tuple[List[int], str]:
+        """
+        Function to get the objects that a user/object's tasks are sampled from.
+        :param index: (int) User/object index.
+        :return: (list::int, str) Objects to sample tasks from, and task ID.
+        """
+        pass
 
+    def __getitem__(self, index):
+        """
+        Function to get a task as a set of (context and target) clips and labels.
+        :param index: (int) User/object index, or task index in self.task_plan if it is set.
+        :return: (dict) Context and target set data for task.
+        """
+        if self.task_plan is not None:
+            return self.load_planned_task(index)
+        task_objects, task_id = self.get_item(index)
+        return self.sample_task(task_objects, task_id)
+
+    def plan_task(self, task_objects: List[int], rng=None) -> Tuple[List[int], List[np.ndarray], List[np.ndarray]]:
+        """
+        Function to sample a task's objects, and the clips of each object's context and target sets, without loading them.
+        :param task_objects: (list::int) Objects to sample the task from.
+        :param rng: (np.random.Generator or None) Random generator to sample with. If None, sample with Python's global random module.
+        :return: (list::int, list::np.ndarray, list::np.ndarray) Sorted sampled objects, and context and target clip frame IDs (of shape (num_clips, self.clip_length)) for each object.
+        """
         # select way (number of classes/objects) randomly
         num_objects = len(task_objects)
-        way = self.compute_way(num_objects)
-        selected_objects = sorted(random.sample(task_objects, way)) # without replacement
-        label_map = self.get_label_map(selected_objects, self.with_cluster_labels)
+        way = self.compute_way(num_objects, rng)
+        selected_objects = sorted(random.sample(task_objects, way) if rng is None else rng.choice(task_objects, way, replace=False).tolist()) # without replacement
 
         # set caps, for memory purposes (used in training)
         if self.with_caps:
@@ -551,46 +911,127 @@ class ORBITDataset(Dataset):
             self.target_shot_cap = 4 if way >=6 else 8
 
         # for each object, sample context and target sets
-        obj_list = []
-        context_clips, target_clips = [], []
-        context_paths, target_paths = [], []
-        context_labels, target_labels = [], []
-        context_video_ids, target_video_ids = [], []
-        context_annotations = { ann : [] for ann in self.annotations_to_load}
-        target_annotations = { ann : [] for ann in self.annotations_to_load}
+        context_frame_ids, target_frame_ids = [], []
         for obj in selected_objects:
-            label = label_map[obj]
-            obj_name = self.obj2name[obj]
-            obj_list.append(obj_name)
-
-            context_videos, target_videos = self.sample_videos(self.obj2vids[obj])
-            cc, cp, cvi, ca = self.sample_clips_from_videos(context_videos, self.context_clip_method)
-            context_clips.extend(cc)
-            context_paths.extend(cp)
-            context_labels.extend([label for _ in range(len(cp))])
-            context_video_ids.extend(cvi)
-            context_annotations = self.extend_ann_dict(context_annotations, ca)
-
-            tc, tp, tvi, ta = self.sample_clips_from_videos(target_videos, self.target_clip_method)
-            target_clips.extend(tc)
-            target_paths.extend(tp)
-            target_labels.extend([label for _ in range(len(tp))])
-            target_video_ids.extend(tvi)
-            target_annotations = self.extend_ann_dict(target_annotations, ta)
-
-        context_clips, context_paths, context_labels, context_annotations = self.prepare_set(context_clips, context_paths, context_labels, context_annotations, context_video_ids)
-        target_clips, target_paths, target_labels, target_annotations = self.prepare_set(target_clips, target_paths, target_labels, target_annotations, target_video_ids, test_mode=self.test_mode)
+            context_videos, target_videos = self.sample_videos(self.obj2vids[obj], rng)
+            context_frame_ids.append(self.sample_clips_from_videos(context_videos, self.context_clip_method, rng))
+            target_frame_ids.append(self.sample_clips_from_videos(target_videos, self.target_clip_method, rng))
+
+        return selected_objects, context_frame_ids, target_frame_ids
+
+    def sample_task(self, task_objects: List[int], task_id: str) -> Dict:
+        selected_objects, context_frame_ids, target_frame_ids = self.plan_task(task_objects)
+        return self.load_task(selected_objects, context_frame_ids, target_frame_ids, task_id)
+
+    def compile_task_plan(self, num_items: int, num_tasks_per_item: int, seed: int) -> TaskPlan:
+        """
+        Function to sample every task of a queue up front, each with its own seed, so that they can be saved and replayed or sharded.
+        :param num_items: (int) Total number of users/objects.
+        :param num_tasks_per_item: (int) Number of tasks per user/object.
+        :param seed: (int) Seed of plan.
+        :return: (TaskPlan) Plan of num_items * num_tasks_per_item tasks, ordered by user/object.
+        """
+        task_items, task_seeds, tasks = [], [], []
+        for item in range(num_items):
+            task_objects, _ = self.get_item(item)
+            for task in range(num_tasks_per_item):
+                task_seed = TaskPlan.get_task_seed(seed, item, task)
+                task_items.append(item)
+                task_seeds.append(task_seed)
+                tasks.append(self.plan_task(list(task_objects), np.random.default_rng(task_seed)))
+        return TaskPlan.from_tasks(task_items, task_seeds, tasks, self.clip_length, self.get_task_plan_config(num_items, num_tasks_per_item, seed))
+
+    def get_task_plan_config(self, num_items: int, num_tasks_per_item: int, seed: int) -> Dict:
+        """
+        Function to get the settings that a task plan depends on, to check that a saved plan still applies.
+        :param num_items: (int) Total number of users/objects.
+        :param num_tasks_per_item: (int) Number of tasks per user/object.
+        :param seed: (int) Seed of plan.
+        :return: (dict) Dataset split, sampling settings and frame filters, and size of the dataset's frame index.
+        """
+        return {'root': os.path.abspath(self.root), 'mode': self.mode, 'num_tasks_per_item': num_tasks_per_item, 'seed': seed, 'num_items': num_items, 'num_videos': len(self.video_paths), 'num_frames': len(self.frame_name_offsets) - 1,
+                'way_method': self.way_method, 'object_cap': self.object_cap, 'shot_methods': [self.shot_method_context, self.shot_method_target], 'shots': [self.shot_context, self.shot_target],
+                'clip_methods': [self.context_clip_method, self.target_clip_method], 'clip_length': self.clip_length, 'subsample_factor': self.subsample_factor, 'with_caps': self.with_caps,
+                'video_types': [self.context_type, self.target_type], 'filters': [self.filter_context, self.filter_target]}
+
+    def set_task_plan(self, task_plan: TaskPlan) -> None:
+        """
+        Function to load tasks from a plan rather than sampling them on the fly. Tasks are then indexed by their position in the plan.
+        :param task_plan: (TaskPlan or None) Plan of tasks, compiled with self.compile_task_plan(). If None, go back to sampling tasks on the fly.
+        :return: Nothing.
+        """
+        if task_plan is not None:
+            expected_config = self.get_task_plan_config(task_plan.config['num_items'], task_plan.config['num_tasks_per_item'], task_plan.config['seed'])
+            if task_plan.config != expected_config:
+                raise ValueError(f"Task plan was compiled for {task_plan.config}, but the {self.mode} dataset has {expected_config}.")
+        self.task_plan = task_plan
+
+    def cache_task_frames(self, path: str) -> bool:
+        """
+        Function to load the frames of self.task_plan's tasks from a packed cache of decoded frames, creating it first if it does not exist or holds other frames.
+        :param path: (str) Path of cache, without extension.
+        :return: (bool) True if the cache was created, False if an existing cache was used.
+        """
+        frame_ids = np.unique(self.task_plan.clip_frame_ids)
+        self.task_frame_cache = TaskFrameCache.load(path, frame_ids, self.frame_size)
+        if self.task_frame_cache is not None:
+            return False
+        self.task_frame_cache = TaskFrameCache.create(path, frame_ids, self.frame_size, self.load_frames)
+        return True
+
+    def load_planned_task(self, index: int) -> Dict:
+        """
+        Function to load a task from self.task_plan.
+        :param index: (int) Task index in self.task_plan.
+        :return: (dict) Context and target set data for task.
+        """
+        item, task_seed, selected_objects, context_frame_ids, target_frame_ids = self.task_plan.get_task(index)
+        _, task_id = self.get_item(item)
+        return self.load_task(selected_objects, context_frame_ids, target_frame_ids, task_id, np.random.default_rng(task_seed))
+
+    def load_task(self, selected_objects: List[int], context_frame_ids: List[np.ndarray], target_frame_ids: List[np.ndarray], task_id: str, rng=None) -> Dict:
+        """
+        Function to load a sampled task's clips, labels and annotations.
+        :param selected_objects: (list::int) Sorted sampled objects.
+        :param context_frame_ids: (list::np.ndarray) Context clip frame IDs for each object.
+        :param target_frame_ids: (list::np.ndarray) Target clip frame IDs for each object.
+        :param task_id: (str) User ID or object name of the task.
+        :param rng: (np.random.Generator or None) Random generator to shuffle train sets with. If None, shuffle with Python's global random module.
+        :return: (dict) Context and target set data for task.
+        """
+        # drop frames cached for the previous user/object's tasks
+        if self.with_user_frame_cache and task_id != self.user_frame_cache_id:
+            self.user_frame_cache, self.user_frame_cache_id = {}, task_id
+
+        label_map = self.get_label_map(selected_objects, self.with_cluster_labels)
+        obj_list = [self.obj2name[obj] for obj in selected_objects]
+        context_labels = np.repeat([label_map[obj] for obj in selected_objects], [len(clips) for clips in context_frame_ids]).tolist()
+        target_labels = np.repeat([label_map[obj] for obj in selected_objects], [len(clips) for clips in target_frame_ids]).tolist()
+        context_frame_ids, target_frame_ids = np.concatenate(context_frame_ids), np.concatenate(target_frame_ids)
+        context_video_ids, _ = self.locate_frames(context_frame_ids[:, 0])
+        target_video_ids, _ = self.locate_frames(target_frame_ids[:, 0])
+        context_annotations = self.load_annotations(context_frame_ids) if self.with_annotations else {}
+        target_annotations = self.load_annotations(target_frame_ids) if self.with_annotations else {}
+
+        # now that the task's size is known, load all its clips straight into one tensor
+        lazy_targets = self.test_mode and self.with_lazy_targets # target clips are loaded when their videos are streamed
+        num_context_clips = len(context_frame_ids)
+        clips, buffer_id = self.allocate_clips(num_context_clips + (0 if lazy_targets else len(target_frame_ids)))
+        context_clips, context_frame_ids, context_labels, context_annotations = self.prepare_set(context_frame_ids, context_labels, context_annotations, context_video_ids, clips[:num_context_clips], rng=rng)
+        target_clips, target_frame_ids, target_labels, target_annotations = self.prepare_set(target_frame_ids, target_labels, target_annotations, target_video_ids, None if lazy_targets else clips[num_context_clips:], test_mode=self.test_mode, rng=rng)
 
         task_dict = {
             # Data required for train / test
-            'context_clips': context_clips,                                     # Tensor of shape (num_context_clips, clip_length, channels, height, width), dtype float32
-            'context_paths': context_paths,                                     # Numpy array of shape (num_context_clips, clip_length), dtype str
+            'context_clips': context_clips,                                     # Tensor of shape (num_context_clips, clip_length, channels, height, width), dtype float32 (uint8 if self.with_uint8_frames)
+            'context_frame_ids': context_frame_ids,                             # Numpy array of shape (num_context_clips, clip_length), dtype int32. Paths can be looked up with self.get_frame_paths()
             'context_labels': context_labels,                                   # Tensor of shape (num_context_clips,), dtype int64
             'context_annotations': context_annotations,                         # Dictionary. Empty if no annotations present. TODO: Add info for when annotations are present.
-            'target_clips': target_clips,                                       # If train, tensor of shape (num_target_clips, clip_length, channels, height, width), dtype float32. If test/validation, list of length (num_target_videos_for_user) of tensors, each of shape (num_video_frames, channels, height, width), dtype float32
-            'target_paths': target_paths,                                       # If train, numpy array of shape (num_target_clips, clip_length), dtype str. If test/validation, list of length (num_target_videos_for_user) of numpy arrays, each of shape (num_video_frames,), dtype str
+            'target_clips': target_clips,                                       # If train, tensor of shape (num_target_clips, clip_length, channels, height, width), dtype float32. If test/validation, list of length (num_target_videos_for_user) of tensors, each of shape (num_video_frames, channels, height, width), dtype float32 (uint8 if self.with_uint8_frames), or of frame IDs (np.ndarray) if self.with_lazy_targets
+            'target_frame_ids': target_frame_ids,                               # If train, numpy array of shape (num_target_clips, clip_length), dtype int32. If test/validation, list of length (num_target_videos_for_user) of numpy arrays, each of shape (num_video_frames,), dtype int32
             'target_labels': target_labels,                                     # If train, tensor of shape (num_target_clips,), dtype int64. If test/validation, list of length (num_target_videos_for_user) of tensors, each of shape (1,), dtype int64
             'target_annotations': target_annotations,                           # Dictionary. Empty if no annotations present. TODO: Add info for when annotations are present.
+            'normalize_stats': self.normalize_stats,                            # Dictionary of per-channel 'mean' and 'std' (list::float) to normalise uint8 clips with after dividing by 255
+            'task_buffer_id': buffer_id,                                        # ID of the buffer in self.task_buffers holding the task's clips, to release with self.release_task_buffer() once the task is used (-1 if none)
             # Extra information, to be used in logging and results.
             'object_list': obj_list,                                             # Ordered list of strings for all objects in this task.
             'task_id': task_id                                                  # User ID if UserEpisodicORBITDataset else object name if ObjectEpisodicORBITDataset, dtype string
@@ -601,37 +1042,37 @@ class UserEpisodicORBITDataset(ORBITDataset):
     """
     Class for user-centric episodic sampling of ORBIT dataset.
     """
-    def __init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile):
+    def __init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile, frame_store='directory', with_manifest=False, num_index_threads=8, with_uint8_frames=False, frame_cache=None, num_decode_threads=1, with_lazy_targets=False, shared_frame_cache_mb=0, with_user_frame_cache=False, task_buffer_mb=0, num_task_buffers=1):
         """
         Creates instance of UserEpisodicORBITDataset.
         """
-        ORBITDataset.__init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile)
+        ORBITDataset.__init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile, frame_store, with_manifest, num_index_threads, with_uint8_frames, frame_cache, num_decode_threads, with_lazy_targets, shared_frame_cache_mb, with_user_frame_cache, task_buffer_mb, num_task_buffers)
 
-    def __getitem__(self, index):
+    def get_item(self, index):
         """
-        Function to get a user-centric task as a set of (context and target) clips and labels.
-        :param index: (tuple) Task index.
-        :return: (dict) Context and target set data for task.
+        Function to get a user's objects, to sample a user-centric task from.
+        :param index: (int) User index.
+        :return: (list::int, str) User's objects, and user ID.
         """
         user = self.users[index] # get user (each task == user id)
         user_objects = self.user2objs[user] # get user's objects
-        return self.sample_task(user_objects, user)
+        return user_objects, user
 
 class ObjectEpisodicORBITDataset(ORBITDataset):
     """
     Class for object-centric episodic sampling of ORBIT dataset.
     """
-    def __init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile):
+    def __init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile, frame_store='directory', with_manifest=False, num_index_threads=8, with_uint8_frames=False, frame_cache=None, num_decode_threads=1, with_lazy_targets=False, shared_frame_cache_mb=0, with_user_frame_cache=False, task_buffer_mb=0, num_task_buffers=1):
         """
         Creates instance of ObjectEpisodicORBITDataset.
         """
-        ORBITDataset.__init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile)
+        ORBITDataset.__init__(self, root, way_method, object_cap, shot_methods, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile, frame_store, with_manifest, num_index_threads, with_uint8_frames, frame_cache, num_decode_threads, with_lazy_targets, shared_frame_cache_mb, with_user_frame_cache, task_buffer_mb, num_task_buffers)
 
-    def __getitem__(self, index):
+    def get_item(self, index):
         """
-        Function to get a object-centric task as a set of (context and target) clips and labels.
-        :param index: (tuple) Task index.
-        :return: (dict) Context and target set data for task.
+        Function to get all objects, to sample an object-centric task from.
+        :param index: (int) Object index.
+        :return: (list::int, str) All objects, and object name.
         """
         all_objects = range(0, len(self.obj2vids)) # task can consider all possible objects, not just 1 user's objects
-        return self.sample_task(all_objects)
+        return all_objects, self.obj2name[index]
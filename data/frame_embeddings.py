@@ -0,0 +1,92 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import torch
+import numpy as np
+from typing import Callable, List
+
+class FrameEmbeddingStore():
+    """
+    On-disk store of one feature extractor embedding per frame of a dataset split, so that classifier heads on a frozen feature extractor can be
+    evaluated without loading or passing any frames through it. Embeddings are saved in a single .npy file of shape (num_frames, feat_dim), next
+    to a .npy file of the frames' names sorted in the same order, and read through a memory map. Frames are looked up by name, as frame names are
+    unique across the dataset and, unlike frame IDs, do not depend on the video types or annotation filters that a dataset is loaded with.
+    """
+    def __init__(self, path: str, frame_names: np.ndarray):
+        """
+        Creates instance of FrameEmbeddingStore.
+        :param path: (str) Path of store, without extension.
+        :param frame_names: (np.ndarray) Sorted names of embedded frames, dtype bytes.
+        :return: Nothing.
+        """
+        self.path = path
+        self.frame_names = frame_names
+        self.embeddings = np.load(f"{path}.npy", mmap_mode='r')  # Memory-mapped embeddings (np.memmap), of shape (num_frames, feat_dim)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Function to open a store saved with self.create().
+        :param path: (str) Path of store, without extension.
+        :return: (FrameEmbeddingStore) Store.
+        """
+        return cls(path, np.load(f"{path}_frames.npy"))
+
+    @classmethod
+    def create(cls, path: str, frame_names: List[str], feat_dim: int, get_embeddings_fn: Callable[[np.ndarray], torch.Tensor], dtype=np.float16, chunk_size: int=1024):
+        """
+        Function to compute frames' embeddings and save them as a store.
+        :param path: (str) Path of store, without extension.
+        :param frame_names: (list::str) Names of frames to embed, in the order of the IDs passed to get_embeddings_fn.
+        :param feat_dim: (int) Size of each frame's embedding.
+        :param get_embeddings_fn: (function) Function to compute the embeddings of shape (num_frames, feat_dim) of frames from their indices in frame_names.
+        :param dtype: (np.dtype) Data type to store embeddings as.
+        :param chunk_size: (int) Number of frames to embed at a time.
+        :return: (FrameEmbeddingStore) Store.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        frame_names = np.array([frame_name.encode() for frame_name in frame_names], dtype=bytes)
+        order = np.argsort(frame_names, kind='stable')
+        if np.any(frame_names[order][1:] == frame_names[order][:-1]):
+            raise ValueError("Frame names must be unique to be stored.")
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        embeddings = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(len(frame_names), feat_dim))
+        for start in range(0, len(frame_names), chunk_size):
+            idxs = order[start:start+chunk_size]
+            embeddings[start:start+len(idxs)] = get_embeddings_fn(idxs).detach().float().cpu().numpy()
+        embeddings.flush()
+        del embeddings
+        np.save(f"{path}_frames.npy", frame_names[order])
+        os.replace(tmp_path, f"{path}.npy")
+        return cls.load(path)
+
+    def get_rows(self, frame_names: List[str]) -> np.ndarray:
+        """
+        Function to look up the rows of frames in the store.
+        :param frame_names: (list::str) Frame names.
+        :return: (np.ndarray) Row of each frame in self.embeddings, dtype int64.
+        """
+        frame_names = np.array([frame_name.encode() for frame_name in frame_names], dtype=bytes)
+        rows = np.minimum(np.searchsorted(self.frame_names, frame_names), len(self.frame_names) - 1)
+        missing = np.flatnonzero(self.frame_names[rows] != frame_names) if len(self.frame_names) > 0 else np.arange(len(frame_names))
+        if len(missing) > 0:
+            raise KeyError(f"{len(missing)} frames (e.g. {frame_names[missing[0]].decode()}) are not in the frame embedding store {self.path}.")
+        return rows.astype(np.int64)
+
+    def get(self, rows: np.ndarray) -> torch.Tensor:
+        """
+        Function to get frames' embeddings from the store.
+        :param rows: (np.ndarray) Rows of frames in the store, as returned by self.get_rows(), of any shape.
+        :return: (torch.Tensor) Embeddings of shape (*rows.shape, feat_dim), dtype float32.
+        """
+        rows = np.asarray(rows)
+        embeddings = self.embeddings[rows.reshape(-1)]
+        return torch.from_numpy(embeddings.astype(np.float32)).reshape(*rows.shape, -1)
+
+    @property
+    def feat_dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    def __len__(self):
+        return len(self.frame_names)
@@ -0,0 +1,466 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import io
+import os
+import glob
+import json
+import zlib
+import torch
+import struct
+import zipfile
+import numpy as np
+from PIL import Image
+from abc import ABC, abstractmethod
+from multiprocessing.pool import ThreadPool
+from typing import BinaryIO, Dict, List, Union
+
+PACK_MAGIC = b'ORBITPCK'
+
+def decode_frame(frame_file: Union[str, BinaryIO], frame_size: int=None) -> torch.Tensor:
+    """
+    Function to decode a JPEG frame. Frames larger than frame_size (e.g. the original 1080x1080 frames) are decoded at a reduced resolution in the JPEG's DCT domain (PIL's draft mode), then resized to frame_size.
+    :param frame_file: (str or file object) Path to frame or file object holding its bytes.
+    :param frame_size: (int or None) Size in pixels to resize the frame to. If None, keep the frame's size.
+    :return: (torch.Tensor) Frame of shape (3, height, width), dtype uint8.
+    """
+    frame = Image.open(frame_file)
+    resize = frame_size is not None and frame.size != (frame_size, frame_size)
+    if resize:
+        frame.draft('RGB', (frame_size, frame_size)) # decodes at the smallest 1/2, 1/4 or 1/8 scale that is at least frame_size
+    if frame.mode != 'RGB':
+        frame = frame.convert('RGB')
+    if resize and frame.size != (frame_size, frame_size):
+        frame = frame.resize((frame_size, frame_size), resample=Image.LANCZOS)
+    return torch.from_numpy(np.array(frame)).permute(2, 0, 1)
+
+def read_pack_header(pack_file: BinaryIO) -> List[List[Union[str, int]]]:
+    """
+    Function to read the header of a pack file. A pack file is PACK_MAGIC, the header length as a little-endian uint32, the header as JSON, then the concatenated JPEG bytes of a video's frames.
+    :param pack_file: (file object) Pack file opened at position 0.
+    :return: (list::list) [frame name, offset, length] for each frame, where offsets are relative to the end of the header.
+    """
+    magic = pack_file.read(len(PACK_MAGIC))
+    if magic != PACK_MAGIC:
+        raise IOError(f"{pack_file.name} is not a valid pack file.")
+    header_length = int.from_bytes(pack_file.read(4), 'little')
+    return json.loads(pack_file.read(header_length))
+
+class DirectoryFrameStore():
+    """
+    Frame store for the default ORBIT directory layout, where every frame is saved as a separate JPEG in its video's folder.
+    """
+    def __init__(self, root: str, frame_size: int, frame_cache: str=None, num_decode_threads: int=1):
+        """
+        Creates instance of DirectoryFrameStore.
+        :param root: (str) Path to train/validation/test folder in ORBIT dataset root folder.
+        :param frame_size: (int) Size in pixels of loaded frames.
+        :param frame_cache: (str or None) Path to folder (ideally on local disk) to cache frames resized to frame_size in. If None, frames are not cached.
+        :param num_decode_threads: (int) Number of threads each process (e.g. DataLoader worker) decodes frames with.
+        :return: Nothing.
+        """
+        self.root = root
+        self.frame_size = frame_size
+        self.frame_cache = frame_cache
+        self.num_decode_threads = num_decode_threads
+        self.decode_pool, self.decode_pool_pid = None, None    # Thread pool to decode frames with and the process it was created in
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['decode_pool'], state['decode_pool_pid'] = None, None
+        return state
+
+    def map_frames(self, fn, idxs) -> None:
+        """
+        Function to run a per-frame function (e.g. decoding a frame into a preallocated tensor) over frames, on self.num_decode_threads threads. PIL releases the GIL while decoding.
+        :param fn: (callable) Function that takes a frame index.
+        :param idxs: (iterable::int) Frame indices.
+        :return: Nothing.
+        """
+        if self.num_decode_threads <= 1:
+            for i in idxs:
+                fn(i)
+            return
+        if self.decode_pool is None or self.decode_pool_pid != os.getpid(): # pools are not shared across forked workers
+            self.decode_pool, self.decode_pool_pid = ThreadPool(self.num_decode_threads), os.getpid()
+        self.decode_pool.map(fn, idxs)
+
+    def listdir(self, path: str) -> List[str]:
+        """
+        Function to list the users/objects/video types/videos in a folder of the dataset.
+        :param path: (str) Path to folder.
+        :return: (list::str) Names of the folder's entries.
+        """
+        return os.listdir(path)
+
+    def list_frames(self, video_path: str) -> List[str]:
+        """
+        Function to list the frame paths of a video.
+        :param video_path: (str) Path to video.
+        :return: (list::str) Unsorted frame paths.
+        """
+        return glob.glob(os.path.join(video_path, "*.jpg"))
+
+    def getmtime(self, path: str) -> float:
+        """
+        Function to get the last modification time of a folder of the dataset.
+        :param path: (str) Path to folder.
+        :return: (float) Modification time of the folder.
+        """
+        return os.path.getmtime(path)
+
+    def load_frames(self, frame_paths: np.ndarray, out: torch.Tensor=None) -> torch.Tensor:
+        """
+        Function to load a flat array of frames, from self.frame_cache where they have been cached.
+        :param frame_paths: (np.ndarray::str) Frame paths.
+        :param out: (torch.Tensor or None) Tensor of shape (num_frames, 3, frame_size, frame_size), dtype uint8, to decode frames into. If None, a new tensor is allocated.
+        :return: (torch.Tensor) Frames of shape (num_frames, 3, frame_size, frame_size), dtype uint8.
+        """
+        if self.frame_cache is None:
+            return self.read_frames(frame_paths, out)
+
+        frames = self.empty_frames(len(frame_paths), out)
+        cache_paths = [self.get_cache_path(frame_path) for frame_path in frame_paths]
+        is_cached = np.array([os.path.isfile(cache_path) for cache_path in cache_paths], dtype=bool)
+        def load_cached_frame(i):
+            frames[i] = decode_frame(cache_paths[i])
+        self.map_frames(load_cached_frame, np.flatnonzero(is_cached))
+        uncached_idxs = np.flatnonzero(~is_cached)
+        if len(uncached_idxs) > 0:
+            uncached_frames = self.read_frames(frame_paths[uncached_idxs])
+            def cache_frame(j):
+                frames[uncached_idxs[j]] = self.cache_frame(uncached_frames[j], cache_paths[uncached_idxs[j]])
+            self.map_frames(cache_frame, range(len(uncached_idxs)))
+        return frames
+
+    def read_frames(self, frame_paths: np.ndarray, out: torch.Tensor=None) -> torch.Tensor:
+        """
+        Function to read and decode a flat array of frames from the store.
+        :param frame_paths: (np.ndarray::str) Frame paths.
+        :param out: (torch.Tensor or None) Tensor of shape (num_frames, 3, frame_size, frame_size), dtype uint8, to decode frames into. If None, a new tensor is allocated.
+        :return: (torch.Tensor) Frames of shape (num_frames, 3, frame_size, frame_size), dtype uint8.
+        """
+        frames = self.empty_frames(len(frame_paths), out)
+        def read_frame(i):
+            frames[i] = decode_frame(frame_paths[i], self.frame_size)
+        self.map_frames(read_frame, range(len(frame_paths)))
+        return frames
+
+    def empty_frames(self, num_frames: int, out: torch.Tensor=None) -> torch.Tensor:
+        """
+        Function to get a tensor to decode frames into.
+        :param num_frames: (int) Number of frames.
+        :param out: (torch.Tensor or None) Preallocated tensor to use, if not None.
+        :return: (torch.Tensor) Uninitialised tensor of shape (num_frames, 3, frame_size, frame_size), dtype uint8.
+        """
+        if out is None:
+            return torch.empty(num_frames, 3, self.frame_size, self.frame_size, dtype=torch.uint8)
+        assert out.shape == (num_frames, 3, self.frame_size, self.frame_size) and out.dtype == torch.uint8
+        return out
+
+    def get_cache_path(self, frame_path: str) -> str:
+        """
+        Function to get the path of a frame in self.frame_cache.
+        :param frame_path: (str) Path to frame.
+        :return: (str) Path to cached frame, e.g. <frame_cache>/224/train/P177/bag/clean/<video name>/<frame name>.
+        """
+        return os.path.join(self.frame_cache, str(self.frame_size), os.path.relpath(frame_path, os.path.dirname(self.root)))
+
+    def cache_frame(self, frame: torch.Tensor, cache_path: str) -> torch.Tensor:
+        """
+        Function to save a frame to self.frame_cache as a JPEG (quality 95, as scripts/resize_videos.py).
+        :param frame: (torch.Tensor) Frame of shape (3, frame_size, frame_size), dtype uint8.
+        :param cache_path: (str) Path to cached frame.
+        :return: (torch.Tensor) Frame decoded from the cached JPEG, so that a frame is identical whether or not it was already cached.
+        """
+        frame_bytes = io.BytesIO()
+        Image.fromarray(frame.permute(1, 2, 0).numpy()).save(frame_bytes, format='JPEG', quality=95)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(f"{cache_path}.{os.getpid()}.tmp", 'wb') as cache_file: # workers may cache the same frame at the same time
+            cache_file.write(frame_bytes.getvalue())
+        os.replace(f"{cache_path}.{os.getpid()}.tmp", cache_path)
+        frame_bytes.seek(0)
+        return decode_frame(frame_bytes)
+
+class IndexedFrameStore(DirectoryFrameStore, ABC):
+    """
+    Base class for frame stores that are described by an index file rather than by the directory layout. The index maps each video (as user/object/video type/video name) to its sorted frame names.
+    """
+    index_version = 1
+
+    def __init__(self, root: str, frame_size: int, store_root: str, frame_cache: str=None, num_decode_threads: int=1):
+        """
+        Creates instance of IndexedFrameStore.
+        :param root: (str) Path to train/validation/test folder in ORBIT dataset root folder.
+        :param frame_size: (int) Size in pixels of loaded frames.
+        :param store_root: (str) Path to folder containing the store's index and data files.
+        :param frame_cache: (str or None) Path to folder to cache frames resized to frame_size in. If None, frames are not cached.
+        :param num_decode_threads: (int) Number of threads each process (e.g. DataLoader worker) decodes frames with.
+        :return: Nothing.
+        """
+        super().__init__(root, frame_size, frame_cache, num_decode_threads)
+        self.store_root = store_root
+        self.video2names = self.load_index()  # Dictionary of video (str, as user/object/video type/video name): list of sorted frame names (str)
+        self.name2video = {}                   # Dictionary of video name (str): video (str, as user/object/video type/video name)
+        self.tree = {}                         # Nested dictionary of user/object/video type/video name
+        for video in self.video2names.keys():
+            self.name2video[video.split('/')[-1]] = video
+            node = self.tree
+            for part in video.split('/'):
+                node = node.setdefault(part, {})
+        self.video2rows = {}                   # Dictionary of video name (str): dictionary of frame name (str) to row in video data (int), built lazily
+
+    def load_index(self) -> Dict[str, List[str]]:
+        """
+        Function to load the store's index from index.json in self.store_root.
+        :return: (dict::list::str) Dictionary of video (as user/object/video type/video name): list of sorted frame names.
+        """
+        index_path = self.get_index_path()
+        if not os.path.isfile(index_path):
+            raise IOError(f"Frame store index {index_path} does not exist.")
+
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+        if index['version'] != self.index_version:
+            raise ValueError(f"Frame store index {index_path} has version {index['version']}, expected {self.index_version}.")
+        self.index_frame_size = index['frame_size']
+
+        return index['videos']
+
+    def get_index_path(self) -> str:
+        """
+        Function to get the path of the file the store's index is loaded from.
+        :return: (str) Path to index file.
+        """
+        return os.path.join(self.store_root, "index.json")
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['video2rows'] = {}
+        return state
+
+    def _relpath(self, path: str) -> str:
+        relpath = os.path.relpath(path, self.root)
+        return '' if relpath == '.' else relpath.replace(os.sep, '/')
+
+    def listdir(self, path: str) -> List[str]:
+        node = self.tree
+        relpath = self._relpath(path)
+        for part in relpath.split('/') if relpath else []:
+            if part not in node:
+                raise FileNotFoundError(f"{path} is not in frame store {self.store_root}.")
+            node = node[part]
+        return list(node.keys())
+
+    def list_frames(self, video_path: str) -> List[str]:
+        return [os.path.join(video_path, frame_name) for frame_name in self.video2names[self._relpath(video_path)]]
+
+    def getmtime(self, path: str) -> float:
+        # every folder changes with the index, so report the index's modification time
+        return os.path.getmtime(self.get_index_path())
+
+    def get_rows(self, video_name: str, frame_names: List[str]) -> np.ndarray:
+        """
+        Function to look up the position of frames within their video's data.
+        :param video_name: (str) Name of video.
+        :param frame_names: (list::str) Frame names.
+        :return: (np.ndarray) Row of each frame in the video's data.
+        """
+        if video_name not in self.video2rows:
+            video = self.name2video[video_name]
+            self.video2rows[video_name] = { frame_name: row for row, frame_name in enumerate(self.video2names[video]) }
+        name2row = self.video2rows[video_name]
+        return np.array([name2row[frame_name] for frame_name in frame_names], dtype=np.int64)
+
+    def read_frames(self, frame_paths: np.ndarray, out: torch.Tensor=None) -> torch.Tensor:
+        frames = self.empty_frames(len(frame_paths), out)
+        video_names = np.array([os.path.basename(os.path.dirname(frame_path)) for frame_path in frame_paths])
+        for video_name in np.unique(video_names): # frames are typically sampled from a single video
+            idxs = np.flatnonzero(video_names == video_name)
+            frame_names = [os.path.basename(frame_paths[i]) for i in idxs]
+            frames[torch.from_numpy(idxs)] = self.load_video_frames(video_name, self.get_rows(video_name, frame_names))
+        return frames
+
+    @abstractmethod
+    def load_video_frames(self, video_name: str, rows: np.ndarray) -> torch.Tensor:
+        """
+        Function to load frames from a single video.
+        :param video_name: (str) Name of video.
+        :param rows: (np.ndarray) Rows of frames to load in the video's data.
+        :return: (torch.Tensor) Frames of shape (len(rows), 3, height, width), dtype uint8.
+        """
+        pass
+
+class ShardFrameStore(IndexedFrameStore):
+    """
+    Frame store where each video's decoded frames are packed into a single memory-mapped uint8 shard of shape (num_frames, 3, height, width). Shards are created with scripts/pack_frame_shards.py.
+    """
+    def __init__(self, root: str, frame_size: int):
+        """
+        Creates instance of ShardFrameStore.
+        :param root: (str) Path to train/validation/test folder in ORBIT dataset root folder.
+        :param frame_size: (int) Size in pixels of loaded frames.
+        :return: Nothing.
+        """
+        store_root = os.path.join(os.path.dirname(root), "shards", os.path.basename(root))    # e.g. /data/orbit_benchmark/shards/{train,validation,test}
+        super().__init__(root, frame_size, store_root)
+        if self.index_frame_size != self.frame_size: # shards hold decoded frames, so cannot be resized
+            raise ValueError(f"Frame store {self.store_root} holds {self.index_frame_size}px frames, but frame_size is {self.frame_size}.")
+        self.shards = {}    # Dictionary of video name (str): memory-mapped shard (np.memmap), opened lazily per process
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['shards'] = {}
+        return state
+
+    def load_video_frames(self, video_name: str, rows: np.ndarray) -> torch.Tensor:
+        if video_name not in self.shards:
+            self.shards[video_name] = np.load(os.path.join(self.store_root, f"{video_name}.npy"), mmap_mode='r')
+        return torch.from_numpy(self.shards[video_name][rows])
+
+class PackFrameStore(IndexedFrameStore):
+    """
+    Frame store where each video's JPEG frames are concatenated into a single pack file with a header of frame name, offset and length. Frames are decoded straight from the pack with a single open per video. Packs are created with scripts/pack_video_jpegs.py.
+    """
+    def __init__(self, root: str, frame_size: int, frame_cache: str=None, num_decode_threads: int=1):
+        """
+        Creates instance of PackFrameStore.
+        :param root: (str) Path to train/validation/test folder in ORBIT dataset root folder.
+        :param frame_size: (int) Size in pixels of loaded frames.
+        :param frame_cache: (str or None) Path to folder to cache frames resized to frame_size in. If None, frames are not cached.
+        :param num_decode_threads: (int) Number of threads each process (e.g. DataLoader worker) decodes frames with.
+        :return: Nothing.
+        """
+        store_root = os.path.join(os.path.dirname(root), "packs", os.path.basename(root))    # e.g. /data/orbit_benchmark/packs/{train,validation,test}
+        super().__init__(root, frame_size, store_root, frame_cache, num_decode_threads)
+        self.offsets = {}    # Dictionary of video name (str): (data start, offsets, lengths) of frames in pack, read lazily from pack headers
+
+    def load_video_frames(self, video_name: str, rows: np.ndarray) -> torch.Tensor:
+        frames = torch.empty(len(rows), 3, self.frame_size, self.frame_size, dtype=torch.uint8)
+        with open(os.path.join(self.store_root, f"{video_name}.pack"), 'rb') as pack_file:
+            if video_name not in self.offsets:
+                header = read_pack_header(pack_file)
+                offsets = np.array([offset for _, offset, _ in header], dtype=np.int64)
+                lengths = np.array([length for _, _, length in header], dtype=np.int64)
+                self.offsets[video_name] = (pack_file.tell(), offsets, lengths)
+            data_start, offsets, lengths = self.offsets[video_name]
+            frame_bytes = [None] * len(rows)
+            for i in np.argsort(rows, kind='stable'): # read in file order
+                pack_file.seek(data_start + offsets[rows[i]])
+                frame_bytes[i] = pack_file.read(lengths[rows[i]])
+        def decode(i):
+            frames[i] = decode_frame(io.BytesIO(frame_bytes[i]), self.frame_size)
+        self.map_frames(decode, range(len(rows)))
+        return frames
+
+class ZipFrameStore(IndexedFrameStore):
+    """
+    Frame store that reads frames directly from a downloaded train/validation/test ZIP, without extracting it. The ZIP's central directory is indexed once, and frames are served by random-access reads of their members, with one ZIP handle per DataLoader worker.
+    """
+    def __init__(self, root: str, frame_size: int, frame_cache: str=None, num_decode_threads: int=1):
+        """
+        Creates instance of ZipFrameStore.
+        :param root: (str) Path to train/validation/test folder in ORBIT dataset root folder.
+        :param frame_size: (int) Size in pixels of loaded frames.
+        :param frame_cache: (str or None) Path to folder to cache frames resized to frame_size in. If None, frames are not cached.
+        :param num_decode_threads: (int) Number of threads each process (e.g. DataLoader worker) decodes frames with.
+        :return: Nothing.
+        """
+        store_root = f"{root}.zip"    # e.g. /data/orbit_benchmark/{train,validation,test}.zip
+        if not os.path.isfile(store_root):
+            raise IOError(f"ZIP {store_root} does not exist.")
+        super().__init__(root, frame_size, store_root, frame_cache, num_decode_threads)
+        self.zip_file, self.zip_pid = None, None    # ZIP handle and the process it was opened in
+        self.data_offsets = {}                      # Dictionary of video name (str): offset of each frame's data in the ZIP (np.ndarray, -1 if not yet read)
+
+    def load_index(self) -> Dict[str, List[str]]:
+        """
+        Function to index the ZIP's central directory.
+        :return: (dict::list::str) Dictionary of video (as user/object/video type/video name): list of sorted frame names.
+        """
+        video2members = {}
+        with zipfile.ZipFile(self.store_root) as zip_file:
+            for info in zip_file.infolist():
+                parts = info.filename.split('/') # members are saved as e.g. train/P177/bag/clean/<video name>/<frame name>
+                if info.is_dir() or len(parts) < 5 or not parts[-1].endswith('.jpg'):
+                    continue
+                video = '/'.join(parts[-5:-1])
+                video2members.setdefault(video, []).append((parts[-1], info.header_offset, info.compress_size, info.compress_type))
+
+        video2names = {}
+        self.members = {}    # Dictionary of video name (str): header offset, compressed size and compression type of each sorted frame (np.ndarray)
+        for video, members in video2members.items():
+            members.sort()
+            video2names[video] = [member[0] for member in members]
+            self.members[video.split('/')[-1]] = np.array([member[1:] for member in members], dtype=np.int64)
+
+        return video2names
+
+    def get_index_path(self) -> str:
+        return self.store_root
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['zip_file'], state['zip_pid'] = None, None
+        return state
+
+    def _read_member(self, video_name: str, row: int) -> bytes:
+        """
+        Function to read the (decompressed) bytes of a frame's ZIP member.
+        :param video_name: (str) Name of video.
+        :param row: (int) Row of frame in the video's sorted frames.
+        :return: (bytes) Frame's JPEG bytes.
+        """
+        if self.zip_file is None or self.zip_pid != os.getpid(): # handles are not shared across forked workers
+            self.zip_file, self.zip_pid = open(self.store_root, 'rb'), os.getpid()
+        if video_name not in self.data_offsets:
+            self.data_offsets[video_name] = np.full(len(self.members[video_name]), -1, dtype=np.int64)
+
+        header_offset, compress_size, compress_type = self.members[video_name][row]
+        data_offsets = self.data_offsets[video_name]
+        if data_offsets[row] < 0: # data starts after the member's local header, whose length is only known once read
+            self.zip_file.seek(header_offset)
+            local_header = self.zip_file.read(zipfile.sizeFileHeader)
+            if local_header[:4] != zipfile.stringFileHeader:
+                raise IOError(f"ZIP {self.store_root} has a corrupt local header at offset {header_offset}.")
+            name_length, extra_length = struct.unpack('<2H', local_header[-4:])
+            data_offsets[row] = header_offset + zipfile.sizeFileHeader + name_length + extra_length
+
+        self.zip_file.seek(data_offsets[row])
+        data = self.zip_file.read(compress_size)
+        if compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -zlib.MAX_WBITS)
+        elif compress_type != zipfile.ZIP_STORED:
+            raise IOError(f"ZIP {self.store_root} uses unsupported compression type {compress_type}.")
+        return data
+
+    def load_video_frames(self, video_name: str, rows: np.ndarray) -> torch.Tensor:
+        frames = torch.empty(len(rows), 3, self.frame_size, self.frame_size, dtype=torch.uint8)
+        frame_bytes = [None] * len(rows)
+        for i in np.argsort(rows, kind='stable'): # read in file order, on a single handle
+            frame_bytes[i] = self._read_member(video_name, rows[i])
+        def decode(i):
+            frames[i] = decode_frame(io.BytesIO(frame_bytes[i]), self.frame_size)
+        self.map_frames(decode, range(len(rows)))
+        return frames
+
+def create_frame_store(frame_store: str, root: str, frame_size: int, frame_cache: str=None, num_decode_threads: int=1) -> DirectoryFrameStore:
+    """
+    Function to create the frame store backend used by ORBITDataset.
+    :param frame_store: (str) Type of frame store.
+    :param root: (str) Path to train/validation/test folder in ORBIT dataset root folder.
+    :param frame_size: (int) Size in pixels of loaded frames.
+    :param frame_cache: (str or None) Path to folder to cache frames resized to frame_size in. Not used by 'shards', which hold decoded frames.
+    :param num_decode_threads: (int) Number of threads each process decodes frames with. Not used by 'shards'.
+    :return: (DirectoryFrameStore) Frame store.
+    """
+    if frame_store == 'directory':
+        return DirectoryFrameStore(root, frame_size, frame_cache, num_decode_threads)
+    elif frame_store == 'shards':
+        return ShardFrameStore(root, frame_size)
+    elif frame_store == 'packs':
+        return PackFrameStore(root, frame_size, frame_cache, num_decode_threads)
+    elif frame_store == 'zip':
+        return ZipFrameStore(root, frame_size, frame_cache, num_decode_threads)
+    else:
+        raise ValueError(f"Invalid frame_store: {frame_store}")
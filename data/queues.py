@@ -1,26 +1,35 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT license.
 
+import os
+import time
 import torch
 from data.samplers import TaskSampler
+from data.task_plans import TaskPlan
 from data.datasets import UserEpisodicORBITDataset, ObjectEpisodicORBITDataset
+from utils.logging import print_and_log
 
 class DatasetQueue:
     """
     Class for a queue of tasks sampled from UserEpisodicORIBTDataset/ObjectEpisodicORBITDataset.
 
     """
-    def __init__(self, num_tasks: int, shuffle: bool, num_workers: int) -> None:
+    def __init__(self, num_tasks: int, shuffle: bool, num_workers: int, with_persistent_workers: bool=False, prefetch_factor: int=2) -> None:
         """
         Creates instance of DatasetQueue.
         :param num_tasks: (int) Number of tasks per user/object to add to the queue.
         :param shuffle: (bool) If True, shuffle tasks, else do not shuffle.
         :param num_workers: (int) Number of workers to use.
+        :param with_persistent_workers: (bool) If True, start the workers on the first call to self.get_tasks() and keep them alive for later calls, otherwise restart them on every call.
+        :param prefetch_factor: (int) Number of tasks loaded in advance by each worker.
         :return: Nothing.
         """
         self.num_tasks = num_tasks
         self.shuffle = shuffle
         self.num_workers = num_workers
+        self.with_persistent_workers = with_persistent_workers
+        self.prefetch_factor = prefetch_factor
+        self.task_loader = None
 
         self.num_users = None
         self.collate_fn = self.unpack
@@ -33,47 +42,120 @@ class DatasetQueue:
             unpacked_batch[k] = v
         return unpacked_batch
 
+    def load_tasks(self, num_items):
+        """
+        Function to get an iterator over the queue's tasks. The DataLoader (and its workers) is created on the first call, and re-created on
+        later calls unless self.with_persistent_workers, in which case its workers are kept alive and the TaskSampler is reset (and reshuffled).
+        :param num_items: (int) Total number of users/objects.
+        :return: (iterator) Iterator over tasks, of length num_items * self.num_tasks.
+        """
+        start_workers = self.task_loader is None or not self.with_persistent_workers
+        if start_workers:
+            task_plan = self.dataset.task_plan
+            sampler = TaskSampler(1, len(task_plan), self.shuffle) if task_plan is not None else TaskSampler(self.num_tasks, num_items, self.shuffle)
+            worker_kwargs = { 'persistent_workers': self.with_persistent_workers, 'prefetch_factor': self.prefetch_factor } if self.num_workers > 0 else {}
+            self.task_loader = torch.utils.data.DataLoader(
+                dataset=self.dataset,
+                pin_memory=False,
+                num_workers=self.num_workers,
+                sampler=sampler,
+                collate_fn=self.collate_fn,
+                **worker_kwargs
+                )
+        t1 = time.time()
+        tasks = iter(self.task_loader)
+        if start_workers and self.num_workers > 0:
+            print_and_log(self.dataset.logfile, f"Started {self.num_workers} {self.dataset.mode} data loader workers in {time.time() - t1:.2f}s")
+        return tasks
+
+    def plan_tasks(self, num_items, task_plan_dir, task_plan_seed, task_plan_shard, with_task_frame_cache=False):
+        """
+        Function to compile all of the queue's tasks up front (or load them if they were compiled by an earlier run), so that the same tasks
+        are loaded every time and by every process. The plan is saved as {task_plan_dir}/{mode}_task_plan.npz and recompiled if the dataset's root,
+        sampling settings or frame filters have changed since. Shards split the plan by user/object, without coordinating with each other.
+        :param num_items: (int) Total number of users/objects.
+        :param task_plan_dir: (str) Directory to save/load the plan to/from.
+        :param task_plan_seed: (int) Seed of plan.
+        :param task_plan_shard: (tuple::int) Index of this process's shard, and total number of shards.
+        :param with_task_frame_cache: (bool) If True, also decode the frames of the (shard's) tasks once into {task_plan_dir}/{mode}_task_frames_{shard}of{num_shards}.npy, and load them from there.
+        :return: Nothing.
+        """
+        t1 = time.time()
+        plan_path = os.path.join(task_plan_dir, f"{self.dataset.mode}_task_plan.npz")
+        task_plan = TaskPlan.load(plan_path) if os.path.exists(plan_path) else None
+        if task_plan is None or task_plan.config != self.dataset.get_task_plan_config(num_items, self.num_tasks, task_plan_seed):
+            task_plan = self.dataset.compile_task_plan(num_items, self.num_tasks, task_plan_seed)
+            task_plan.save(plan_path)
+            print_and_log(self.dataset.logfile, f"Compiled {len(task_plan)} {self.dataset.mode} tasks to {plan_path} in {time.time() - t1:.2f}s")
+        else:
+            print_and_log(self.dataset.logfile, f"Loaded {len(task_plan)} {self.dataset.mode} tasks from {plan_path} in {time.time() - t1:.2f}s")
+        shard_id, num_shards = task_plan_shard
+        if num_shards > 1:
+            task_plan = task_plan.shard(shard_id, num_shards)
+            print_and_log(self.dataset.logfile, f"Kept {len(task_plan)} {self.dataset.mode} tasks ({task_plan.num_items} users/objects) in shard {shard_id+1}/{num_shards}")
+        self.dataset.set_task_plan(task_plan)
+        if with_task_frame_cache:
+            t1 = time.time()
+            cache_path = os.path.join(task_plan_dir, f"{self.dataset.mode}_task_frames_{shard_id}of{num_shards}")
+            created = self.dataset.cache_task_frames(cache_path)
+            print_and_log(self.dataset.logfile, f"{'Cached' if created else 'Loaded'} {len(self.dataset.task_frame_cache)} {self.dataset.mode} task frames {'to' if created else 'from'} {cache_path}.npy in {time.time() - t1:.2f}s")
+
     def get_num_users(self):
         return self.num_users
 
     def get_cluster_classes(self):
         return self.dataset.cluster_classes
 
+    def get_normalize_stats(self):
+        return self.dataset.normalize_stats
+
+    def get_shared_frame_cache_stats(self):
+        return self.dataset.shared_frame_cache.get_stats() if self.dataset.shared_frame_cache else None
+
+    def get_task_buffer_stats(self):
+        return self.dataset.task_buffers.get_stats() if self.dataset.task_buffers else None
+
+    def release_task(self, task_dict):
+        # the task's clips may be overwritten by a later task once it is released
+        self.dataset.release_task_buffer(task_dict['task_buffer_id'])
+
+    def get_frame_paths(self, frame_ids):
+        return self.dataset.get_frame_paths(frame_ids)
+
+    def stream_target_videos(self, target_videos, target_frame_ids, target_labels, chunk_size=None):
+        return self.dataset.stream_target_videos(target_videos, target_frame_ids, target_labels, chunk_size)
+
 class UserEpisodicDatasetQueue(DatasetQueue):
-    def __init__(self, root, way_method, object_cap, shot_method, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, num_tasks, test_mode, with_cluster_labels, with_caps, shuffle, num_workers=None, logfile=None):
+    def __init__(self, root, way_method, object_cap, shot_method, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, num_tasks, test_mode, with_cluster_labels, with_caps, shuffle, num_workers=None, logfile=None, frame_store='directory', with_manifest=False, num_index_threads=8, with_uint8_frames=False, frame_cache=None, num_decode_threads=None, with_lazy_targets=False, shared_frame_cache_mb=0, with_user_frame_cache=False, with_persistent_workers=False, prefetch_factor=2, task_buffer_mb=0, task_plan_dir=None, task_plan_seed=0, task_plan_shard=(0, 1), with_task_frame_cache=False):
         num_workers = num_workers if num_workers else 4 if test_mode else 8
-        DatasetQueue.__init__(self, num_tasks, shuffle, num_workers)
-        self.dataset = UserEpisodicORBITDataset(root, way_method, object_cap, shot_method, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile)
+        num_decode_threads = max(1, num_decode_threads // max(1, num_workers)) if num_decode_threads else 1 # share thread budget across workers
+        num_task_buffers = max(1, num_workers) * prefetch_factor + 2 # tasks loaded in advance by all workers, plus the task in use and one being loaded
+        DatasetQueue.__init__(self, num_tasks, shuffle, num_workers, with_persistent_workers, prefetch_factor)
+        self.dataset = UserEpisodicORBITDataset(root, way_method, object_cap, shot_method, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile, frame_store, with_manifest, num_index_threads, with_uint8_frames, frame_cache, num_decode_threads, with_lazy_targets, shared_frame_cache_mb, with_user_frame_cache, task_buffer_mb, num_task_buffers)
         self.num_users = self.dataset.num_users
+        if task_plan_dir:
+            self.plan_tasks(self.num_users, task_plan_dir, task_plan_seed, task_plan_shard, with_task_frame_cache)
     
     def get_tasks(self):
-        return torch.utils.data.DataLoader(
-                dataset=self.dataset,
-                pin_memory=False,
-                num_workers=self.num_workers,
-                sampler=TaskSampler(self.num_tasks, self.num_users, self.shuffle),
-                collate_fn=self.collate_fn
-                )
+        return self.load_tasks(self.num_users)
  
     def __len__(self):
-        return self.dataset.num_users
+        return self.dataset.task_plan.num_items if self.dataset.task_plan is not None else self.dataset.num_users
 
 class ObjectEpisodicDatasetQueue(DatasetQueue):
-    def __init__(self, root, way_method, object_cap, shot_method, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, num_tasks, test_mode, with_cluster_labels, with_caps, shuffle, num_workers=None, logfile=None):
+    def __init__(self, root, way_method, object_cap, shot_method, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, num_tasks, test_mode, with_cluster_labels, with_caps, shuffle, num_workers=None, logfile=None, frame_store='directory', with_manifest=False, num_index_threads=8, with_uint8_frames=False, frame_cache=None, num_decode_threads=None, with_lazy_targets=False, shared_frame_cache_mb=0, with_user_frame_cache=False, with_persistent_workers=False, prefetch_factor=2, task_buffer_mb=0, task_plan_dir=None, task_plan_seed=0, task_plan_shard=(0, 1), with_task_frame_cache=False):
         num_workers = num_workers if num_workers else 4 if test_mode else 8
-        DatasetQueue.__init__(self, num_tasks, shuffle, num_workers)
-        self.dataset = ObjectEpisodicORBITDataset(root, way_method, object_cap, shot_method, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile)
+        num_decode_threads = max(1, num_decode_threads // max(1, num_workers)) if num_decode_threads else 1 # share thread budget across workers
+        num_task_buffers = max(1, num_workers) * prefetch_factor + 2 # tasks loaded in advance by all workers, plus the task in use and one being loaded
+        DatasetQueue.__init__(self, num_tasks, shuffle, num_workers, with_persistent_workers, prefetch_factor)
+        self.dataset = ObjectEpisodicORBITDataset(root, way_method, object_cap, shot_method, shots, video_types, subsample_factor, clip_methods, clip_length, frame_size, frame_norm_method, annotations_to_load, filter_by_annotations, test_mode, with_cluster_labels, with_caps, logfile, frame_store, with_manifest, num_index_threads, with_uint8_frames, frame_cache, num_decode_threads, with_lazy_targets, shared_frame_cache_mb, with_user_frame_cache, task_buffer_mb, num_task_buffers)
         self.num_users = self.dataset.num_users
         self.num_objects = self.dataset.num_objects
+        if task_plan_dir:
+            self.plan_tasks(self.num_objects, task_plan_dir, task_plan_seed, task_plan_shard, with_task_frame_cache)
     
     def get_tasks(self):
-        return torch.utils.data.DataLoader(
-                dataset=self.dataset,
-                pin_memory=False,
-                num_workers=self.num_workers,
-                sampler=TaskSampler(self.num_tasks, self.num_objects, self.shuffle),
-                collate_fn=self.collate_fn
-                )
+        return self.load_tasks(self.num_objects)
  
     def __len__(self):
-        return self.dataset.num_objects
+        return self.dataset.task_plan.num_items if self.dataset.task_plan is not None else self.dataset.num_objects
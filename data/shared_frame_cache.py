@@ -0,0 +1,93 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import torch
+import numpy as np
+import multiprocessing
+from typing import Dict, Tuple
+
+class SharedFrameCache():
+    """
+    Least-recently-used cache of decoded uint8 frames, held in shared memory so that it is shared by all processes forked after it is created
+    (e.g. DataLoader workers) and persists across epochs. Frames are keyed by their dataset-wide frame ID, and stored in a fixed number of
+    slots set by a byte budget. The slots' keys and last use are kept in shared tensors, guarded by a single lock.
+    """
+    def __init__(self, frame_size: int, max_bytes: int):
+        """
+        Creates instance of SharedFrameCache.
+        :param frame_size: (int) Size in pixels of cached frames.
+        :param max_bytes: (int) Maximum number of bytes of frames to cache.
+        :return: Nothing.
+        """
+        self.frame_size = frame_size
+        self.num_slots = max(0, max_bytes // (3 * frame_size * frame_size))
+        self.frames = torch.empty((self.num_slots, 3, frame_size, frame_size), dtype=torch.uint8).share_memory_()
+        self.keys = torch.zeros(self.num_slots, dtype=torch.int64).share_memory_()         # Key of frame in each slot, 0 if empty, -1 while being written
+        self.last_used = torch.zeros(self.num_slots, dtype=torch.int64).share_memory_()    # Clock value when each slot was last read or written
+        self.counters = torch.zeros(3, dtype=torch.int64).share_memory_()                  # Clock, number of hits, number of misses
+        self.lock = multiprocessing.Lock()
+
+    def get_keys(self, frame_ids: np.ndarray) -> np.ndarray:
+        """
+        Function to get the cache keys of frames.
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :return: (np.ndarray) Positive int64 key for each frame.
+        """
+        return np.asarray(frame_ids, dtype=np.int64) + 1 # 0 marks an empty slot
+
+    def get(self, keys: np.ndarray, out: torch.Tensor=None) -> Tuple[torch.Tensor, np.ndarray]:
+        """
+        Function to get frames from the cache.
+        :param keys: (np.ndarray) Keys of frames, as returned by self.get_keys().
+        :param out: (torch.Tensor or None) Tensor of shape (len(keys), 3, self.frame_size, self.frame_size), dtype uint8, to copy frames into. If None, a new tensor is allocated.
+        :return: (torch.Tensor, np.ndarray) Frames (uninitialised where missed) and indices of missed frames.
+        """
+        frames = torch.empty((len(keys), 3, self.frame_size, self.frame_size), dtype=torch.uint8) if out is None else out
+        with self.lock:
+            slot_keys = self.keys.numpy()
+            hit_slots = np.flatnonzero(np.isin(slot_keys, keys))
+            key2slot = dict(zip(slot_keys[hit_slots].tolist(), hit_slots.tolist()))
+            slots = np.array([key2slot.get(key, -1) for key in keys.tolist()], dtype=np.int64)
+            hits = np.flatnonzero(slots >= 0)
+            if len(hits) > 0:
+                frames[hits] = self.frames[slots[hits]]
+                self.counters[0] += 1
+                self.last_used[slots[hits]] = self.counters[0]
+            self.counters[1] += len(hits)
+            self.counters[2] += len(keys) - len(hits)
+        return frames, np.flatnonzero(slots < 0)
+
+    def put(self, keys: np.ndarray, frames: torch.Tensor) -> None:
+        """
+        Function to add frames to the cache, evicting the least recently used frames if it is full.
+        :param keys: (np.ndarray) Keys of frames, as returned by self.get_keys().
+        :param frames: (torch.Tensor) Frames of shape (num_frames, 3, self.frame_size, self.frame_size), dtype uint8.
+        :return: Nothing.
+        """
+        keys, idxs = np.unique(keys, return_index=True)
+        with self.lock:
+            slot_keys, last_used = self.keys.numpy(), self.last_used.numpy()
+            is_new = ~np.isin(keys, slot_keys) # frames may have been added by another process since they were missed
+            free_slots = np.flatnonzero(slot_keys != -1)
+            num_frames = min(int(is_new.sum()), len(free_slots))
+            if num_frames == 0:
+                return
+            keys, idxs = keys[is_new][:num_frames], idxs[is_new][:num_frames]
+            slots = free_slots[np.argpartition(last_used[free_slots], num_frames-1)[:num_frames]]
+            slot_keys[slots] = -1 # reserve slots, so they are neither read nor evicted while being written
+        self.frames[slots] = frames[idxs]
+        with self.lock:
+            self.counters[0] += 1
+            self.keys[slots] = torch.from_numpy(keys)
+            self.last_used[slots] = self.counters[0]
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Function to get the cache's hit/miss counters and occupancy.
+        :return: (dict::float) Number of hits and misses, hit rate, and number of cached frames out of total slots.
+        """
+        with self.lock:
+            hits, misses = self.counters[1].item(), self.counters[2].item()
+            num_cached = int((self.keys > 0).sum().item())
+        hit_rate = hits / float(hits + misses) if hits + misses > 0 else 0.0
+        return {'hits': hits, 'misses': misses, 'hit_rate': hit_rate, 'cached_frames': num_cached, 'slots': self.num_slots}
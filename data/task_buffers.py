@@ -0,0 +1,68 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import torch
+import multiprocessing
+from typing import Dict, Tuple
+
+class TaskBufferRing():
+    """
+    Ring of preallocated buffers that tasks' clips are loaded straight into, held in shared memory so that it is shared by all processes forked
+    after it is created (e.g. DataLoader workers). A task loaded into a buffer is passed to the main process without copying its clips or creating
+    a new shared memory file, and its buffer is reused once the main process releases it. The buffers' states are kept in a shared tensor, guarded by a single lock.
+    """
+    def __init__(self, num_buffers: int, max_bytes: int):
+        """
+        Creates instance of TaskBufferRing.
+        :param num_buffers: (int) Number of buffers in the ring. Should be larger than the number of tasks loaded in advance by all DataLoader workers.
+        :param max_bytes: (int) Size in bytes of each buffer.
+        :return: Nothing.
+        """
+        self.num_buffers = num_buffers
+        self.buffer_bytes = max_bytes - max_bytes % 8 # so that buffers can be viewed as any dtype
+        self.buffers = torch.empty((num_buffers, self.buffer_bytes), dtype=torch.uint8).share_memory_()
+        self.in_use = torch.zeros(num_buffers, dtype=torch.bool).share_memory_()   # Whether each buffer holds a task that has not been released
+        self.counters = torch.zeros(2, dtype=torch.int64).share_memory_()          # Number of tasks loaded into a buffer, number of tasks allocated outside the ring
+        self.lock = multiprocessing.Lock()
+
+    def acquire(self, shape: Tuple[int, ...], dtype: torch.dtype) -> Tuple[torch.Tensor, int]:
+        """
+        Function to get a tensor backed by a free buffer, or by a new allocation if the tensor does not fit in a buffer or all buffers are in use.
+        :param shape: (tuple::int) Shape of tensor.
+        :param dtype: (torch.dtype) Data type of tensor.
+        :return: (torch.Tensor, int) Uninitialised tensor and the ID of its buffer (-1 if it is not backed by a buffer).
+        """
+        num_bytes = torch.Size(shape).numel() * torch.empty(0, dtype=dtype).element_size()
+        buffer_id = -1
+        if num_bytes <= self.buffer_bytes:
+            with self.lock:
+                free_buffers = torch.nonzero(~self.in_use).flatten()
+                if len(free_buffers) > 0:
+                    buffer_id = free_buffers[0].item()
+                    self.in_use[buffer_id] = True
+        with self.lock:
+            self.counters[0 if buffer_id >= 0 else 1] += 1
+        if buffer_id < 0:
+            return torch.empty(shape, dtype=dtype), buffer_id
+        return self.buffers[buffer_id].narrow(0, 0, num_bytes).view(dtype).view(shape), buffer_id
+
+    def release(self, buffer_id: int) -> None:
+        """
+        Function to return a buffer to the ring, once its task is no longer used.
+        :param buffer_id: (int) ID of buffer, as returned by self.acquire(). Ignored if -1.
+        :return: Nothing.
+        """
+        if buffer_id >= 0:
+            with self.lock:
+                self.in_use[buffer_id] = False
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Function to get the number of tasks loaded into the ring's buffers and allocated outside it.
+        :return: (dict::float) Number of tasks in buffers and allocated, fraction of tasks in buffers, and number of buffers in use out of total buffers.
+        """
+        with self.lock:
+            buffered, allocated = self.counters[0].item(), self.counters[1].item()
+            num_in_use = int(self.in_use.sum().item())
+        buffered_rate = buffered / float(buffered + allocated) if buffered + allocated > 0 else 0.0
+        return {'buffered': buffered, 'allocated': allocated, 'buffered_rate': buffered_rate, 'in_use': num_in_use, 'buffers': self.num_buffers}
@@ -0,0 +1,90 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import torch
+import numpy as np
+from typing import Callable, Tuple
+
+class TaskFrameCache():
+    """
+    Packed on-disk cache of the decoded uint8 frames of a task plan's clips, so that planned tasks can be replayed (e.g. every validation epoch)
+    without decoding any frames. Frames are stored sorted by frame ID in a single .npy file of shape (num_frames, 3, frame_size, frame_size),
+    next to a .npy file of their frame IDs, and read through a memory map that is opened lazily in each process.
+    """
+    def __init__(self, path: str, frame_ids: np.ndarray, frame_size: int):
+        """
+        Creates instance of TaskFrameCache.
+        :param path: (str) Path of cache, without extension.
+        :param frame_ids: (np.ndarray) Sorted IDs of cached frames, dtype int32.
+        :param frame_size: (int) Size in pixels of cached frames.
+        :return: Nothing.
+        """
+        self.path = path
+        self.frame_ids = frame_ids
+        self.frame_size = frame_size
+        self.frames = None  # Memory-mapped frames (np.memmap), opened lazily per process
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['frames'] = None
+        return state
+
+    @classmethod
+    def load(cls, path: str, frame_ids: np.ndarray, frame_size: int):
+        """
+        Function to open a cache saved with self.create().
+        :param path: (str) Path of cache, without extension.
+        :param frame_ids: (np.ndarray) Sorted IDs of frames that should be cached.
+        :param frame_size: (int) Size in pixels of frames that should be cached.
+        :return: (TaskFrameCache or None) Cache, or None if it does not exist or holds other frames.
+        """
+        if not os.path.exists(f"{path}.npy") or not os.path.exists(f"{path}_ids.npy"):
+            return None
+        cached_frame_ids = np.load(f"{path}_ids.npy")
+        frames_shape = np.load(f"{path}.npy", mmap_mode='r').shape
+        if not np.array_equal(cached_frame_ids, frame_ids) or frames_shape != (len(frame_ids), 3, frame_size, frame_size):
+            return None
+        return cls(path, cached_frame_ids, frame_size)
+
+    @classmethod
+    def create(cls, path: str, frame_ids: np.ndarray, frame_size: int, load_frames_fn: Callable[[np.ndarray], torch.Tensor], chunk_size: int=1024):
+        """
+        Function to decode frames and save them as a cache.
+        :param path: (str) Path of cache, without extension.
+        :param frame_ids: (np.ndarray) Sorted IDs of frames to cache.
+        :param frame_size: (int) Size in pixels of frames to cache.
+        :param load_frames_fn: (function) Function to load frames of shape (num_frames, 3, frame_size, frame_size), dtype uint8, from their IDs.
+        :param chunk_size: (int) Number of frames to load at a time.
+        :return: (TaskFrameCache) Cache.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        frames = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(len(frame_ids), 3, frame_size, frame_size))
+        for start in range(0, len(frame_ids), chunk_size):
+            frames[start:start+chunk_size] = load_frames_fn(frame_ids[start:start+chunk_size]).numpy()
+        frames.flush()
+        del frames
+        np.save(f"{path}_ids.npy", frame_ids)
+        os.replace(tmp_path, f"{path}.npy")
+        return cls(path, frame_ids, frame_size)
+
+    def get(self, frame_ids: np.ndarray, out: torch.Tensor=None) -> Tuple[torch.Tensor, np.ndarray]:
+        """
+        Function to get frames from the cache.
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :param out: (torch.Tensor or None) Tensor of shape (len(frame_ids), 3, self.frame_size, self.frame_size), dtype uint8, to copy frames into. If None, a new tensor is allocated.
+        :return: (torch.Tensor, np.ndarray) Frames (uninitialised where missed) and indices of missed frames.
+        """
+        if self.frames is None:
+            self.frames = np.load(f"{self.path}.npy", mmap_mode='r')
+        frames = torch.empty((len(frame_ids), 3, self.frame_size, self.frame_size), dtype=torch.uint8) if out is None else out
+        rows = np.minimum(np.searchsorted(self.frame_ids, frame_ids), len(self.frame_ids) - 1)
+        is_hit = self.frame_ids[rows] == frame_ids if len(self.frame_ids) > 0 else np.zeros(len(frame_ids), dtype=bool)
+        hits = np.flatnonzero(is_hit)
+        if len(hits) > 0:
+            frames[hits] = torch.from_numpy(self.frames[rows[hits]])
+        return frames, np.flatnonzero(~is_hit)
+
+    def __len__(self):
+        return len(self.frame_ids)
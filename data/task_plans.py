@@ -0,0 +1,122 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import json
+import numpy as np
+from typing import Dict, List, Tuple
+
+class TaskPlan():
+    """
+    Compiled plan of a queue's tasks: for every task, its user/object, seed, sampled objects and the frame IDs of the clips sampled from each
+    object's context and target videos. Tasks are held in flat numpy arrays with offsets, so that a plan can be saved to a compact .npz file,
+    executed by ORBITDataset.load_planned_task() and split into shards. Each task's seed depends only on the plan's seed and the task's
+    user/object and number, so tasks are the same however the plan is compiled or sharded.
+    """
+    version = 1
+
+    def __init__(self, task_items: np.ndarray, task_seeds: np.ndarray, task_object_offsets: np.ndarray, objects: np.ndarray, set_clip_offsets: np.ndarray, clip_frame_ids: np.ndarray, config: Dict):
+        """
+        Creates instance of TaskPlan.
+        :param task_items: (np.ndarray) User/object index of each task, dtype int32.
+        :param task_seeds: (np.ndarray) Seed of each task, dtype uint64.
+        :param task_object_offsets: (np.ndarray) Offset of each task's objects in objects, followed by its length, dtype int64.
+        :param objects: (np.ndarray) Sampled object IDs of all tasks, concatenated, dtype int32.
+        :param set_clip_offsets: (np.ndarray) Offset of the context then target clips of each of objects in clip_frame_ids, followed by its length, dtype int64.
+        :param clip_frame_ids: (np.ndarray) Frame IDs of all sampled clips, of shape (num_clips, clip_length), dtype int32.
+        :param config: (dict) Sampling settings and dataset index size the plan was compiled with, used to check it still applies.
+        :return: Nothing.
+        """
+        self.task_items = task_items
+        self.task_seeds = task_seeds
+        self.task_object_offsets = task_object_offsets
+        self.objects = objects
+        self.set_clip_offsets = set_clip_offsets
+        self.clip_frame_ids = clip_frame_ids
+        self.config = config
+
+    def __len__(self):
+        return len(self.task_items)
+
+    @property
+    def num_items(self) -> int:
+        return len(np.unique(self.task_items))
+
+    @staticmethod
+    def get_task_seed(seed: int, item: int, task: int) -> int:
+        """
+        Function to get the seed of a task, independently of all other tasks.
+        :param seed: (int) Seed of the plan.
+        :param item: (int) User/object index of the task.
+        :param task: (int) Number of the task among its user/object's tasks.
+        :return: (int) Task seed.
+        """
+        return int(np.random.SeedSequence([seed, item, task]).generate_state(1, dtype=np.uint64)[0])
+
+    @classmethod
+    def from_tasks(cls, task_items: List[int], task_seeds: List[int], tasks: List[Tuple[List[int], List[np.ndarray], List[np.ndarray]]], clip_length: int, config: Dict):
+        """
+        Function to pack sampled tasks into a plan.
+        :param task_items: (list::int) User/object index of each task.
+        :param task_seeds: (list::int) Seed of each task.
+        :param tasks: (list::tuple) Sampled objects, and context and target clip frame IDs per object, of each task, as returned by ORBITDataset.plan_task().
+        :param clip_length: (int) Number of contiguous frames per clip.
+        :param config: (dict) Sampling settings and dataset index size the plan was compiled with.
+        :return: (TaskPlan) Plan of tasks.
+        """
+        objects = [obj for selected_objects, _, _ in tasks for obj in selected_objects]
+        clip_sets = [clip_set for _, context_sets, target_sets in tasks for context_set, target_set in zip(context_sets, target_sets) for clip_set in (context_set, target_set)]
+        return cls(np.array(task_items, dtype=np.int32),
+                   np.array(task_seeds, dtype=np.uint64),
+                   np.concatenate(([0], np.cumsum([len(selected_objects) for selected_objects, _, _ in tasks], dtype=np.int64))),
+                   np.array(objects, dtype=np.int32),
+                   np.concatenate(([0], np.cumsum([len(clip_set) for clip_set in clip_sets], dtype=np.int64))),
+                   np.concatenate(clip_sets).astype(np.int32) if clip_sets else np.zeros((0, clip_length), dtype=np.int32),
+                   config)
+
+    def get_task(self, index: int) -> Tuple[int, int, List[int], List[np.ndarray], List[np.ndarray]]:
+        """
+        Function to get a task from the plan.
+        :param index: (int) Task index.
+        :return: (int, int, list::int, list::np.ndarray, list::np.ndarray) User/object index, seed, sampled objects, and context and target clip frame IDs per object.
+        """
+        object_start, object_end = self.task_object_offsets[index], self.task_object_offsets[index+1]
+        offsets = self.set_clip_offsets[2*object_start:2*object_end+1]
+        clip_sets = [self.clip_frame_ids[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        return int(self.task_items[index]), int(self.task_seeds[index]), self.objects[object_start:object_end].tolist(), clip_sets[0::2], clip_sets[1::2]
+
+    def shard(self, shard_id: int, num_shards: int):
+        """
+        Function to split the plan by user/object, keeping all of a user/object's tasks in the same shard.
+        :param shard_id: (int) Index of shard to keep.
+        :param num_shards: (int) Total number of shards.
+        :return: (TaskPlan) Plan of the shard's tasks.
+        """
+        items = np.unique(self.task_items)
+        tasks = [self.get_task(i) for i in np.flatnonzero(np.isin(self.task_items, items[shard_id::num_shards]))]
+        return TaskPlan.from_tasks([item for item, _, _, _, _ in tasks], [seed for _, seed, _, _, _ in tasks], [task[2:] for task in tasks], self.clip_frame_ids.shape[1], self.config)
+
+    def save(self, path: str) -> None:
+        """
+        Function to save the plan to a .npz file.
+        :param path: (str) Path to save plan to.
+        :return: Nothing.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz" # shards may compile and save the same plan at the same time
+        np.savez(tmp_path, version=self.version, task_items=self.task_items, task_seeds=self.task_seeds, task_object_offsets=self.task_object_offsets,
+                 objects=self.objects, set_clip_offsets=self.set_clip_offsets, clip_frame_ids=self.clip_frame_ids, config=json.dumps(self.config, sort_keys=True))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Function to load a plan saved with self.save().
+        :param path: (str) Path to load plan from.
+        :return: (TaskPlan or None) Plan, or None if it was saved by a different version.
+        """
+        with np.load(path) as plan_file:
+            if int(plan_file['version']) != cls.version:
+                return None
+            return cls(plan_file['task_items'], plan_file['task_seeds'], plan_file['task_object_offsets'], plan_file['objects'],
+                       plan_file['set_clip_offsets'], plan_file['clip_frame_ids'], json.loads(str(plan_file['config'])))
@@ -5,36 +5,59 @@ import torch
 import numpy as np
 import torch.nn as nn
 
+def get_frame_windows(frames, window_length):
+    """
+    Function to view frames as overlapping windows of window_length consecutive frames, without copying them.
+    :param frames: (torch.Tensor) Frames.
+    :param window_length: (int) Number of frames per window.
+    :return: (torch.Tensor) Strided view of frames of size (num_frames - window_length + 1) x window_length, where window i holds frames i to i + window_length - 1.
+    """
+    return frames.unfold(0, window_length, 1).movedim(-1, 1)
+
 def attach_frame_history(frames, history_length): 
     """
     Function to attach the immediate history of history_length frames to each frame in a tensor of frame data.
     param frames: (torch.Tensor) Frames.
     :param history_length: (int) Number of frames of history to append to each frame.
-    :return: (torch.Tensor) Frames with attached frame history.
+    :return: (torch.Tensor) Frames with attached frame history, as a strided view of the frames. If history_length > 1, the frames are copied once to pad them with the first frame (see attach_frame_history_in_chunks() to avoid the copy).
+    """
+    if history_length > 1: # pad with first frame so that frames 0 to history_length-1 can be evaluated
+        frame_0 = frames.narrow(0, 0, 1)
+        frames = torch.cat((frame_0.expand(history_length-1, *frames.shape[1:]), frames), dim=0)
+
+    # for each frame, view its immediate history of history_length frames
+    return get_frame_windows(frames, history_length) # of size num_clips x history_length
+
+def attach_frame_history_in_chunks(frame_chunks, history_length):
+    """
+    Generator to attach the immediate history of history_length frames to each frame in consecutive chunks of a video's frames, carrying the last frames of each chunk over as history for the next.
+    Clips are strided views of each chunk's frames, so no frame is copied, except the first (history_length - 1) clips of each chunk, which span the previous chunk
+    (or the padding of the first chunk) and are yielded first as a separate small tensor.
+    :param frame_chunks: (iterable::torch.Tensor) Consecutive chunks of a video's frames.
+    :param history_length: (int) Number of frames of history to append to each frame.
+    :return: (generator::torch.Tensor) Frames with attached frame history, in up to two parts per chunk.
     """
-    # pad with first frame so that frames 0 to history_length-1 can be evaluated
-    frame_0 = frames.narrow(0, 0, 1)
-    frames = torch.cat((frame_0.repeat(history_length-1, 1, 1, 1), frames), dim=0)
-
-    # for each frame, attach its immediate history of history_length frames
-    frames = [ frames ]
-    for l in range(1, history_length):
-        frames.append( frames[0].roll(shifts=-l, dims=0) )
-    frames_with_history = torch.stack(frames, dim=1) # of size num_clips x history_length
-    
-    if history_length > 1:
-        return frames_with_history[:-(history_length-1)] # frames have wrapped around, remove last (history_length - 1) frames
-    else:
-        return frames_with_history
+    history = None
+    for frames in frame_chunks:
+        if history_length == 1:
+            yield frames.unsqueeze(1)
+            continue
+        if history is None: # first chunk is padded with its first frame
+            history = frames.narrow(0, 0, 1).expand(history_length-1, *frames.shape[1:])
+        # clips that span the history, then clips within the chunk
+        yield get_frame_windows(torch.cat((history, frames[:history_length-1]), dim=0), history_length)
+        if len(frames) >= history_length:
+            yield get_frame_windows(frames, history_length)
+        history = frames[-(history_length-1):] if len(frames) >= history_length-1 else torch.cat((history, frames), dim=0)[-(history_length-1):]
 
 def unpack_task(task_dict, device, context_to_device=True, target_to_device=False):
    
     context_clips = task_dict['context_clips']
-    context_paths = task_dict['context_paths']
+    context_frame_ids = task_dict['context_frame_ids']
     context_labels = task_dict['context_labels']
     context_annotations = task_dict['context_annotations']
     target_clips = task_dict['target_clips']
-    target_paths = task_dict['target_paths']
+    target_frame_ids = task_dict['target_frame_ids']
     target_labels = task_dict['target_labels']
     target_annotations = task_dict['target_annotations']
     object_list = task_dict['object_list']
@@ -44,7 +67,7 @@ def unpack_task(task_dict, device, context_to_device=True, target_to_device=Fals
     if target_to_device and isinstance(target_labels, torch.Tensor):
         target_labels = target_labels.to(device)
   
-    return context_clips, context_paths, context_labels, target_clips, target_paths, target_labels, object_list
+    return context_clips, context_frame_ids, context_labels, target_clips, target_frame_ids, target_labels, object_list
 
 def get_batch_indices(index, last_element, batch_size):
         batch_start_index = index * batch_size
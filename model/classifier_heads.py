@@ -266,6 +266,9 @@ class MahalanobisClassifier(HeadClassifier):
     """
     Class for a Mahalanobis classifier (https://github.com/peymanbateni/simple-cnaps). Computes per-class distributions using context features. Target features are classified by the shortest Mahalanobis distance to these distributions.
     """
+
+    max_chunk_numel = 2**21 # maximum number of elements of whitened target features to hold at a time in predict(), i.e. 8 MB in float32
+
     def __init__(self, logit_scale: float=1.0):
         """
         Creates instance of MahalanobisClassifier.
@@ -277,13 +280,12 @@ class MahalanobisClassifier(HeadClassifier):
 
     def reset(self):
         self.means = None
-        self.precisions = None
-        self.task_mean = None
-        self.task_precision = None
+        self.covariance_factors = None
 
     def configure(self, context_features, context_labels, ops_counter=None):
         """
-        Function that computes a per-class distribution (mean, precision) using the context features.
+        Function that computes a per-class distribution (mean, covariance) using the context features. Each class's covariance is kept as its
+        Cholesky factor L (i.e. covariance = L L^T), so that Mahalanobis distances can be computed by self.predict() without inverting it.
         :param context_features: (torch.Tensor) Context features.
         :param context_labels: (torch.Tensor) Corresponding class labels for context features.
         :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
@@ -292,10 +294,8 @@ class MahalanobisClassifier(HeadClassifier):
         assert context_features.size(0) == context_labels.size(0), "context features and labels are different sizes!"
 
         means = []
-        precisions = []
+        covariance_factors = []
         task_covariance_estimate = self._estimate_cov(context_features, ops_counter)
-        task_precision = torch.inverse(task_covariance_estimate + torch.eye(context_features.size(1), context_features.size(1)).to(context_features.device))
-        task_mean = torch.mean(context_features, dim=0)
 
         label_set, _ = torch.sort(torch.unique(context_labels))
 
@@ -309,7 +309,7 @@ class MahalanobisClassifier(HeadClassifier):
             covariance_matrix = (lambda_k_tau * class_covariance_estimate) \
                                 + ((1 - lambda_k_tau) * task_covariance_estimate) \
                                 + torch.eye(class_features.size(1), device=class_features.device)
-            precisions.append(torch.inverse(covariance_matrix))
+            covariance_factors.append(torch.linalg.cholesky(covariance_matrix))
 
             if ops_counter:
                 ops_counter.add_macs(context_features.size(0)) # selecting class features
@@ -317,32 +317,29 @@ class MahalanobisClassifier(HeadClassifier):
                 ops_counter.add_macs(1) # computing lambda_k_tau
                 ops_counter.add_macs(class_covariance_estimate.size(0) * class_covariance_estimate.size(1)) # lambda_k_tau * class_covariance_estimate
                 ops_counter.add_macs(task_covariance_estimate.size(0) * task_covariance_estimate.size(1)) # (1-lambda_k_tau) * task_covariance_estimate
-                ops_counter.add_macs(1/3*covariance_matrix.size(0) ** 3 + covariance_matrix.size(0) ** 2 - 4/3*covariance_matrix.size(0)) # computing inverse of covariance_matrix, taken from https://en.wikipedia.org/wiki/Gaussian_elimination#Computational_efficiency
+                ops_counter.add_macs(1/3*covariance_matrix.size(0) ** 3) # computing Cholesky factor of covariance_matrix, taken from https://en.wikipedia.org/wiki/Cholesky_decomposition#Computation
                 # note, sum of 3 matrices to compute covariance_matrix is not included here
 
         self.means = torch.nn.Parameter((torch.stack(means)))
-        self.task_mean = torch.nn.Parameter(task_mean)
-        self.precisions = torch.nn.Parameter((torch.stack(precisions)))
-        self.task_precision = torch.nn.Parameter(task_precision)
+        self.covariance_factors = torch.nn.Parameter((torch.stack(covariance_factors)))
 
     def predict(self, target_features):
         """
-        Function that processes a batch of target features to get logits over object classes for each feature. Target features are classified by their Mahalanobis distance to the class means including the class precisions.
+        Function that processes a batch of target features to get logits over object classes for each feature. Target features are classified by their Mahalanobis distance to the class means including the class covariances.
+        With covariance = L L^T, the squared distance (x - mean)^T covariance^-1 (x - mean) is the squared norm of the whitened difference L^-1 (x - mean), found with a triangular solve.
+        Targets are whitened for every class a chunk at a time, so memory is O(targets x classes) for the logits plus a few times self.max_chunk_numel for a chunk's differences.
         :param target_features: (torch.Tensor) Batch of target features.
         :return: (torch.Tensor) Logits over object classes for each target feature.
         """
-        # grabbing the number of classes and query examples for easier use later in the function
-        number_of_classes = self.means.size(0)
-        number_of_targets = target_features.size(0)
-
-        # calculate the Mahalanobis distance between target features and the class means including the class precision
-        repeated_target = target_features.repeat(1, number_of_classes).view(-1, self.means.size(1))
-        repeated_class_means = self.means.repeat(number_of_targets, 1)
-        repeated_difference = (repeated_class_means - repeated_target)
-        repeated_difference = repeated_difference.view(number_of_targets, number_of_classes,
-                                                       repeated_difference.size(1)).permute(1, 0, 2)
-        first_half = torch.matmul(repeated_difference, self.precisions)
-        logits = torch.mul(first_half, repeated_difference).sum(dim=2).transpose(1, 0) * -1
+        number_of_classes, feat_dim = self.means.size()
+        chunk_size = max(1, self.max_chunk_numel // (number_of_classes * feat_dim))
+
+        logits = []
+        for target_chunk in torch.split(target_features, chunk_size):
+            difference = target_chunk.unsqueeze(0) - self.means.unsqueeze(1) # (number_of_classes) x (chunk_size) x (feat_dim)
+            whitened_difference = torch.linalg.solve_triangular(self.covariance_factors.mT, difference, upper=True, left=False) # rows of difference L^-T
+            logits.append(whitened_difference.square().sum(dim=2).transpose(1, 0) * -1)
+        logits = torch.cat(logits)
 
         return self.logit_scale * logits
 
@@ -0,0 +1,114 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import torch
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+class FeatureCache():
+    """
+    Least-recently-used cache of feature extractor features of individual frames, for when the feature extractor is neither learned nor adapted, so that
+    a frame's features depend only on the frame. Features are keyed by a namespace (identifying the feature extractor, its weights, and the frames' dataset,
+    size and normalisation) and by frame ID. They are kept in memory up to a byte budget. If a spill directory is given, features evicted from memory are
+    appended to a file there and read back from it rather than recomputed. The spill file is only used by the process that created it.
+    """
+    def __init__(self, max_bytes: int, spill_dir: str=None):
+        """
+        Creates instance of FeatureCache.
+        :param max_bytes: (int or None) Maximum number of bytes of features to keep in memory. If None, features are never evicted.
+        :param spill_dir: (str or None) Directory to spill features evicted from memory to. If None, evicted features are dropped.
+        :return: Nothing.
+        """
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.features = OrderedDict()   # Dictionary of (namespace, frame ID): features (torch.Tensor, on the CPU), from least to most recently used
+        self.spill_path = None
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self.spill_path = os.path.join(spill_dir, f"feature_cache_{os.getpid()}.bin")
+            open(self.spill_path, 'wb').close()
+        self.spill_size = 0             # Number of float32 values in the spill file
+        self.spill_offsets = {}         # Dictionary of (namespace, frame ID): (offset, length) of spilled features in the spill file, in float32 values
+        self.spill_map = None           # Memory map of the spill file, re-opened when it has grown
+        self.counters = {'hits': 0, 'spill_hits': 0, 'misses': 0}
+
+    def get(self, namespace: str, frame_ids: np.ndarray) -> List[Optional[torch.Tensor]]:
+        """
+        Function to get frames' features from the cache.
+        :param namespace: (str) Namespace of the frames' features.
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :return: (list::torch.Tensor) Features of each frame, or None if they are not cached.
+        """
+        features = []
+        for frame_id in frame_ids.tolist():
+            key = (namespace, frame_id)
+            frame_features = self.features.get(key)
+            if frame_features is not None:
+                self.features.move_to_end(key)
+                self.counters['hits'] += 1
+            elif key in self.spill_offsets:
+                frame_features = self.read_spilled(key)
+                self.add(key, frame_features)
+                self.counters['spill_hits'] += 1
+            else:
+                self.counters['misses'] += 1
+            features.append(frame_features)
+        return features
+
+    def put(self, namespace: str, frame_ids: np.ndarray, features: torch.Tensor) -> None:
+        """
+        Function to add frames' features to the cache, evicting the least recently used features if it is full.
+        :param namespace: (str) Namespace of the frames' features.
+        :param frame_ids: (np.ndarray) Frame IDs.
+        :param features: (torch.Tensor) Features of each frame, as (num_frames) x (feat_dim).
+        :return: Nothing.
+        """
+        features = features.detach().float().cpu()
+        for frame_id, frame_features in zip(frame_ids.tolist(), features):
+            self.add((namespace, frame_id), frame_features.clone()) # clone so that each entry only holds its own features
+
+    def add(self, key, frame_features: torch.Tensor) -> None:
+        if key in self.features:
+            return
+        self.features[key] = frame_features
+        self.num_bytes += frame_features.numel() * frame_features.element_size()
+        while self.max_bytes is not None and self.num_bytes > self.max_bytes and self.features:
+            evicted_key, evicted_features = self.features.popitem(last=False)
+            self.num_bytes -= evicted_features.numel() * evicted_features.element_size()
+            if self.spill_path and evicted_key not in self.spill_offsets:
+                self.spill(evicted_key, evicted_features)
+
+    def spill(self, key, frame_features: torch.Tensor) -> None:
+        with open(self.spill_path, 'ab') as spill_file:
+            spill_file.write(frame_features.numpy().astype(np.float32).tobytes())
+        self.spill_offsets[key] = (self.spill_size, frame_features.numel())
+        self.spill_size += frame_features.numel()
+
+    def read_spilled(self, key) -> torch.Tensor:
+        offset, length = self.spill_offsets[key]
+        if self.spill_map is None or len(self.spill_map) < offset + length:
+            self.spill_map = np.memmap(self.spill_path, dtype=np.float32, mode='r', shape=(self.spill_size,))
+        return torch.from_numpy(np.array(self.spill_map[offset:offset+length]))
+
+    def clear(self) -> None:
+        """
+        Function to drop all cached features (in memory and spilled), keeping the hit/miss counters.
+        :return: Nothing.
+        """
+        self.features.clear()
+        self.num_bytes = 0
+        if self.spill_path:
+            open(self.spill_path, 'wb').close()
+        self.spill_size, self.spill_offsets, self.spill_map = 0, {}, None
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Function to get the cache's hit/miss counters and occupancy.
+        :return: (dict::float) Number of hits in memory and in the spill file, number of misses, hit rate, and number of frames cached in memory and spilled.
+        """
+        hits, spill_hits, misses = self.counters['hits'], self.counters['spill_hits'], self.counters['misses']
+        num_lookups = hits + spill_hits + misses
+        hit_rate = (hits + spill_hits) / float(num_lookups) if num_lookups > 0 else 0.0
+        return {'hits': hits, 'spill_hits': spill_hits, 'misses': misses, 'hit_rate': hit_rate, 'cached_frames': len(self.features), 'spilled_frames': len(self.spill_offsets)}
@@ -28,13 +28,16 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
+import time
 import torch
+import hashlib
 import numpy as np
 import torch.nn as nn
 from argparse import Namespace
+from collections import OrderedDict
 from torch.nn.utils.stateless import functional_call
 
-from data.utils import get_batch_indices
+from data.utils import get_batch_indices, get_frame_windows
 from model.feature_extractors import create_feature_extractor
 from model.film import get_film_parameters, get_film_parameter_names, get_film_parameter_sizes, unfreeze_film
 from model.feature_adapters import FilmParameterGenerator, NullGenerator
@@ -53,6 +56,7 @@ class FewShotRecogniser(nn.Module):
         """
         super(FewShotRecogniser, self).__init__()
 
+        self.feature_extractor_name = feature_extractor_name
         self.adapt_features = adapt_features
         self.learn_extractor = learn_extractor
         self.clip_length = clip_length
@@ -86,6 +90,12 @@ class FewShotRecogniser(nn.Module):
         # configure frame pooler
         self.frame_pooler = MeanPooler(T=self.clip_length)
 
+        # stats to normalise uint8 clips with, see self._prepare_clips()
+        self.normalize_stats = None
+
+        # cache of frame features, see self.set_feature_cache()
+        self.feature_cache, self.feature_cache_namespace = None, None
+
     def _set_device(self, device):
         self.device = device
 
@@ -95,21 +105,70 @@ class FewShotRecogniser(nn.Module):
         :return: Nothing.
         """
         self.to(self.device)
+
+    def _set_normalize_stats(self, normalize_stats):
+        """
+        Function that sets the stats used to normalise uint8 clips on self.device.
+        :param normalize_stats: (dict::list::float) Per-channel 'mean' and 'std' of frame pixel data.
+        :return: Nothing.
+        """
+        self.normalize_stats = normalize_stats
+
+    def get_feature_cache_namespace(self, frame_set: str) -> str:
+        """
+        Function that gets the namespace of the feature extractor's features in a FeatureCache, from its name and a hash of its weights.
+        :param frame_set: (str) Identifier of the frames' dataset, size and normalisation, that frame IDs are unique within.
+        :return: (str) Namespace.
+        """
+        weights_hash = hashlib.sha1()
+        for name, tensor in self.feature_extractor.state_dict().items():
+            weights_hash.update(name.encode())
+            weights_hash.update(tensor.detach().cpu().contiguous().view(-1).view(torch.uint8).numpy().tobytes())
+        return f"{self.feature_extractor_name}/{weights_hash.hexdigest()[:16]}/{frame_set}"
+
+    def set_feature_cache(self, feature_cache, namespace: str):
+        """
+        Function that sets a cache of frame features, so that frames passed with their frame IDs are only passed through the feature extractor if their features are not cached. Only valid if the feature extractor is neither learned nor adapted.
+        :param feature_cache: (FeatureCache or None) Cache of frame features. If None, features are not cached.
+        :param namespace: (str) Namespace of the feature extractor's features in feature_cache, from self.get_feature_cache_namespace().
+        :return: Nothing.
+        """
+        if feature_cache is not None and (self.learn_extractor or self.adapt_features):
+            raise ValueError("Frame features can only be cached if the feature extractor is neither learned nor adapted.")
+        self.feature_cache, self.feature_cache_namespace = feature_cache, namespace
+
+    def _prepare_clips(self, clips):
+        """
+        Function that moves clips to self.device. If clips are uint8, they are converted to float and normalised with self.normalize_stats on self.device.
+        :param clips: (torch.Tensor) Clips (or frames), dtype float32 or uint8.
+        :return: (torch.Tensor) Normalised clips on self.device, dtype float32.
+        """
+        clips = clips.to(self.device, non_blocking=True)
+        if clips.dtype == torch.uint8:
+            if self.normalize_stats is None:
+                raise ValueError("uint8 clips need normalize_stats to be set with _set_normalize_stats().")
+            mean = torch.tensor(self.normalize_stats['mean'], device=self.device).view(-1, 1, 1)
+            std = torch.tensor(self.normalize_stats['std'], device=self.device).view(-1, 1, 1)
+            clips = clips.float().div(255).sub(mean).div(std)
+        return clips
     
-    def _get_features(self, clips, film_dict={}, ops_counter=None):
+    def _get_features(self, clips, film_dict={}, ops_counter=None, frame_ids=None):
         """
         Function that passes clips through an adapted feature extractor to get adapted (and flattened) frame features.
         :param clips: (torch.Tensor) Tensor of clips, each composed of self.clip_length contiguous frames.
         :param film_dict: (dict) Generated FiLM parameters. Empty dict if adapt_features=False, or finetuning.
         :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
+        :param frame_ids: (np.ndarray or None) Frame IDs of clips, to look their features up in self.feature_cache. If None, features are not cached.
         :return: (torch.Tensor) Adapted frame features flattened across all clips.
         """
+        if frame_ids is not None and self.feature_cache is not None:
+            return self._get_cached_features_in_batches(clips, frame_ids, ops_counter)
 
         if len(clips.shape) == 5:
             num_clips, clip_length, c, h, w = clips.shape
             clips = clips.reshape(num_clips*clip_length, c, h, w)
 
-        clips = clips.to(self.device, non_blocking=True)
+        clips = self._prepare_clips(clips)
        
         if film_dict: # if film parameters have been generated, use stateless call
             features = functional_call(self.feature_extractor, film_dict, clips, kwargs=None)
@@ -121,25 +180,31 @@ class FewShotRecogniser(nn.Module):
 
         return features
 
-    def _get_features_in_batches(self, clips, film_dict={}, ops_counter=None):
+    def _get_features_in_batches(self, clips, film_dict={}, ops_counter=None, batch_size=None, frame_ids=None):
         """
         Function that passes clips in batches through an adapted feature extractor to get adapted (and flattened) frame features.
         :param clips: (torch.Tensor) Clips, each composed of self.clip_length contiguous frames.
         :param film_dict: (dict) Generated FiLM parameters. Empty dict if adapt_features=False, or finetuning.
         :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
+        :param batch_size: (int or None) Number of clips per batch. If None, self.batch_size is used.
+        :param frame_ids: (np.ndarray or None) Frame IDs of clips, to look their features up in self.feature_cache. If None, features are not cached.
         :return: (torch.Tensor) Adapted frame features flattened across all clips.
         """
+        if frame_ids is not None and self.feature_cache is not None:
+            return self._get_cached_features_in_batches(clips, frame_ids, ops_counter, batch_size)
+
         features = []
 
         num_clips = len(clips)
-        num_batches = int(np.ceil(float(num_clips) / float(self.batch_size)))
+        batch_size = batch_size if batch_size else self.batch_size
+        num_batches = int(np.ceil(float(num_clips) / float(batch_size)))
         for batch in range(num_batches):
-            batch_start_index, batch_end_index = get_batch_indices(batch, num_clips, self.batch_size)
+            batch_start_index, batch_end_index = get_batch_indices(batch, num_clips, batch_size)
             batch_clips = clips[batch_start_index:batch_end_index]
             if len(batch_clips.shape) == 5:
                 batch_clips = batch_clips.flatten(end_dim=1)
 
-            batch_clips = batch_clips.to(self.device, non_blocking=True)
+            batch_clips = self._prepare_clips(batch_clips)
             if film_dict: # if film parameters have been generated, use stateless call
                 batch_features = functional_call(self.feature_extractor, film_dict, batch_clips, kwargs=None)
             else:
@@ -152,6 +217,63 @@ class FewShotRecogniser(nn.Module):
 
         return torch.cat(features, dim=0)
 
+    def _get_cached_features_in_batches(self, clips, frame_ids, ops_counter=None, batch_size=None):
+        """
+        Function that gets frame features from self.feature_cache, and passes only the frames whose features are not cached through the feature extractor (in batches), then caches their features.
+        The feature extractor's MACs are counted for every frame, as if none were cached, so that counts do not depend on the cache.
+        :param clips: (torch.Tensor) Clips, each composed of self.clip_length contiguous frames, or frames.
+        :param frame_ids: (np.ndarray) Frame IDs of clips (or frames).
+        :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
+        :param batch_size: (int or None) Number of clips (or frames) per batch. If None, self.batch_size clips are used per batch.
+        :return: (torch.Tensor) Frame features flattened across all clips.
+        """
+        if len(clips.shape) == 5:
+            clips = clips.flatten(end_dim=1)
+            batch_size = (batch_size if batch_size else self.batch_size) * self.clip_length
+        frame_ids = np.asarray(frame_ids).reshape(-1)
+        cached_features = self.feature_cache.get(self.feature_cache_namespace, frame_ids)
+        hits = [i for i, frame_features in enumerate(cached_features) if frame_features is not None]
+        missed = [i for i, frame_features in enumerate(cached_features) if frame_features is None]
+
+        missed_features, num_computed = None, 0
+        if missed:
+            # pass each missed frame through the feature extractor once, even if it is repeated
+            missed_frame_ids, first_idxs, inverse_idxs = np.unique(frame_ids[missed], return_index=True, return_inverse=True)
+            missed_features = self._get_features_in_batches(clips[torch.from_numpy(np.asarray(missed)[first_idxs])], ops_counter=ops_counter, batch_size=batch_size)
+            self.feature_cache.put(self.feature_cache_namespace, missed_frame_ids, missed_features)
+            num_computed = len(missed_frame_ids)
+        if ops_counter and num_computed < len(frame_ids): # count the frames that were not passed through the feature extractor as if they had been
+            ops_counter.add_cached_macs(self.feature_extractor, self._prepare_clips(clips[:1]), len(frame_ids) - num_computed)
+        
+        feat_dim = cached_features[hits[0]].size(0) if hits else missed_features.size(1)
+        features = torch.empty((len(frame_ids), feat_dim), device=self.device)
+        if hits:
+            features[hits] = torch.stack([cached_features[i] for i in hits]).to(self.device)
+        if missed:
+            features[missed] = missed_features[torch.from_numpy(inverse_idxs.reshape(-1)).to(missed_features.device)]
+
+        return features
+
+    def _get_video_chunk_features(self, frames, history_features=None, film_dict={}, ops_counter=None, frame_ids=None):
+        """
+        Function that passes a chunk of a video's frames through an adapted feature extractor once per frame, and pools their features per clip of the
+        self.clip_length frames ending at each frame. Each clip's features are a strided view of its frames' features, pooled by self._pool_features() as
+        in self.predict(), so that each frame is passed through the feature extractor once rather than once per clip it is part of.
+        :param frames: (torch.Tensor) Chunk of consecutive frames from a video.
+        :param history_features: (torch.Tensor or None) Features of the (self.clip_length - 1) frames before the chunk, as returned for the video's previous chunk. If None, the chunk is the start of the video and its first frame is repeated as history.
+        :param film_dict: (dict) Generated FiLM parameters. Empty dict if adapt_features=False, or finetuning.
+        :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
+        :param frame_ids: (np.ndarray or None) Frame IDs of frames, to look their features up in self.feature_cache. If None, features are not cached.
+        :return: (torch.Tensor, torch.Tensor) Frame features pooled per clip i.e. as (num_frames) x (feat_dim), and the features to pass as history_features with the video's next chunk.
+        """
+        features = self._get_features_in_batches(frames, film_dict, ops_counter, batch_size=self.batch_size*self.clip_length, frame_ids=frame_ids) # same number of frames per batch as for clips
+        if history_features is None:
+            history_features = features.narrow(0, 0, 1).expand(self.clip_length-1, -1)
+        features = torch.cat((history_features, features), dim=0)
+
+        clip_features = get_frame_windows(features, self.clip_length) # (num_frames) x (self.clip_length) x (feat_dim)
+        return self._pool_features(clip_features.reshape(-1, features.size(1)), ops_counter), features[len(features)-(self.clip_length-1):]
+
     def _pool_features(self, features, ops_counter=None):
         """
         Function that pools frame features per clip.
@@ -204,13 +326,14 @@ class MultiStepFewShotRecogniser(FewShotRecogniser):
         """
         self.classifier.reset()
 
-    def personalise(self, context_clips, context_labels, learning_args, ops_counter=None):
+    def personalise(self, context_clips, context_labels, learning_args, ops_counter=None, context_frame_ids=None):
         """
         Function that learns a new task by taking a fixed number of gradient steps on the task's full context set. For each task, a new linear classification layer is added (and FiLM layers if self.adapt_features == True).
         :param context_clips: (torch.Tensor) Context clips, each composed of self.clip_length contiguous frames.
         :param context_labels: (torch.Tensor) Video-level labels for each context clip.
         :param learning_args: (dict) Hyperparameters for personalisation.
         :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
+        :param context_frame_ids: (np.ndarray or None) Frame IDs of context clips, to look their features up in self.feature_cache. If None, features are not cached.
         :return: Nothing.
         """
         self._set_batch_norm_state()
@@ -235,7 +358,8 @@ class MultiStepFewShotRecogniser(FewShotRecogniser):
                 batch_context_labels = context_labels[batch_start_index:batch_end_index]
                 batch_len = len(context_labels[batch_start_index:batch_end_index])
                
-                batch_context_features = self._get_features(batch_context_clips, ops_counter=ops_counter)
+                batch_context_frame_ids = context_frame_ids[batch_start_index:batch_end_index] if context_frame_ids is not None else None
+                batch_context_features = self._get_features(batch_context_clips, ops_counter=ops_counter, frame_ids=batch_context_frame_ids)
                 batch_context_features = self._pool_features(batch_context_features, ops_counter=ops_counter)
                 batch_context_logits = self.classifier.predict(batch_context_features, ops_counter=ops_counter)
                 loss = loss_fn(batch_context_logits, batch_context_labels.to(self.device))
@@ -245,18 +369,32 @@ class MultiStepFewShotRecogniser(FewShotRecogniser):
             personalize_optimizer.step()
             personalize_optimizer.zero_grad()
     
-    def predict(self, clips, ops_counter=None):
+    def predict(self, clips, ops_counter=None, frame_ids=None):
         """
         Function that processes target clips in batches to get logits over object classes for each clip.
         :param clips: (torch.Tensor) Clips, each composed of self.clip_length contiguous frames.
         :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
+        :param frame_ids: (np.ndarray or None) Frame IDs of clips, to look their features up in self.feature_cache. If None, features are not cached.
         :return: (torch.Tensor) Logits over object classes for each clip in clips.
         """
         self._set_batch_norm_state()
-        features = self._get_features_in_batches(clips, ops_counter=ops_counter)
+        features = self._get_features_in_batches(clips, ops_counter=ops_counter, frame_ids=frame_ids)
         features = self._pool_features(features, ops_counter=ops_counter)
         return self.classifier.predict(features, ops_counter=ops_counter)
 
+    def predict_video_chunk(self, frames, history_features=None, ops_counter=None, frame_ids=None):
+        """
+        Function that processes a chunk of a video's frames to get logits over object classes for the clip of self.clip_length frames ending at each frame. Over a video's chunks, gives the same logits as self.predict() on the video's clips from data.utils.attach_frame_history(), up to float32 rounding (~1e-7) as frames are passed through the feature extractor and classifier in different batches.
+        :param frames: (torch.Tensor) Chunk of consecutive frames from a video.
+        :param history_features: (torch.Tensor or None) History features returned for the video's previous chunk. None for the video's first chunk.
+        :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
+        :param frame_ids: (np.ndarray or None) Frame IDs of frames, to look their features up in self.feature_cache. If None, features are not cached.
+        :return: (torch.Tensor, torch.Tensor) Logits over object classes for each frame's clip, and history features to pass with the video's next chunk.
+        """
+        self._set_batch_norm_state()
+        features, history_features = self._get_video_chunk_features(frames, history_features, ops_counter=ops_counter, frame_ids=frame_ids)
+        return self.classifier.predict(features, ops_counter=ops_counter), history_features
+
     def personalise_with_lite(self, context_clips, context_labels):
         NotImplementedError
     
@@ -293,6 +431,9 @@ class SingleStepFewShotRecogniser(FewShotRecogniser):
         else:
             self.set_encoder = NullSetEncoder()
             self.film_generator = NullGenerator()
+
+        # cache of personalised parameters per context set, see self.set_personalisation_cache()
+        self.personalisation_cache, self.personalisation_cache_size = None, 0
     
     def _reset(self):
         """
@@ -310,21 +451,60 @@ class SingleStepFewShotRecogniser(FewShotRecogniser):
         self.reps_cache = None
         self.features_cache = None
 
-    def personalise(self, context_clips, context_labels, ops_counter=None):
+    def set_personalisation_cache(self, cache_size: int):
+        """
+        Function that sets a cache of the FiLM parameters and classifier parameters that self.personalise() learns from each context set, so that a task
+        whose context set (i.e. frame IDs and labels, in any order) was already personalised to reuses them. Only valid while the model's parameters are fixed, e.g. at test time.
+        :param cache_size: (int) Number of most recently used context sets to keep parameters for. If 0, parameters are not cached.
+        :return: Nothing.
+        """
+        self.personalisation_cache, self.personalisation_cache_size = (OrderedDict(), cache_size) if cache_size > 0 else (None, 0)
+
+    def _get_personalisation_key(self, context_frame_ids, context_labels) -> str:
+        """
+        Function that hashes a context set's content, independently of the order of its clips.
+        :param context_frame_ids: (np.ndarray) Frame IDs of context clips.
+        :param context_labels: (torch.Tensor) Video-level labels for each context clip.
+        :return: (str) Key of context set in self.personalisation_cache.
+        """
+        clips = np.column_stack((np.asarray(context_frame_ids, dtype=np.int64).reshape(len(context_labels), -1), context_labels.cpu().numpy().astype(np.int64)))
+        clips = clips[np.lexsort(clips.T[::-1])]
+        return hashlib.sha1(clips.tobytes()).hexdigest() + f"/{clips.shape[1]}"
+
+    def personalise(self, context_clips, context_labels, ops_counter=None, context_frame_ids=None):
         """
         Function that learns a new task by performing a forward pass of the task's context set.
         :param context_clips: (torch.Tensor) Context clips each composed of self.clip_length contiguous frames.
         :param context_labels: (torch.Tensor) Video-level labels for each context clip.
         :param ops_counter: (utils.OpsCounter or None) Object that counts operations performed.
+        :param context_frame_ids: (np.ndarray or None) Frame IDs of context clips, to look their features up in self.feature_cache and the context set up in self.personalisation_cache. If None, neither is used.
         :return: Nothing.
         """
+        key = self._get_personalisation_key(context_frame_ids, context_labels) if self.personalisation_cache is not None and context_frame_ids is not None else None
+        if key is not None and key in self.personalisation_cache:
+            self.personalisation_cache.move_to_end(key)
+            self.film_dict, classifier_params, num_macs, personalise_time = self.personalisation_cache[key]
+            for name, param in classifier_params.items():
+                setattr(self.classifier, name, param)
+            if ops_counter:
+                ops_counter.add_macs(num_macs) # MACs to personalise are those of the model, however many are saved
+                ops_counter.log_personalisation_cache_hit(personalise_time)
+            return
+
+        t1, macs_before = time.time(), ops_counter.task_mac_counter if ops_counter else 0
         self._set_batch_norm_state()
         task_embedding = self._get_task_embedding_in_batches(context_clips, ops_counter)
         self.film_dict = self._generate_film_params(task_embedding, ops_counter)
-        context_features = self._get_features_in_batches(context_clips, self.film_dict, ops_counter)
+        context_features = self._get_features_in_batches(context_clips, self.film_dict, ops_counter, frame_ids=context_frame_ids)
         context_features = self._pool_features(context_features, ops_counter)
         self.classifier.configure(context_features, context_labels, ops_counter)
 
+        if key is not None: # parameters are replaced rather than updated by the next personalisation, so they can be cached without copying
+            num_macs = ops_counter.task_mac_counter - macs_before if ops_counter else 0
+            self.personalisation_cache[key] = (self.film_dict, dict(self.classifier.named_parameters(recurse=False)), num_macs, time.time() - t1)
+            if len(self.personalisation_cache) > self.personalisation_cache_size:
+                self.personalisation_cache.popitem(last=False)
+
     def personalise_with_lite(self, context_clips, context_labels):
         """
         Function that learns a new task by performning a forward pass of the task's context set with LITE. Namely a random subset of the context set (self.num_lite_samples) is processed with back-propagation enabled, while the remainder is processed with back-propagation disabled.
@@ -350,7 +530,7 @@ class SingleStepFewShotRecogniser(FewShotRecogniser):
         :param aggregation: (str) Method to aggregate clip encodings from self.set_encoder.
         :return: (torch.Tensor or None) Task embedding.
         """
-        context_clips = context_clips.to(self.device, non_blocking=True)
+        context_clips = self._prepare_clips(context_clips)
         reps = self.set_encoder(context_clips)
 
         if ops_counter:
@@ -375,7 +555,7 @@ class SingleStepFewShotRecogniser(FewShotRecogniser):
         for batch in range(num_batches):
             batch_start_index, batch_end_index = get_batch_indices(batch, num_clips, self.batch_size)
             batch_clips = context_clips[batch_start_index:batch_end_index]
-            batch_clips = batch_clips.to(self.device, non_blocking=True)
+            batch_clips = self._prepare_clips(batch_clips)
             batch_reps = self.set_encoder(batch_clips)
 
             if ops_counter:
@@ -450,17 +630,30 @@ class SingleStepFewShotRecogniser(FewShotRecogniser):
 
         return film_dict
 
-    def predict(self, target_clips):
+    def predict(self, target_clips, frame_ids=None):
         """
         Function that processes target clips in batches to get logits over object classes for each clip.
         :param target_clips: (torch.Tensor) Target clips, each composed of self.clip_length contiguous frames.
+        :param frame_ids: (np.ndarray or None) Frame IDs of target clips, to look their features up in self.feature_cache. If None, features are not cached.
         :return: (torch.Tensor) Logits over object classes for each clip in target_clips.
         """
         self._set_batch_norm_state()
-        target_features = self._get_features_in_batches(target_clips, self.film_dict)
+        target_features = self._get_features_in_batches(target_clips, self.film_dict, frame_ids=frame_ids)
         target_features = self._pool_features(target_features)
         return self.classifier.predict(target_features)
 
+    def predict_video_chunk(self, frames, history_features=None, frame_ids=None):
+        """
+        Function that processes a chunk of a video's frames to get logits over object classes for the clip of self.clip_length frames ending at each frame. Over a video's chunks, gives the same logits as self.predict() on the video's clips from data.utils.attach_frame_history(), up to float32 rounding (~1e-7) as frames are passed through the feature extractor and classifier in different batches.
+        :param frames: (torch.Tensor) Chunk of consecutive frames from a video.
+        :param history_features: (torch.Tensor or None) History features returned for the video's previous chunk. None for the video's first chunk.
+        :param frame_ids: (np.ndarray or None) Frame IDs of frames, to look their features up in self.feature_cache. If None, features are not cached.
+        :return: (torch.Tensor, torch.Tensor) Logits over object classes for each frame's clip, and history features to pass with the video's next chunk.
+        """
+        self._set_batch_norm_state()
+        target_features, history_features = self._get_video_chunk_features(frames, history_features, self.film_dict, frame_ids=frame_ids)
+        return self.classifier.predict(target_features), history_features
+
     def predict_a_batch(self, target_clips):
         """
         Function that processes a single batch of target clips to get logits over object classes for each clip.
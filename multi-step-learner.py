@@ -36,8 +36,9 @@ import numpy as np
 import torch.backends.cudnn as cudnn
 
 from data.dataloaders import DataLoader
-from data.utils import unpack_task, attach_frame_history
+from data.utils import unpack_task
 from model.few_shot_recognisers import MultiStepFewShotRecogniser
+from model.feature_cache import FeatureCache
 from utils.args import parse_args
 from utils.optim import cross_entropy
 from utils.ops_counter import OpsCounter
@@ -75,6 +76,7 @@ class Learner:
         self.init_dataset()
         self.init_evaluators()
         self.model = self.init_model()
+        self.feature_cache = FeatureCache(self.args.feature_cache_mb * 1024**2, self.args.feature_cache_dir) if self.args.feature_cache_mb > 0 else None
         self.loss = cross_entropy
         
         print_and_log(self.logfile, f"Model details:\n"  \
@@ -100,11 +102,28 @@ class Learner:
             'frame_norm_method': self.args.frame_norm_method,
             'annotations_to_load': self.args.annotations_to_load,
             'test_filter_by_annotations': [self.args.test_filter_context, self.args.test_filter_target],
+            'frame_store': self.args.frame_store,
+            'with_manifest': self.args.with_manifest,
+            'num_index_threads': self.args.num_index_threads,
+            'with_uint8_frames': self.args.with_uint8_frames,
+            'frame_cache': self.args.frame_cache,
+            'num_decode_threads': self.args.num_decode_threads,
+            'with_lazy_targets': self.args.with_lazy_targets,
+            'shared_frame_cache_mb': self.args.shared_frame_cache_mb,
+            'with_user_frame_cache': self.args.with_user_frame_cache,
+            'with_persistent_workers': self.args.with_persistent_workers,
+            'prefetch_factor': self.args.prefetch_factor,
+            'task_buffer_mb': self.args.task_buffer_mb,
+            'task_plan_dir': self.args.task_plan_dir,
+            'task_plan_seed': self.args.task_plan_seed,
+            'task_plan_shard': self.args.task_plan_shard,
+            'with_task_frame_cache': self.args.with_task_frame_cache,
             'logfile': self.logfile
         }
 
         dataloader = DataLoader(dataset_info)
         self.test_queue = dataloader.get_test_queue()
+        self.normalize_stats = self.test_queue.get_normalize_stats()
         
     def init_model(self):
         model = MultiStepFewShotRecogniser(
@@ -112,14 +131,17 @@ class Learner:
             self.args.batch_size, self.args.learn_extractor, self.args.logit_scale
         )
         model._set_device(self.device)
+        model._set_normalize_stats(self.normalize_stats)
         model._send_to_device()
 
         return model
    
-    def init_finetuner(self):
+    def init_finetuner(self, feature_cache=None):
         finetuner = self.init_model()
         finetuner.load_state_dict(self.model.state_dict(), strict=False)
         finetuner.set_test_mode(True)
+        if feature_cache is not None:
+            finetuner.set_feature_cache(feature_cache, self.feature_cache_namespace)
         return finetuner
 
     def init_evaluators(self):
@@ -139,19 +161,23 @@ class Learner:
         else:
             print_and_log(self.logfile, 'warning: saved model path could not be found; using original param initialisation.')
             path = self.checkpoint_dir
+        # if --with_user_feature_cache, compute each of a user's frames' features once and reuse them across all the user's tasks
+        feature_cache = FeatureCache(None) if self.args.with_user_feature_cache else self.feature_cache
+        if feature_cache is not None: # features of the loaded feature extractor, shared by every task's finetuner
+            self.feature_cache_namespace = self.model.get_feature_cache_namespace(f"{self.args.test_set}/{self.args.frame_size}/{self.args.frame_norm_method}")
         self.ops_counter.set_base_params(self.model)
         num_context_clips_per_task, num_target_clips_per_task = [], []
          
         # loop through test tasks (num_test_users * num_test_tasks_per_user)
         num_test_tasks = len(self.test_queue) * self.args.num_test_tasks
         for step, task_dict in enumerate(self.test_queue.get_tasks()):
-            context_clips, context_paths, context_labels, target_frames_by_video, target_paths_by_video, target_labels_by_video, object_list = unpack_task(task_dict, self.device, context_to_device=False)
+            context_clips, context_frame_ids, context_labels, target_frames_by_video, target_frame_ids_by_video, target_labels_by_video, object_list = unpack_task(task_dict, self.device, context_to_device=False)
             num_context_clips = len(context_clips)
             self.test_evaluator.set_task_object_list(object_list)
-            self.test_evaluator.set_task_context_paths(context_paths)
+            self.test_evaluator.set_task_context_frame_ids(context_frame_ids)
             
             # initialise finetuner model to initial state of self.model for current task
-            finetuner = self.init_finetuner()
+            finetuner = self.init_finetuner(feature_cache)
 
             # adapt to current task by finetuning on context clips
             t1 = time.time()
@@ -166,7 +192,7 @@ class Learner:
                             'betas' : self.args.personalize_betas,
                             'epsilon' : self.args.personalize_epsilon
                             }
-            finetuner.personalise(context_clips, context_labels, learning_args, ops_counter=self.ops_counter)
+            finetuner.personalise(context_clips, context_labels, learning_args, ops_counter=self.ops_counter, context_frame_ids=context_frame_ids)
             self.ops_counter.log_time(time.time() - t1, 'personalise')
             # add task's ops to self.ops_counter
             self.ops_counter.task_complete()
@@ -174,14 +200,18 @@ class Learner:
             # loop through target videos for the current task
             with torch.no_grad():
                 num_target_clips = 0
-                video_iterator = zip(target_frames_by_video, target_paths_by_video, target_labels_by_video)
-                for video_frames, video_paths, video_label in video_iterator:
-                    video_clips = attach_frame_history(video_frames, self.args.clip_length)
-                    num_clips = len(video_clips)
-                    t1 = time.time()
-                    video_logits = finetuner.predict(video_clips)
-                    self.ops_counter.log_time((time.time() - t1)/float(num_clips), 'inference')
-                    self.test_evaluator.append_video(video_logits, video_label, video_paths)
+                video_iterator = self.test_queue.stream_target_videos(target_frames_by_video, target_frame_ids_by_video, target_labels_by_video, self.args.target_chunk_size)
+                for video_frame_chunks, video_frame_ids, video_label in video_iterator:
+                    video_logits, history_features, num_clips, inference_time = [], None, 0, 0.0
+                    for video_frames in video_frame_chunks: # each frame is predicted with its clip, i.e. the clip_length frames ending at it
+                        t1 = time.time()
+                        chunk_logits, history_features = finetuner.predict_video_chunk(video_frames, history_features, frame_ids=video_frame_ids[num_clips:num_clips+len(video_frames)])
+                        video_logits.append(chunk_logits)
+                        inference_time += time.time() - t1
+                        num_clips += len(chunk_logits)
+                    video_logits = torch.cat(video_logits)
+                    self.ops_counter.log_time(inference_time/float(num_clips), 'inference')
+                    self.test_evaluator.append_video(video_logits, video_label, video_frame_ids)
                     num_target_clips += num_clips
                 
                 # log number of clips per task
@@ -193,6 +223,8 @@ class Learner:
                     self.test_evaluator.set_current_user(task_dict["task_id"])
                     _,_,_,current_video_stats = self.test_evaluator.get_mean_stats(current_user=True)
                     print_and_log(self.logfile, f'{self.args.test_set} user {task_dict["task_id"]} ({self.test_evaluator.current_user+1}/{len(self.test_queue)}) stats: {stats_to_str(current_video_stats)} avg # context clips/task: {np.mean(num_context_clips_per_task):.0f} avg # target clips/task: {np.mean(num_target_clips_per_task):.0f}')
+                    if self.args.with_user_feature_cache:
+                        feature_cache.clear()
                     if (step+1) < num_test_tasks:
                         num_context_clips_per_task, num_target_clips_per_task = [], [] # reset per user
                         self.test_evaluator.next_user()
@@ -200,6 +232,7 @@ class Learner:
                     self.test_evaluator.next_task()
             
             self.model._reset()
+            self.test_queue.release_task(task_dict)
             # add task's ops to self.ops_counter
             self.ops_counter.task_complete()
 
@@ -208,8 +241,11 @@ class Learner:
         stats_per_user_str, stats_per_obj_str, stats_per_task_str, stats_per_video_str = stats_to_str(stats_per_user), stats_to_str(stats_per_obj), stats_to_str(stats_per_task), stats_to_str(stats_per_video)
         mean_ops_stats = self.ops_counter.get_mean_stats()
         print_and_log(self.logfile, f'{self.args.test_set} [{path}]\n per-user stats: {stats_per_user_str}\n per-object stats: {stats_per_obj_str}\n per-task stats: {stats_per_task_str}\n per-video stats: {stats_per_video_str}\n model stats: {mean_ops_stats}\n')
+        if feature_cache is not None:
+            feature_cache_stats = feature_cache.get_stats()
+            print_and_log(self.logfile, f"{'per-user ' if self.args.with_user_feature_cache else ''}feature cache: {feature_cache_stats['hits']} hits, {feature_cache_stats['spill_hits']} spill hits, {feature_cache_stats['misses']} misses (hit rate: {feature_cache_stats['hit_rate']:.2%}), {feature_cache_stats['cached_frames']} frames cached, {feature_cache_stats['spilled_frames']} spilled")
         if save_evaluator:
-            self.test_evaluator.save()
+            self.test_evaluator.save(self.test_queue.get_frame_paths)
         self.test_evaluator.reset()
     
 if __name__ == "__main__":
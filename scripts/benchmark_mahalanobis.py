@@ -0,0 +1,98 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import sys
+import time
+import torch
+import argparse
+import numpy as np
+from torch.profiler import profile, ProfilerActivity
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repo root
+from model.classifier_heads import MahalanobisClassifier
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ways", type=int, nargs='+', default=list(range(2, 16)), help="Numbers of classes to benchmark.")
+    parser.add_argument("--feat_dim", type=int, default=1280, help="Feature size (1280 for efficientnet_b0).")
+    parser.add_argument("--context_shot", type=int, default=10, help="Number of context features per class.")
+    parser.add_argument("--num_targets", type=int, default=256, help="Number of target features to predict at a time.")
+    parser.add_argument("--num_repeats", type=int, default=5, help="Number of times to time each prediction.")
+    parser.add_argument("--seed", type=int, default=1991, help="Random seed.")
+    parser.add_argument("--gpu", type=int, default=0, help="gpu id to use (cpu: <0)")
+    args = parser.parse_args()
+    device = torch.device(f"cuda:{args.gpu}" if torch.cuda.is_available() and args.gpu >= 0 else 'cpu')
+    torch.manual_seed(args.seed)
+
+    print('{:} targets of {:}-d features on {:}, peak memory is of temporaries while predicting'.format(args.num_targets, args.feat_dim, device))
+    print('{:>4} | {:>12} {:>12} | {:>12} {:>12} | {:>15}'.format('way', 'repeat (ms)', 'repeat (MB)', 'factor (ms)', 'factor (MB)', 'max |diff| (%)'))
+    for way in args.ways:
+        context_features = torch.randn(way * args.context_shot, args.feat_dim, device=device)
+        context_labels = torch.arange(way, device=device).repeat_interleave(args.context_shot)
+        target_features = torch.randn(args.num_targets, args.feat_dim, device=device)
+        classifier = MahalanobisClassifier()
+        with torch.no_grad():
+            classifier.configure(context_features, context_labels)
+            precisions = torch.cholesky_inverse(classifier.covariance_factors) # as configure() computed them before it kept Cholesky factors
+            repeat_logits, repeat_ms, repeat_mb = measure(lambda: predict_with_repeat(classifier, precisions, target_features), args.num_repeats, device)
+            factor_logits, factor_ms, factor_mb = measure(lambda: classifier.predict(target_features), args.num_repeats, device)
+        max_diff = ((factor_logits - repeat_logits).abs().max() / repeat_logits.abs().max()).item() * 100
+        print('{:>4} | {:>12.2f} {:>12.1f} | {:>12.2f} {:>12.1f} | {:>15.2e}'.format(way, repeat_ms, repeat_mb, factor_ms, factor_mb, max_diff))
+
+def predict_with_repeat(classifier, precisions, target_features):
+    """
+    Function that computes Mahalanobis logits as MahalanobisClassifier.predict() did before it used Cholesky factors, by expanding every target-class difference and multiplying it by the class precisions.
+    """
+    number_of_classes = classifier.means.size(0)
+    number_of_targets = target_features.size(0)
+    repeated_target = target_features.repeat(1, number_of_classes).view(-1, classifier.means.size(1))
+    repeated_class_means = classifier.means.repeat(number_of_targets, 1)
+    repeated_difference = (repeated_class_means - repeated_target)
+    repeated_difference = repeated_difference.view(number_of_targets, number_of_classes,
+                                                   repeated_difference.size(1)).permute(1, 0, 2)
+    first_half = torch.matmul(repeated_difference, precisions)
+    logits = torch.mul(first_half, repeated_difference).sum(dim=2).transpose(1, 0) * -1
+    return classifier.logit_scale * logits
+
+def measure(predict_fn, num_repeats, device):
+    """
+    Function to time a prediction and measure the peak memory allocated by torch for its temporaries.
+    :return: (torch.Tensor, float, float) Logits, median time in ms, and peak memory in MB.
+    """
+    logits = predict_fn() # warm up
+    times = []
+    for _ in range(num_repeats):
+        synchronize(device)
+        start_time = time.time()
+        predict_fn()
+        synchronize(device)
+        times.append((time.time() - start_time) * 1000)
+
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+        predict_fn()
+        peak_mb = (torch.cuda.max_memory_allocated(device) - baseline) / 2**20
+    else:
+        peak_mb = measure_cpu_peak_memory(predict_fn)
+    return logits, float(np.median(times)), peak_mb
+
+def measure_cpu_peak_memory(predict_fn):
+    """
+    Function to measure the peak CPU memory allocated by torch during a prediction in MB, by replaying the profiler's allocations and frees in order.
+    """
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        predict_fn()
+    num_bytes, peak_bytes = 0, 0
+    for event in sorted(prof.events(), key=lambda event: event.time_range.start):
+        num_bytes += event.self_cpu_memory_usage
+        peak_bytes = max(peak_bytes, num_bytes)
+    return peak_bytes / 2**20
+
+def synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import sys
+import torch
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repo root
+from data.utils import attach_frame_history, attach_frame_history_in_chunks
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max_frames", type=int, default=40, help="Videos of 1 to max_frames frames are checked.")
+    parser.add_argument("--max_history_length", type=int, default=8, help="History lengths of 1 to max_history_length are checked.")
+    parser.add_argument("--chunk_sizes", type=int, nargs='+', default=[1, 2, 3, 5, 16], help="Chunk sizes to check attach_frame_history_in_chunks() with.")
+    parser.add_argument("--frame_size", type=int, default=4, help="Height and width of the random frames.")
+    args = parser.parse_args()
+
+    num_checks, mismatches = 0, []
+    for num_frames in range(1, args.max_frames+1):
+        frames = torch.rand(num_frames, 3, args.frame_size, args.frame_size)
+        for history_length in range(1, args.max_history_length+1):
+            expected = attach_frame_history_with_roll(frames, history_length)
+            results = {'attach_frame_history': attach_frame_history(frames, history_length)}
+            for chunk_size in args.chunk_sizes:
+                parts = attach_frame_history_in_chunks(frames.split(chunk_size), history_length)
+                results[f'attach_frame_history_in_chunks (chunk size {chunk_size})'] = torch.cat(list(parts), dim=0)
+            for name, result in results.items():
+                num_checks += 1
+                if not torch.equal(result, expected):
+                    mismatches.append(f'{name}: {num_frames} frames, history length {history_length}')
+
+    for mismatch in mismatches:
+        print('mismatch - {:}'.format(mismatch))
+    print('{:} of {:} checks give the same clips as the roll-and-stack implementation'.format(num_checks - len(mismatches), num_checks))
+    sys.exit(1 if mismatches else 0)
+
+def attach_frame_history_with_roll(frames, history_length):
+    """
+    Function to attach frame history as data.utils.attach_frame_history() did before it used strided views, by stacking rolled copies of the padded frames.
+    :param frames: (torch.Tensor) Frames.
+    :param history_length: (int) Number of frames of history to append to each frame.
+    :return: (torch.Tensor) Frames with attached frame history.
+    """
+    # pad with first frame so that frames 0 to history_length-1 can be evaluated
+    frame_0 = frames.narrow(0, 0, 1)
+    frames = torch.cat((frame_0.repeat(history_length-1, 1, 1, 1), frames), dim=0)
+
+    # for each frame, attach its immediate history of history_length frames
+    frames = [ frames ]
+    for l in range(1, history_length):
+        frames.append( frames[0].roll(shifts=-l, dims=0) )
+    frames_with_history = torch.stack(frames, dim=1) # of size num_clips x history_length
+
+    if history_length > 1:
+        return frames_with_history[:-(history_length-1)] # frames have wrapped around, remove last (history_length - 1) frames
+    else:
+        return frames_with_history
+
+if __name__ == "__main__":
+    main()
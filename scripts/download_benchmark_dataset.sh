@@ -28,6 +28,13 @@ echo "downloading test.zip..."
 wget -O $ORBIT_BENCHMARK_ROOT/test.zip $FIGSHARE_TEST_URL
 echo "ZIPs for train, validation and test collectors downloaded to "$ORBIT_BENCHMARK_ROOT"!"
 
+if [ "$3" = "--no_unzip" ]
+then
+    # keep .zips, frames can be read from them directly with --frame_store zip
+    echo "ZIPs kept without unzipping; use --frame_store zip to load frames from them."
+    exit 0
+fi
+
 # unzip .zips
 echo "unzipping train.zip..."
 unzip -q $ORBIT_BENCHMARK_ROOT/train.zip -d $ORBIT_BENCHMARK_ROOT
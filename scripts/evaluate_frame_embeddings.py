@@ -0,0 +1,122 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import sys
+import time
+import torch
+import random
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repo root
+from data.queues import UserEpisodicDatasetQueue
+from data.frame_embeddings import FrameEmbeddingStore
+from model.classifier_heads import PrototypicalClassifier, MahalanobisClassifier
+from utils.args import parse_args
+from utils.logging import print_and_log, get_log_files, stats_to_str
+from utils.eval_metrics import TestEvaluator
+
+def main():
+    """
+    Evaluates a classifier head on a frozen feature extractor over the same validation/test tasks as single-step-learner.py, but in feature
+    space: frames are looked up in a store of per-frame embeddings saved by scripts/extract_frame_embeddings.py rather than loaded and passed
+    through the feature extractor. Tasks are sampled up front with the same sampling options and task plan (see --task_plan_dir and --task_plan_seed),
+    so results match single-step-learner.py run with the same options, up to the precision the embeddings are stored with.
+    """
+    args = parse_args('frame-embedding-evaluator')
+    checkpoint_dir, logfile, _, _ = get_log_files(args.checkpoint_dir, None)
+    print_and_log(logfile, "Options: %s\n" % args)
+    print_and_log(logfile, "Checkpoint Directory: %s\n" % checkpoint_dir)
+
+    random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    device = torch.device(f"cuda:{args.gpu}" if torch.cuda.is_available() and args.gpu >= 0 else 'cpu')
+
+    queue = UserEpisodicDatasetQueue(os.path.join(args.data_path, args.test_set), args.test_way_method, args.test_object_cap, [args.test_context_shot_method, args.test_target_shot_method],
+                                     [args.context_shot, args.target_shot], [args.context_video_type, args.target_video_type], args.subsample_factor, [args.test_context_clip_method, args.test_target_clip_method],
+                                     args.clip_length, args.frame_size, args.frame_norm_method, [], [args.test_filter_context, args.test_filter_target], args.num_test_tasks, True, False, False, False,
+                                     logfile=logfile, frame_store=args.frame_store, with_manifest=args.with_manifest, num_index_threads=args.num_index_threads,
+                                     task_plan_dir=args.task_plan_dir, task_plan_seed=args.task_plan_seed, task_plan_shard=args.task_plan_shard)
+    dataset = queue.dataset
+    if dataset.task_plan is None: # same tasks as a run with --task_plan_dir and the same --task_plan_seed, without saving them
+        dataset.set_task_plan(dataset.compile_task_plan(dataset.num_users, args.num_test_tasks, args.task_plan_seed))
+    task_plan = dataset.task_plan
+
+    t1 = time.time()
+    store = FrameEmbeddingStore.load(args.frame_embeddings)
+    frame_rows = store.get_rows(dataset.get_frame_names(np.arange(len(dataset.frame_name_offsets) - 1))) # row of each of the dataset's frame IDs in the store
+    print_and_log(logfile, f"Loaded {len(store)} frame embeddings ({store.feat_dim}-d) from {args.frame_embeddings}.npy in {time.time() - t1:.2f}s")
+
+    if args.classifier == 'proto':
+        classifier = PrototypicalClassifier(args.logit_scale)
+    elif args.classifier == 'proto_cosine':
+        classifier = PrototypicalClassifier(args.logit_scale, distance_fn='cosine')
+    elif args.classifier == 'mahalanobis':
+        classifier = MahalanobisClassifier(args.logit_scale)
+    classifier.to(device)
+
+    evaluator = TestEvaluator(['frame_acc'], checkpoint_dir)
+    num_context_clips_per_task, num_target_clips_per_task = [], []
+    t1 = time.time()
+    with torch.no_grad():
+        for step in range(len(task_plan)):
+            item, _, selected_objects, context_frame_ids, target_frame_ids = task_plan.get_task(step)
+            _, task_id = dataset.get_item(item)
+            label_map = dataset.get_label_map(selected_objects)
+            evaluator.set_task_object_list([dataset.obj2name[obj] for obj in selected_objects])
+
+            # personalise with each context clip's embeddings, mean pooled over its frames
+            context_labels = torch.from_numpy(np.repeat([label_map[obj] for obj in selected_objects], [len(clips) for clips in context_frame_ids])).to(device)
+            context_frame_ids = np.concatenate(context_frame_ids)
+            evaluator.set_task_context_frame_ids(context_frame_ids)
+            context_features = store.get(frame_rows[context_frame_ids]).to(device).mean(dim=1)
+            classifier.configure(context_features, context_labels)
+
+            # group target clips by video, and predict each frame with its clip, i.e. the clip_length frames ending at it (see FewShotRecogniser.predict_video_chunk)
+            target_labels = np.repeat([label_map[obj] for obj in selected_objects], [len(clips) for clips in target_frame_ids])
+            target_frame_ids = np.concatenate(target_frame_ids)
+            target_video_ids, _ = dataset.locate_frames(target_frame_ids[:, 0])
+            order = np.argsort(target_video_ids, kind='stable')
+            target_frame_ids, target_labels = target_frame_ids[order], target_labels[order]
+            _, video_starts, video_num_clips = np.unique(target_video_ids[order], return_index=True, return_counts=True)
+            video_frame_ids = [target_frame_ids[start:end].reshape(-1) for start, end in zip(video_starts.tolist(), (video_starts + video_num_clips).tolist())]
+            target_features = store.get(frame_rows[np.concatenate(video_frame_ids)]).to(device)
+            target_features = torch.cat([pool_features_in_windows(features, args.clip_length) for features in target_features.split([len(frame_ids) for frame_ids in video_frame_ids])])
+            target_logits = classifier.predict(target_features)
+            for frame_ids, video_logits, start in zip(video_frame_ids, target_logits.split([len(frame_ids) for frame_ids in video_frame_ids]), video_starts.tolist()):
+                evaluator.append_video(video_logits, torch.tensor(target_labels[start]), frame_ids)
+
+            classifier.reset()
+            num_context_clips_per_task.append(len(context_frame_ids))
+            num_target_clips_per_task.append(len(target_features))
+
+            # if this is the user's last task, get the average performance for the user over all their tasks
+            if (step+1) % args.num_test_tasks == 0:
+                evaluator.set_current_user(task_id)
+                _,_,_,current_video_stats = evaluator.get_mean_stats(current_user=True)
+                print_and_log(logfile, f'{args.test_set} user {task_id} ({evaluator.current_user+1}/{task_plan.num_items}) stats: {stats_to_str(current_video_stats)} avg # context clips/task: {np.mean(num_context_clips_per_task):.0f} avg # target clips/task: {np.mean(num_target_clips_per_task):.0f}')
+                if (step+1) < len(task_plan):
+                    num_context_clips_per_task, num_target_clips_per_task = [], [] # reset per user
+                    evaluator.next_user()
+            else:
+                evaluator.next_task()
+
+    stats_per_user, stats_per_obj, stats_per_task, stats_per_video = evaluator.get_mean_stats()
+    print_and_log(logfile, f'{args.test_set} [{args.frame_embeddings}] in {time.time() - t1:.2f}s\n per-user stats: {stats_to_str(stats_per_user)}\n per-object stats: {stats_to_str(stats_per_obj)}\n per-task stats: {stats_to_str(stats_per_task)}\n per-video stats: {stats_to_str(stats_per_video)}\n')
+    evaluator.save(dataset.get_frame_paths)
+
+def pool_features_in_windows(features, clip_length):
+    """
+    Function that pools a video's frame features over sliding windows of clip_length frames ending at each frame, repeating the video's first
+    frame as history (as FewShotRecogniser._get_video_chunk_features() does for a video's first chunk).
+    :param features: (torch.Tensor) Features of a video's frames i.e. as (num_frames) x (feat_dim).
+    :param clip_length: (int) Number of frames per window.
+    :return: (torch.Tensor) Frame features pooled per window i.e. as (num_frames) x (feat_dim).
+    """
+    features = torch.cat((features.narrow(0, 0, 1).expand(clip_length-1, -1), features), dim=0)
+    summed_features = torch.cumsum(features, dim=0, dtype=torch.float64)
+    summed_features = torch.cat((summed_features.new_zeros(1, features.size(1)), summed_features), dim=0)
+    return (summed_features[clip_length:] - summed_features[:-clip_length]).div(clip_length).to(features.dtype)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import sys
+import time
+import torch
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repo root
+from data.datasets import UserEpisodicORBITDataset
+from data.frame_embeddings import FrameEmbeddingStore
+from model.feature_extractors import create_feature_extractor
+from utils.args import get_frame_norm_method
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_path", required=True, type=str, help="Path to ORBIT benchmark dataset root saved by modes (e.g. orbit_benchmark_224)")
+    parser.add_argument("--mode", type=str, default='test', choices=['train', 'validation', 'test'], help="Mode to embed all (clean and clutter) frames of.")
+    parser.add_argument("--feature_extractor", type=str, default="efficientnet_b0", choices=["efficientnet_b0", "efficientnet_v2_s", "vit_s_32", "vit_b_32", "vit_b_32_clip"], help="Feature extractor backbone.")
+    parser.add_argument("--model_path", type=str, default=None, help="Path to a model saved by single-step-learner.py to take the feature extractor's weights from. If None, the pretrained weights are used.")
+    parser.add_argument("--frame_size", type=int, default=224, help="Frame size.")
+    parser.add_argument("--frame_store", type=str, default='directory', choices=["directory", "shards", "packs", "zip"], help="Backend to load frames from.")
+    parser.add_argument("--num_decode_threads", type=int, default=8, help="Number of threads to decode frames with.")
+    parser.add_argument("--batch_size", type=int, default=256, help="Number of frames to pass through the feature extractor at a time.")
+    parser.add_argument("--dtype", type=str, default='float16', choices=['float16', 'float32'], help="Data type to store embeddings as.")
+    parser.add_argument("--save_path", type=str, default=None, help="Path to save embeddings to (default: <data_path>/embeddings).")
+    parser.add_argument("--gpu", type=int, default=0, help="gpu id to use (cpu: <0)")
+    args = parser.parse_args()
+    save_path = args.save_path if args.save_path else os.path.join(args.data_path, 'embeddings')
+    device = torch.device(f"cuda:{args.gpu}" if torch.cuda.is_available() and args.gpu >= 0 else 'cpu')
+
+    # load every clean and clutter video of the mode, without filtering frames by annotations
+    dataset = UserEpisodicORBITDataset(os.path.join(args.data_path, args.mode), 'max', 15, ['max', 'max'], [5, 2], ['clean', 'clutter'], 30, ['max', 'max'],
+                                       1, args.frame_size, get_frame_norm_method(args.feature_extractor), [], ([], []), True, False, False, None,
+                                       frame_store=args.frame_store, num_decode_threads=args.num_decode_threads)
+    feature_extractor, _ = create_feature_extractor(args.feature_extractor, pretrained=True, with_film=False, learn_extractor=False)
+    if args.model_path:
+        model_state_dict = torch.load(args.model_path, map_location='cpu')
+        feature_extractor.load_state_dict({ name[len('feature_extractor.'):]: tensor for name, tensor in model_state_dict.items() if name.startswith('feature_extractor.') })
+    feature_extractor.to(device)
+    feature_extractor.eval()
+
+    def get_embeddings(frame_ids):
+        with torch.no_grad():
+            frames = dataset.transform_frames(dataset.load_frames(frame_ids.astype(np.int32)))
+            return feature_extractor(frames.to(device))
+
+    num_frames = len(dataset.frame_name_offsets) - 1
+    path = os.path.join(save_path, f"{args.mode}_{args.feature_extractor}_{args.frame_size}")
+    start_time = time.time()
+    store = FrameEmbeddingStore.create(path, dataset.get_frame_names(np.arange(num_frames)), feature_extractor.output_size, get_embeddings, dtype=np.dtype(args.dtype), chunk_size=args.batch_size)
+    print('embedded {:} {:} frames ({:} x {:}, {:}) to {:}.npy in {:.2f} seconds'.format(len(store), args.mode, len(store), store.feat_dim, args.dtype, path, time.time() - start_time))
+
+if __name__ == "__main__":
+    main()
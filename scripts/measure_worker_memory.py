@@ -0,0 +1,70 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import sys
+import time
+import pickle
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # repo root
+from data.queues import UserEpisodicDatasetQueue
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_path", required=True, type=str, help="Path to ORBIT benchmark dataset root saved by modes (e.g. orbit_benchmark_224)")
+    parser.add_argument("--mode", type=str, default='train', choices=['train', 'validation', 'test'], help="Mode to load train tasks from.")
+    parser.add_argument("--frame_store", type=str, default='directory', choices=["directory", "shards", "packs", "zip"], help="Backend to load frames from.")
+    parser.add_argument("--frame_size", type=int, default=224, help="Frame size.")
+    parser.add_argument("--num_workers", type=int, default=8, help="Number of data loader workers.")
+    parser.add_argument("--num_tasks", type=int, default=1, help="Number of tasks per user to load before measuring.")
+    args = parser.parse_args()
+
+    # train task defaults from utils/args.py
+    queue = UserEpisodicDatasetQueue(os.path.join(args.data_path, args.mode), 'random', 15, ['random', 'random'], [5, 2], ['clean', 'clutter'], 30, ['uniform', 'random'],
+                                     1, args.frame_size, 'imagenet', [], ([], []), args.num_tasks, False, False, False, True,
+                                     num_workers=args.num_workers, frame_store=args.frame_store, with_persistent_workers=True)
+    dataset = queue.dataset
+    index_nbytes = sum(a.nbytes for a in [dataset.video_paths, dataset.video_frame_ranges, dataset.frame_name_buffer, dataset.frame_name_offsets])
+    print('dataset index: {:.1f} MB in numpy arrays, {:.1f} MB pickled dataset'.format(index_nbytes / 2**20, len(pickle.dumps(dataset)) / 2**20))
+    print('main process: {:}'.format(format_memory(get_process_memory(os.getpid()))))
+
+    start_time = time.time()
+    num_tasks = sum(1 for _ in queue.get_tasks()) # persistent workers stay alive after the last task
+    print('loaded {:} tasks in {:.2f} seconds'.format(num_tasks, time.time() - start_time))
+
+    worker_memory = [get_process_memory(pid) for pid in get_child_pids(os.getpid())]
+    for i, memory in enumerate(worker_memory):
+        print('worker {:}: {:}'.format(i, format_memory(memory)))
+    if worker_memory:
+        print('mean per worker: {:}'.format(format_memory({ k: np.mean([m[k] for m in worker_memory]) for k in worker_memory[0] })))
+
+def get_child_pids(pid):
+    child_pids = []
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{tid}/children") as children_file:
+            child_pids.extend(int(child_pid) for child_pid in children_file.read().split())
+    return sorted(child_pids)
+
+def get_process_memory(pid):
+    """
+    Function to read a process's memory usage (in kB) from /proc: resident (Rss), proportional to sharing (Pss), and private i.e. not shared with any other process (Uss).
+    """
+    memory = {'rss': 0, 'pss': 0, 'uss': 0}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps_file:
+        for line in smaps_file:
+            field, value = line.split(':', 1)
+            if field == 'Rss':
+                memory['rss'] += int(value.split()[0])
+            elif field == 'Pss':
+                memory['pss'] += int(value.split()[0])
+            elif field in ['Private_Clean', 'Private_Dirty']:
+                memory['uss'] += int(value.split()[0])
+    return memory
+
+def format_memory(memory):
+    return ', '.join('{:} {:.1f} MB'.format(k, v / 1024.0) for k, v in memory.items())
+
+if __name__ == "__main__":
+    main()
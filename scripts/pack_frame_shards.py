@@ -0,0 +1,67 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import glob
+import json
+import time
+import argparse
+import numpy as np
+from PIL import Image
+from multiprocessing.pool import ThreadPool as Pool
+
+INDEX_VERSION = 1
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_path", required=True, type=str, help="Path to ORBIT benchmark dataset root saved by modes")
+    parser.add_argument("--modes", nargs='+', type=str, default=['train', 'validation', 'test'], help="Modes to pack.")
+    parser.add_argument("--size", type=int, default=224, help="Frame size. Frames of a different size are resized.")
+    parser.add_argument("--nthreads", type=int, default=12, help="Number of threads.")
+    args = parser.parse_args()
+    save_path = os.path.join(args.data_path, 'shards') # where --frame_store shards reads them from
+
+    start_time = time.time()
+    for mode in args.modes:
+        mode_save_path = os.path.join(save_path, mode)
+        os.makedirs(mode_save_path, exist_ok=True)
+        video_dirs = sorted(glob.glob(os.path.join(args.data_path, mode, "*/*/*/*")))
+
+        pool = Pool(args.nthreads)
+        results = [pool.apply_async(pack_video_frames, (i, video_dirs, mode_save_path, args.size, )) for i in range(len(video_dirs))]
+        pool.close()
+        pool.join()
+
+        index = {'version': INDEX_VERSION, 'frame_size': args.size, 'videos': {}}
+        for video_dir, result in zip(video_dirs, results):
+            video = '/'.join(video_dir.split(os.sep)[-4:]) # user/object/video type/video name
+            index['videos'][video] = result.get()
+        with open(os.path.join(mode_save_path, 'index.json'), 'w') as index_file:
+            json.dump(index, index_file)
+        print('{:} shards saved to {:}'.format(mode, mode_save_path))
+
+    run_time = (time.time() - start_time) / 60.0
+    print('run time: {:.2f} minutes'.format(run_time))
+
+def pack_video_frames(i, video_dirs, save_path, size):
+
+    video_dir = video_dirs[i]
+    print("packing video {:} of {:} - {:}".format(i+1, len(video_dirs), video_dir))
+    frame_paths = sorted(glob.glob(os.path.join(video_dir, "*.jpg")))
+    shard_path = os.path.join(save_path, os.path.basename(video_dir) + '.npy')
+    shard = np.lib.format.open_memmap(shard_path + '.tmp', mode='w+', dtype=np.uint8, shape=(len(frame_paths), 3, size, size))
+    for row, f in enumerate(frame_paths):
+        pil_image = Image.open(f)
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+        if pil_image.size != (size, size):
+            pil_image = pil_image.resize((size, size), resample=Image.LANCZOS)
+        shard[row] = np.asarray(pil_image).transpose(2, 0, 1)
+    shard.flush()
+    del shard
+    os.replace(shard_path + '.tmp', shard_path)
+
+    return [os.path.basename(f) for f in frame_paths]
+
+if __name__ == "__main__":
+    main()
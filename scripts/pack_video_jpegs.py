@@ -0,0 +1,76 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+import os
+import glob
+import json
+import time
+import argparse
+from PIL import Image
+from multiprocessing.pool import ThreadPool as Pool
+
+INDEX_VERSION = 1
+PACK_MAGIC = b'ORBITPCK'
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_path", required=True, type=str, help="Path to ORBIT benchmark dataset root saved by modes (e.g. orbit_benchmark_224)")
+    parser.add_argument("--modes", nargs='+', type=str, default=['train', 'validation', 'test'], help="Modes to pack.")
+    parser.add_argument("--nthreads", type=int, default=12, help="Number of threads.")
+    args = parser.parse_args()
+    save_path = os.path.join(args.data_path, 'packs') # where --frame_store packs reads them from
+
+    start_time = time.time()
+    for mode in args.modes:
+        mode_save_path = os.path.join(save_path, mode)
+        os.makedirs(mode_save_path, exist_ok=True)
+        video_dirs = sorted(glob.glob(os.path.join(args.data_path, mode, "*/*/*/*")))
+
+        pool = Pool(args.nthreads)
+        results = [pool.apply_async(pack_video, (i, video_dirs, mode_save_path, )) for i in range(len(video_dirs))]
+        pool.close()
+        pool.join()
+
+        index = {'version': INDEX_VERSION, 'frame_size': None, 'videos': {}}
+        for video_dir, result in zip(video_dirs, results):
+            frame_names, frame_size = result.get()
+            if index['frame_size'] is None:
+                index['frame_size'] = frame_size
+            assert frame_size in [None, index['frame_size']], f"{video_dir} has {frame_size}px frames, expected {index['frame_size']}px"
+            video = '/'.join(video_dir.split(os.sep)[-4:]) # user/object/video type/video name
+            index['videos'][video] = frame_names
+        with open(os.path.join(mode_save_path, 'index.json'), 'w') as index_file:
+            json.dump(index, index_file)
+        print('{:} packs saved to {:}'.format(mode, mode_save_path))
+
+    run_time = (time.time() - start_time) / 60.0
+    print('run time: {:.2f} minutes'.format(run_time))
+
+def pack_video(i, video_dirs, save_path):
+
+    video_dir = video_dirs[i]
+    print("packing video {:} of {:} - {:}".format(i+1, len(video_dirs), video_dir))
+    frame_paths = sorted(glob.glob(os.path.join(video_dir, "*.jpg")))
+    frame_size = Image.open(frame_paths[0]).size[0] if frame_paths else None
+
+    frame_bytes, header, offset = [], [], 0
+    for f in frame_paths:
+        with open(f, 'rb') as frame_file:
+            frame_bytes.append(frame_file.read())
+        header.append([os.path.basename(f), offset, len(frame_bytes[-1])])
+        offset += len(frame_bytes[-1])
+    header = json.dumps(header).encode()
+
+    pack_path = os.path.join(save_path, os.path.basename(video_dir) + '.pack')
+    with open(pack_path + '.tmp', 'wb') as pack_file:
+        pack_file.write(PACK_MAGIC)
+        pack_file.write(len(header).to_bytes(4, 'little'))
+        pack_file.write(header)
+        for b in frame_bytes:
+            pack_file.write(b)
+    os.replace(pack_path + '.tmp', pack_path)
+
+    return [os.path.basename(f) for f in frame_paths], frame_size
+
+if __name__ == "__main__":
+    main()
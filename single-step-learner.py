@@ -36,8 +36,9 @@ import numpy as np
 import torch.backends.cudnn as cudnn
 
 from data.dataloaders import DataLoader
-from data.utils import get_batch_indices, unpack_task, attach_frame_history
+from data.utils import get_batch_indices, unpack_task
 from model.few_shot_recognisers import SingleStepFewShotRecogniser
+from model.feature_cache import FeatureCache
 from utils.args import parse_args
 from utils.ops_counter import OpsCounter
 from utils.optim import cross_entropy, init_optimizer, init_scheduler, get_curr_learning_rates
@@ -75,6 +76,7 @@ class Learner:
         self.ops_counter = OpsCounter()
         self.init_dataset() 
         self.init_model()
+        self.feature_cache = FeatureCache(self.args.feature_cache_mb * 1024**2, self.args.feature_cache_dir) if self.args.feature_cache_mb > 0 else None
         self.init_evaluators()
         self.loss = cross_entropy
         self.train_task_fn = self.train_task_with_lite if self.args.with_lite else self.train_task
@@ -112,6 +114,22 @@ class Learner:
             'annotations_to_load': self.args.annotations_to_load,
             'train_filter_by_annotations': [self.args.train_filter_context, self.args.train_filter_target],
             'test_filter_by_annotations': [self.args.test_filter_context, self.args.test_filter_target],
+            'frame_store': self.args.frame_store,
+            'with_manifest': self.args.with_manifest,
+            'num_index_threads': self.args.num_index_threads,
+            'with_uint8_frames': self.args.with_uint8_frames,
+            'frame_cache': self.args.frame_cache,
+            'num_decode_threads': self.args.num_decode_threads,
+            'with_lazy_targets': self.args.with_lazy_targets,
+            'shared_frame_cache_mb': self.args.shared_frame_cache_mb,
+            'with_user_frame_cache': self.args.with_user_frame_cache,
+            'with_persistent_workers': self.args.with_persistent_workers,
+            'prefetch_factor': self.args.prefetch_factor,
+            'task_buffer_mb': self.args.task_buffer_mb,
+            'task_plan_dir': self.args.task_plan_dir,
+            'task_plan_seed': self.args.task_plan_seed,
+            'task_plan_shard': self.args.task_plan_shard,
+            'with_task_frame_cache': self.args.with_task_frame_cache,
             'logfile': self.logfile
         }
         
@@ -119,12 +137,14 @@ class Learner:
         self.train_queue = dataloader.get_train_queue()
         self.validation_queue = dataloader.get_validation_queue()
         self.test_queue = dataloader.get_test_queue()
+        self.normalize_stats = (self.train_queue or self.test_queue).get_normalize_stats()
         
     def init_model(self):
         self.model = SingleStepFewShotRecogniser(
             self.args.feature_extractor, self.args.adapt_features, self.args.classifier, self.args.clip_length,
             self.args.batch_size, self.args.learn_extractor, self.args.num_lite_samples, self.args.logit_scale)
         self.model._set_device(self.device)
+        self.model._set_normalize_stats(self.normalize_stats)
         self.model._send_to_device()
         
     def init_evaluators(self) -> None:
@@ -155,6 +175,7 @@ class Learner:
                     t1 = time.time()
                     task_loss = self.train_task_fn(task_dict)
                     task_time = time.time() - t1
+                    self.train_queue.release_task(task_dict)
                     losses.append(task_loss.detach())
                     
                     if self.args.print_by_step:
@@ -174,6 +195,12 @@ class Learner:
                 # print
                 print_and_log(self.logfile, '-'*150)
                 print_and_log(self.logfile, f'epoch [{epoch+1}/{self.args.epochs}] train loss: {mean_epoch_loss:.7f} {stats_to_str(mean_stats)} lr: {lr:.3e} fe-lr: {fe_lr:.3e} time/epoch: {int(seconds/60):d}m{int(seconds%60):02d}s')
+                frame_cache_stats = self.train_queue.get_shared_frame_cache_stats()
+                if frame_cache_stats:
+                    print_and_log(self.logfile, f"shared frame cache: {frame_cache_stats['hits']} hits, {frame_cache_stats['misses']} misses (hit rate: {frame_cache_stats['hit_rate']:.2%}), {frame_cache_stats['cached_frames']}/{frame_cache_stats['slots']} frames cached")
+                task_buffer_stats = self.train_queue.get_task_buffer_stats()
+                if task_buffer_stats:
+                    print_and_log(self.logfile, f"task buffers: {task_buffer_stats['buffered']} tasks in shared buffers, {task_buffer_stats['allocated']} allocated ({task_buffer_stats['buffered_rate']:.2%} buffered), {task_buffer_stats['in_use']}/{task_buffer_stats['buffers']} buffers in use")
                 print_and_log(self.logfile, '-'*150)
                 self.train_evaluator.reset()
                 self.save_checkpoint(epoch+1)
@@ -196,7 +223,7 @@ class Learner:
         self.logfile.close()
 
     def train_task(self, task_dict):
-        context_clips, context_paths, context_labels, target_clips, target_paths, target_labels, object_list = unpack_task(task_dict, self.device, target_to_device=True)
+        context_clips, context_frame_ids, context_labels, target_clips, target_frame_ids, target_labels, object_list = unpack_task(task_dict, self.device, target_to_device=True)
 
         self.model.personalise(context_clips, context_labels)
         target_logits = self.model.predict(target_clips)
@@ -212,7 +239,7 @@ class Learner:
         return task_loss
 
     def train_task_with_lite(self, task_dict):
-        context_clips, context_paths, context_labels, target_clips, target_paths, target_labels, object_list = unpack_task(task_dict, self.device)
+        context_clips, context_frame_ids, context_labels, target_clips, target_frame_ids, target_labels, object_list = unpack_task(task_dict, self.device)
 
         self.model._clear_caches()
 
@@ -252,24 +279,28 @@ class Learner:
             # loop through validation tasks (num_validation_users * num_val_tasks)
             num_val_tasks = len(self.validation_queue) * self.args.num_val_tasks
             for step, task_dict in enumerate(self.validation_queue.get_tasks()):
-                context_clips, context_paths, context_labels, target_frames_by_video, target_paths_by_video, target_labels_by_video, object_list = unpack_task(task_dict, self.device)
+                context_clips, context_frame_ids, context_labels, target_frames_by_video, target_frame_ids_by_video, target_labels_by_video, object_list = unpack_task(task_dict, self.device)
                 num_context_clips = len(context_clips)
                 self.validation_evaluator.set_task_object_list(object_list)
-                self.validation_evaluator.set_task_context_paths(context_paths)
+                self.validation_evaluator.set_task_context_frame_ids(context_frame_ids)
 
                 self.model.personalise(context_clips, context_labels)
 
                 # loop through cached target videos for the current task
                 num_target_clips = 0
-                video_iterator = zip(target_frames_by_video, target_paths_by_video, target_labels_by_video)
-                for video_frames, video_paths, video_label in video_iterator:
-                    video_clips = attach_frame_history(video_frames, self.args.clip_length)
-                    video_logits = self.model.predict(video_clips)
-                    self.validation_evaluator.append_video(video_logits, video_label, video_paths)
-                    num_target_clips += len(video_clips)
+                video_iterator = self.validation_queue.stream_target_videos(target_frames_by_video, target_frame_ids_by_video, target_labels_by_video, self.args.target_chunk_size)
+                for video_frame_chunks, video_frame_ids, video_label in video_iterator:
+                    video_logits, history_features = [], None
+                    for video_frames in video_frame_chunks: # each frame is predicted with its clip, i.e. the clip_length frames ending at it
+                        chunk_logits, history_features = self.model.predict_video_chunk(video_frames, history_features)
+                        video_logits.append(chunk_logits)
+                        num_target_clips += len(chunk_logits)
+                    video_logits = torch.cat(video_logits)
+                    self.validation_evaluator.append_video(video_logits, video_label, video_frame_ids)
 
                 # reset task's params
                 self.model._reset() 
+                self.validation_queue.release_task(task_dict)
                 # log number of clips per task
                 num_context_clips_per_task.append(num_context_clips)
                 num_target_clips_per_task.append(num_target_clips)
@@ -306,6 +337,12 @@ class Learner:
             print_and_log(self.logfile, 'warning: saved model path could not be found; using pretrained initialisation.')
             path = self.checkpoint_dir
         self.model.set_test_mode(True)
+        if self.args.with_personalisation_cache:
+            self.model.set_personalisation_cache(1) # a user's tasks are loaded one after the other, and often share their context set
+        # if --with_user_feature_cache, compute each of a user's frames' features once and reuse them across all the user's tasks
+        feature_cache = FeatureCache(None) if self.args.with_user_feature_cache else self.feature_cache
+        if feature_cache is not None:
+            self.model.set_feature_cache(feature_cache, self.model.get_feature_cache_namespace(f"{self.args.test_set}/{self.args.frame_size}/{self.args.frame_norm_method}"))
         self.ops_counter.set_base_params(self.model)
         num_context_clips_per_task, num_target_clips_per_task = [], []
 
@@ -313,29 +350,34 @@ class Learner:
             # loop through test tasks (num_test_users * num_test_tasks_per_user)
             num_test_tasks = len(self.test_queue) * self.args.num_test_tasks
             for step, task_dict in enumerate(self.test_queue.get_tasks()):
-                context_clips, context_paths, context_labels, target_frames_by_video, target_paths_by_video, target_labels_by_video, object_list = unpack_task(task_dict, self.device)
+                context_clips, context_frame_ids, context_labels, target_frames_by_video, target_frame_ids_by_video, target_labels_by_video, object_list = unpack_task(task_dict, self.device)
                 num_context_clips = len(context_clips)
                 self.test_evaluator.set_task_object_list(object_list)
-                self.test_evaluator.set_task_context_paths(context_paths)
+                self.test_evaluator.set_task_context_frame_ids(context_frame_ids)
 
                 t1 = time.time()
-                self.model.personalise(context_clips, context_labels, ops_counter=self.ops_counter)
+                self.model.personalise(context_clips, context_labels, ops_counter=self.ops_counter, context_frame_ids=context_frame_ids)
                 self.ops_counter.log_time(time.time() - t1, 'personalise')
 
                 # loop through target videos for the current task
                 num_target_clips = 0
-                video_iterator = zip(target_frames_by_video, target_paths_by_video, target_labels_by_video)
-                for video_frames, video_paths, video_label in video_iterator:
-                    video_clips = attach_frame_history(video_frames, self.args.clip_length)
-                    num_clips = len(video_clips)
-                    t1 = time.time()
-                    video_logits = self.model.predict(video_clips)
-                    self.ops_counter.log_time((time.time() - t1)/float(num_clips), 'inference')
-                    self.test_evaluator.append_video(video_logits, video_label, video_paths)
+                video_iterator = self.test_queue.stream_target_videos(target_frames_by_video, target_frame_ids_by_video, target_labels_by_video, self.args.target_chunk_size)
+                for video_frame_chunks, video_frame_ids, video_label in video_iterator:
+                    video_logits, history_features, num_clips, inference_time = [], None, 0, 0.0
+                    for video_frames in video_frame_chunks: # each frame is predicted with its clip, i.e. the clip_length frames ending at it
+                        t1 = time.time()
+                        chunk_logits, history_features = self.model.predict_video_chunk(video_frames, history_features, frame_ids=video_frame_ids[num_clips:num_clips+len(video_frames)])
+                        video_logits.append(chunk_logits)
+                        inference_time += time.time() - t1
+                        num_clips += len(chunk_logits)
+                    video_logits = torch.cat(video_logits)
+                    self.ops_counter.log_time(inference_time/float(num_clips), 'inference')
+                    self.test_evaluator.append_video(video_logits, video_label, video_frame_ids)
                     num_target_clips += num_clips
 
                 # reset task's params
                 self.model._reset()
+                self.test_queue.release_task(task_dict)
                 # add task's ops to self.ops_counter
                 self.ops_counter.task_complete()
                 # log number of clips per task
@@ -347,6 +389,8 @@ class Learner:
                     self.test_evaluator.set_current_user(task_dict["task_id"])
                     _,_,_,current_video_stats = self.test_evaluator.get_mean_stats(current_user=True)
                     print_and_log(self.logfile, f'{self.args.test_set} user {task_dict["task_id"]} ({self.test_evaluator.current_user+1}/{len(self.test_queue)}) stats: {stats_to_str(current_video_stats)} avg # context clips/task: {np.mean(num_context_clips_per_task):.0f} avg # target clips/task: {np.mean(num_target_clips_per_task):.0f}')
+                    if self.args.with_user_feature_cache:
+                        feature_cache.clear()
                     if (step+1) < num_test_tasks:
                         num_context_clips_per_task, num_target_clips_per_task = [], [] # reset per user
                         self.test_evaluator.next_user()
@@ -357,9 +401,13 @@ class Learner:
             stats_per_user_str, stats_per_obj_str, stats_per_task_str, stats_per_video_str = stats_to_str(stats_per_user), stats_to_str(stats_per_obj), stats_to_str(stats_per_task), stats_to_str(stats_per_video)
             mean_ops_stats = self.ops_counter.get_mean_stats()
             print_and_log(self.logfile, f'{self.args.test_set} [{path}]\n per-user stats: {stats_per_user_str}\n per-object stats: {stats_per_obj_str}\n per-task stats: {stats_per_task_str}\n per-video stats: {stats_per_video_str}\n model stats: {mean_ops_stats}\n')
+            if feature_cache is not None:
+                feature_cache_stats = feature_cache.get_stats()
+                print_and_log(self.logfile, f"{'per-user ' if self.args.with_user_feature_cache else ''}feature cache: {feature_cache_stats['hits']} hits, {feature_cache_stats['spill_hits']} spill hits, {feature_cache_stats['misses']} misses (hit rate: {feature_cache_stats['hit_rate']:.2%}), {feature_cache_stats['cached_frames']} frames cached, {feature_cache_stats['spilled_frames']} spilled")
             if save_evaluator:
-                self.test_evaluator.save()
+                self.test_evaluator.save(self.test_queue.get_frame_paths)
             self.test_evaluator.reset()
+            self.model.set_personalisation_cache(0)
 
     def save_checkpoint(self, epoch):
         torch.save({
@@ -34,6 +34,14 @@ def parse_args(learner='default'):
                         help="Classifier head to use (default: proto).")
     parser.add_argument("--logit_scale", type=float, default=1.0,
                         help="Scale factor for logits (default: 1.0).")
+    parser.add_argument("--feature_cache_mb", type=int, default=0,
+                        help="Size in MB of an in-memory least-recently-used cache of feature extractor features per test frame, so that frames that recur across test tasks are only passed through the feature extractor once. Only valid if neither --learn_extractor nor --adapt_features is used. If 0, features are not cached (default: 0).")
+    parser.add_argument("--feature_cache_dir", type=str, default=None,
+                        help="Directory to spill features evicted from the --feature_cache_mb cache to, rather than dropping them. If None, evicted features are dropped (default: None).")
+    parser.add_argument("--with_personalisation_cache", action="store_true",
+                        help="If True, reuse the personalised parameters (FiLM parameters and classifier head) of the previous test task if a task's context set (frame IDs and labels) is the same, as is every task of a user with --test_context_shot_method max and --test_context_clip_method uniform. Only used by single-step-learner.py.")
+    parser.add_argument("--with_user_feature_cache", action="store_true",
+                        help="If True, pass each of a test user's frames through the feature extractor once and reuse its features across all the user's test tasks, dropping them when moving on to the next user. Only valid if neither --learn_extractor nor --adapt_features is used. As frames are batched differently, logits can differ from a run without it by float32 rounding (~1e-7).")
 
     # data parameters
     parser.add_argument("--train_way_method", type=str, default="random", choices=["random", "max"],
@@ -76,6 +84,40 @@ def parse_args(learner='default'):
                         help="Number of frames to sample per clip (default: 1).")
     parser.add_argument("--frame_size", type=int, default=224, choices=[224],
                         help="Frame size (default: 224).")
+    parser.add_argument("--frame_store", type=str, default="directory", choices=["directory", "shards", "packs", "zip"],
+                        help="Backend to load frames from: per-frame JPEGs in the dataset folders, memory-mapped uint8 shards per video created with scripts/pack_frame_shards.py, JPEG pack files per video created with scripts/pack_video_jpegs.py, or the downloaded train/validation/test ZIPs without extracting them (default: directory).")
+    parser.add_argument("--with_manifest", action="store_true",
+                        help="Load users, objects, videos and (filtered) frames from a dataset manifest saved in <data_path>/manifests, rescanning only users whose folders have changed, and cache the parsed annotation JSONs there (default: False).")
+    parser.add_argument("--num_index_threads", type=int, default=8,
+                        help="Number of threads to scan users with when loading the dataset (default: 8).")
+    parser.add_argument("--with_uint8_frames", action="store_true",
+                        help="Pass frames from the data loader workers as uint8 and normalise them on the model's device, rather than as normalised float32 (default: False).")
+    parser.add_argument("--frame_cache", type=str, default=None,
+                        help="Path to folder (ideally on local disk) to cache frames in once resized to --frame_size. Useful when --data_path holds the original 1080x1080 frames (default: None).")
+    parser.add_argument("--num_decode_threads", type=int, default=None,
+                        help="Total number of threads to decode frames with, shared equally across the data loader workers of each queue. If None, each worker decodes on a single thread (default: None).")
+    parser.add_argument("--with_lazy_targets", action="store_true",
+                        help="Load the target videos of validation/test tasks on demand, one video (or chunk of --target_chunk_size frames) at a time, rather than loading all of a user's target videos in the data loader workers (default: False).")
+    parser.add_argument("--target_chunk_size", type=int, default=None,
+                        help="Number of frames of a validation/test target video to load and predict at a time. If None, whole videos are predicted at a time (default: None).")
+    parser.add_argument("--shared_frame_cache_mb", type=int, default=0,
+                        help="Size in MB of an in-memory cache of decoded frames shared by the data loader workers of each of the train/validation/test queues and kept across epochs, with least-recently-used eviction. Allocated in shared memory (e.g. /dev/shm). If 0, frames are not cached in memory (default: 0).")
+    parser.add_argument("--with_user_frame_cache", action="store_true",
+                        help="Keep the frames loaded by each validation/test data loader worker in memory for all of a user's tasks, and drop them when the worker moves on to the next user. Speeds up evaluating with --num_val_tasks/--num_test_tasks > 1 (default: False).")
+    parser.add_argument("--with_persistent_workers", action="store_true",
+                        help="Keep each queue's data loader workers alive across epochs/validation runs rather than restarting them every time tasks are loaded (default: False).")
+    parser.add_argument("--prefetch_factor", type=int, default=2,
+                        help="Number of tasks each data loader worker loads in advance (default: 2).")
+    parser.add_argument("--task_buffer_mb", type=int, default=0,
+                        help="Size in MB of each of the shared memory buffers that the data loader workers load tasks' clips into, and that are reused once a task has been used. Each queue allocates (num_workers * prefetch_factor + 2) buffers in shared memory (e.g. /dev/shm). Tasks that do not fit are loaded into new tensors. If 0, every task is loaded into new tensors (default: 0).")
+    parser.add_argument("--task_plan_dir", type=str, default=None,
+                        help="Directory to save the validation/test tasks to, sampled up front for all users, and to load them from in later runs so that every run evaluates the same tasks. Plans are recompiled if the sampling settings change. If None, tasks are sampled on the fly (default: None).")
+    parser.add_argument("--task_plan_seed", type=int, default=0,
+                        help="Seed of the validation/test task plans in --task_plan_dir (default: 0).")
+    parser.add_argument("--task_plan_shard", nargs=2, type=int, default=[0, 1], metavar=('SHARD_ID', 'NUM_SHARDS'),
+                        help="Only evaluate the users in shard SHARD_ID of NUM_SHARDS of the validation/test task plans in --task_plan_dir, to split evaluation across processes (default: 0 1).")
+    parser.add_argument("--with_task_frame_cache", action="store_true",
+                        help="Decode the frames of the validation/test task plans in --task_plan_dir once into a packed uint8 file next to each plan, and load them from there (memory-mapped) every time the tasks are replayed, e.g. every validation epoch. Requires --task_plan_dir (default: False).")
     parser.add_argument("--annotations_to_load", nargs='+', type=str, default=[], choices=FRAME_ANNOTATION_OPTIONS+BOUNDING_BOX_OPTIONS,
                         help="Annotations to load per frame (default: None).")
     parser.add_argument("--train_filter_context", nargs='+', type=str, default=[], choices=ALL_FRAME_ANNOTATION_OPTIONS,
@@ -176,21 +218,29 @@ def parse_args(learner='default'):
                         help="Beta values for Adam optimizer during personalization (default: (0.9, 0.999).")
         finetune_group.add_argument("--personalize_momentum", type=float, default=0.0,
                         help="Momentum for SGD optimizer during personalization (default: 0.0).")
+    elif learner == 'frame-embedding-evaluator':
+        parser.set_defaults(mode='test')
+        embedding_group = parser.add_argument_group("Frame embedding parameters")
+        embedding_group.add_argument("--frame_embeddings", type=str, required=True,
+                        help="Path (without extension) of the embeddings of every --test_set frame saved by scripts/extract_frame_embeddings.py with the same --feature_extractor.")
 
     args = parser.parse_args()
     args.train_filter_context = expand_issues(args.train_filter_context)
     args.train_filter_target = expand_issues(args.train_filter_target)
     args.test_filter_context = expand_issues(args.test_filter_context)
     args.test_filter_target = expand_issues(args.test_filter_target)
-    if args.feature_extractor == 'efficientnet_b0':
-        args.frame_norm_method = 'imagenet'
-    elif args.feature_extractor in ['efficientnet_v2_s', 'vit_s_32', 'vit_b_32']:
-        args.frame_norm_method = 'imagenet_inception'
-    elif args.feature_extractor == 'vit_b_32_clip':
-        args.frame_norm_method = 'openai_clip'
+    args.frame_norm_method = get_frame_norm_method(args.feature_extractor)
     verify_args(learner, args)
     return args
 
+def get_frame_norm_method(feature_extractor):
+    if feature_extractor == 'efficientnet_b0':
+        return 'imagenet'
+    elif feature_extractor in ['efficientnet_v2_s', 'vit_s_32', 'vit_b_32']:
+        return 'imagenet_inception'
+    elif feature_extractor == 'vit_b_32_clip':
+        return 'openai_clip'
+
 def expand_issues(original_arg):
     if "no_issues" in original_arg:
         return NEGATED_FRAME_ANNOTATION_OPTIONS
@@ -209,9 +259,34 @@ def verify_args(learner, args):
     if 'train' in args.mode and not args.learn_extractor and not args.adapt_features:
         sys.exit('{:}error: at least one of "--learn_extractor" and "--adapt_features" must be used during training{:}'.format(cred, cend))
 
+    if args.feature_cache_mb > 0 and (args.learn_extractor or args.adapt_features):
+        sys.exit('{:}error: "--feature_cache_mb" cannot be used with "--learn_extractor" or "--adapt_features"{:}'.format(cred, cend))
+
+    if args.with_user_feature_cache and (args.learn_extractor or args.adapt_features):
+        sys.exit('{:}error: "--with_user_feature_cache" cannot be used with "--learn_extractor" or "--adapt_features"{:}'.format(cred, cend))
+
+    if args.with_user_feature_cache and args.feature_cache_mb > 0:
+        sys.exit('{:}error: "--with_user_feature_cache" cannot be used with "--feature_cache_mb"{:}'.format(cred, cend))
+
+    if args.with_task_frame_cache and not args.task_plan_dir:
+        sys.exit('{:}error: "--with_task_frame_cache" requires "--task_plan_dir"{:}'.format(cred, cend))
+
     if learner == 'multi-step-learner':
         if 'train' in args.mode:
             sys.exit('{:}error: Only "--mode test" is supported for multi-step-learner.py{:}'.format(cred, cend))
 
         if args.with_lite:
             print('{:}warning: "--with_lite" is not relevant for multi-step-learner.py. Normal batching is used instead{:}'.format(cyellow, cend))
+
+        if args.with_personalisation_cache:
+            print('{:}warning: "--with_personalisation_cache" is not relevant for multi-step-learner.py. Tasks are always finetuned{:}'.format(cyellow, cend))
+
+    if learner == 'frame-embedding-evaluator':
+        if args.mode != 'test':
+            sys.exit('{:}error: Only "--mode test" is supported for scripts/evaluate_frame_embeddings.py{:}'.format(cred, cend))
+
+        if args.classifier not in ['proto', 'proto_cosine', 'mahalanobis']:
+            sys.exit('{:}error: Only "--classifier proto/proto_cosine/mahalanobis" is supported for scripts/evaluate_frame_embeddings.py{:}'.format(cred, cend))
+
+        if args.adapt_features:
+            sys.exit('{:}error: "--adapt_features" cannot be used with scripts/evaluate_frame_embeddings.py, as frame embeddings are not adapted per task{:}'.format(cred, cend))
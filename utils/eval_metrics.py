@@ -1,7 +1,6 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT license.
 
-import os
 import json
 import torch
 import numpy as np
@@ -101,30 +100,33 @@ class TestEvaluator(Evaluator):
         if save_dir:
             self.save_dir = save_dir
 
-    def save(self):
+    def save(self, get_frame_paths):
+        """
+        Function to save the per-frame predictions for each user's tasks to results.json.
+        :param get_frame_paths: (function) Function mapping an array of frame IDs to their paths (e.g. DatasetQueue.get_frame_paths), used to resolve video and frame names.
+        :return: Nothing.
+        """
         output = {}
         num_users = self.current_user+1
         assert len(self.all_users) == num_users
         for user in range(num_users): # loop through users
             user_id = self.all_users[user]
-            user_frame_paths = self.all_frame_paths[user]
+            user_frame_ids = self.all_frame_ids[user]
             user_frame_probs = self.all_frame_probs[user]
             user_frame_predictions = self.all_frame_predictions[user]
             user_object_lists = self.all_object_lists[user]
-            user_context_frame_paths = self.all_context_frame_paths[user]
-            num_tasks = len(user_frame_paths)
+            num_tasks = len(user_frame_ids)
             output[user_id] = []
             for task in range(num_tasks): # loop through tasks per user
-                task_frame_paths = user_frame_paths[task]
+                task_frame_ids = user_frame_ids[task]
                 task_frame_probs = user_frame_probs[task]
                 task_frame_predictions = user_frame_predictions[task]
                 task_object_list = user_object_lists[task]
-                task_context_frame_paths = user_context_frame_paths[task]
-                num_videos = len(task_frame_paths)
+                num_videos = len(task_frame_ids)
                 
                 task_output = {'task_object_list': task_object_list, 'task_videos': {}}
                 for v in range(num_videos): # loop through videos per task
-                    video_frame_paths = task_frame_paths[v]
+                    video_frame_paths = get_frame_paths(task_frame_ids[v]) # paths are only resolved when results are written
                     video_frame_probs = task_frame_probs[v].tolist()
                     video_frame_predictions = task_frame_predictions[v]
 
@@ -209,13 +211,13 @@ class TestEvaluator(Evaluator):
 
         return mean_stats
 
-    def append_video(self, frame_logits, video_label, frame_paths):
+    def append_video(self, frame_logits, video_label, frame_ids):
 
         # remove any duplicate frames added due to padding to a multiple of clip_length
-        frame_paths, unique_idxs = np.unique(frame_paths, return_index=True)
+        frame_ids, unique_idxs = np.unique(frame_ids, return_index=True)
         frame_logits = frame_logits[unique_idxs]
 
-        assert frame_paths.shape[0] == frame_logits.shape[0]
+        assert frame_ids.shape[0] == frame_logits.shape[0]
 
         frame_probs = torch.nn.functional.softmax(frame_logits, dim=-1).detach().cpu().numpy()
         video_label = video_label.clone().cpu().numpy()
@@ -224,7 +226,7 @@ class TestEvaluator(Evaluator):
         # append results to current user to log
         self.all_frame_probs[self.current_user][self.current_task].append(frame_probs)
         self.all_video_labels[self.current_user][self.current_task].append(video_label)
-        self.all_frame_paths[self.current_user][self.current_task].append(frame_paths)
+        self.all_frame_ids[self.current_user][self.current_task].append(frame_ids)
         self.all_frame_predictions[self.current_user][self.current_task].append(frame_predictions)
 
     def reset(self):
@@ -232,19 +234,19 @@ class TestEvaluator(Evaluator):
         self.current_task = 0
         self.all_frame_probs = [[[]]]
         self.all_video_labels = [[[]]]
-        self.all_frame_paths = [[[]]]
+        self.all_frame_ids = [[[]]]
         self.all_frame_predictions = [[[]]]
         self.all_users = []
         self.all_object_lists = [[[]]]
-        self.all_context_frame_paths = [[[]]]
+        self.all_context_frame_ids = [[[]]]
 
-    def append_context(self, context_logits, context_labels, context_clip_paths):
+    def append_context(self, context_logits, context_labels, context_clip_frame_ids):
         context_frame_labels = context_labels.clone().cpu().numpy()
         context_frame_probs = torch.nn.functional.softmax(context_logits, dim=-1).detach().cpu().numpy()
 
         self.all_context_frame_labels[self.current_user].append(context_frame_labels)
         self.all_context_frame_probs[self.current_user].append(context_frame_probs)
-        self.all_context_frame_paths[self.current_user].append(context_clip_paths)
+        self.all_context_frame_ids[self.current_user].append(context_clip_frame_ids)
 
     def set_current_user(self, user_id):
         self.all_users.append(user_id)
@@ -253,27 +255,26 @@ class TestEvaluator(Evaluator):
     def set_task_object_list(self, task_object_list):
         self.all_object_lists[self.current_user][self.current_task] = task_object_list
 
-    def set_task_context_paths(self, task_context_paths):
-        task_context_frames = [[os.path.basename(f) for f in clip] for clip in task_context_paths]
-        self.all_context_frame_paths[self.current_user][self.current_task] = task_context_frames
+    def set_task_context_frame_ids(self, task_context_frame_ids):
+        self.all_context_frame_ids[self.current_user][self.current_task] = np.array(task_context_frame_ids)
 
     def next_user(self):
         self.all_frame_probs.append([[]])
         self.all_video_labels.append([[]])
-        self.all_frame_paths.append([[]])
+        self.all_frame_ids.append([[]])
         self.all_frame_predictions.append([[]])
         self.all_object_lists.append([[]])
-        self.all_context_frame_paths.append([[]])
+        self.all_context_frame_ids.append([[]])
         self.current_task = 0
         self.current_user += 1
 
     def next_task(self):
         self.all_frame_probs[self.current_user].append([])
         self.all_video_labels[self.current_user].append([])
-        self.all_frame_paths[self.current_user].append([])
+        self.all_frame_ids[self.current_user].append([])
         self.all_frame_predictions[self.current_user].append([])
         self.all_object_lists[self.current_user].append([])
-        self.all_context_frame_paths[self.current_user].append([])
+        self.all_context_frame_ids[self.current_user].append([])
         self.current_task +=1
 
 class ValidationEvaluator(TestEvaluator):
@@ -11,6 +11,9 @@ class OpsCounter():
         self.macs, self.params = [], []
         self.personalise_time_per_task = []
         self.inference_time_per_frame = []
+        self.personalisation_cache_hits = 0
+        self.personalise_time_saved = 0.0
+        self.macs_per_input = {} # MACs of passing a single input through a module, by module and input size, see self.add_cached_macs()
 
     def set_base_params(self, base_model):
         
@@ -56,6 +59,10 @@ class OpsCounter():
         else:
             raise ValueError(f"time_type must be 'personalise' or 'inference' but got {time_type}")
 
+    def log_personalisation_cache_hit(self, time_saved: float):
+        self.personalisation_cache_hits += 1
+        self.personalise_time_saved += time_saved
+
     def compute_macs(self, module, *inputs):
         list_inputs = []
         for input in inputs:
@@ -64,6 +71,14 @@ class OpsCounter():
         macs, params = profile(module, inputs=inputs, custom_ops=custom_ops, verbose=self.verbose)
         self.add_macs(macs * self.multiplier)
 
+    def add_cached_macs(self, module, input, num_inputs):
+        # count the MACs that passing num_inputs inputs of the same size as input through module would cost, when their outputs are taken from a cache instead
+        key = (id(module), tuple(input.shape[1:]))
+        if key not in self.macs_per_input:
+            custom_ops = module.thop_custom_ops if hasattr(module, 'thop_custom_ops') else {}
+            self.macs_per_input[key], _ = profile(module, inputs=(input[:1],), custom_ops=custom_ops, verbose=self.verbose)
+        self.add_macs(self.macs_per_input[key] * num_inputs * self.multiplier)
+
     def task_complete(self):
         self.macs.append(self.task_mac_counter)
         self.params.append(self.base_params_counter + self.task_params_counter)
@@ -94,4 +109,7 @@ class OpsCounter():
         std_personalise_time = self.convert_to_minutes(np.std(self.personalise_time_per_task))
         mean_inference_time = self.convert_to_microseconds(np.mean(self.inference_time_per_frame))
         std_inference_time = self.convert_to_microseconds(np.std(self.inference_time_per_frame))
-        return f"MACs to personalise: {mean_ops} ({std_ops}) time to personalise: {mean_personalise_time} ({std_personalise_time}) inference time per frame: {mean_inference_time} ({std_inference_time}) #params {mean_params} ({self.params_break_down})"
+        stats = f"MACs to personalise: {mean_ops} ({std_ops}) time to personalise: {mean_personalise_time} ({std_personalise_time}) inference time per frame: {mean_inference_time} ({std_inference_time}) #params {mean_params} ({self.params_break_down})"
+        if self.personalisation_cache_hits > 0:
+            stats += f" personalisation cache hits: {self.personalisation_cache_hits}/{len(self.personalise_time_per_task)} tasks (time saved: {self.convert_to_minutes(self.personalise_time_saved)})"
+        return stats